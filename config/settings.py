@@ -282,12 +282,94 @@ CACHES = {
         "TIMEOUT": env(
             "STATIC_CACHE_TIMEOUT", default="60"
         ),  # Cache timeout in seconds: 1 minute
+        "OPTIONS": {
+            # Rendered pages compress well; values that don't, and values stored
+            # before this was enabled, are read as they are.
+            "COMPRESSOR": "core.compression.StaticContentCompressor",
+        },
     },
 }
 
 # Default interval by which to clear the static content cache
 CLEAR_STATIC_CONTENT_CACHE_DAYS = 7
 
+# How long pre-rendered release documentation is kept in the static content cache
+STATIC_CONTENT_PRERENDER_TIMEOUT = env.int(
+    "STATIC_CONTENT_PRERENDER_TIMEOUT", default=60 * 60 * 24 * 7
+)  # 1 week
+
+# Seconds static content is kept past its cache timeout, during which it is served
+# stale while a single background task refreshes it, and seconds during which
+# further refreshes of the same content are not scheduled.
+STATIC_CONTENT_STALE_TIMEOUT = env.int("STATIC_CONTENT_STALE_TIMEOUT", default=60 * 60)
+STATIC_CONTENT_REFRESH_LOCK_TIMEOUT = env.int(
+    "STATIC_CONTENT_REFRESH_LOCK_TIMEOUT", default=60
+)
+
+# In-process cache of the most requested static content, in front of Redis: number
+# of entries (0 disables it), total size of their content in bytes, and timeout in
+# seconds. Entries are invalidated across processes through Redis pub/sub.
+STATIC_CONTENT_LOCAL_CACHE_SIZE = env.int(
+    "STATIC_CONTENT_LOCAL_CACHE_SIZE", default=300
+)
+STATIC_CONTENT_LOCAL_CACHE_MAX_SIZE = env.int(
+    "STATIC_CONTENT_LOCAL_CACHE_MAX_SIZE", default=128 * 1024 * 1024
+)
+STATIC_CONTENT_LOCAL_CACHE_TIMEOUT = env.int(
+    "STATIC_CONTENT_LOCAL_CACHE_TIMEOUT", default=60
+)
+
+# Bearer token Prometheus must send to scrape /internal/metrics/. The endpoint is
+# disabled when it is empty.
+METRICS_TOKEN = env("METRICS_TOKEN", default="")
+
+# Share of static content requests counted to find the most requested pages, days
+# of counts kept, and number of pages warmed after the cache is flushed, a release
+# is imported or the site is deployed.
+STATIC_CONTENT_HIT_SAMPLE_RATE = env.float(
+    "STATIC_CONTENT_HIT_SAMPLE_RATE", default=0.05
+)
+STATIC_CONTENT_HIT_DAYS = env.int("STATIC_CONTENT_HIT_DAYS", default=7)
+STATIC_CONTENT_WARM_PATHS = env.int("STATIC_CONTENT_WARM_PATHS", default=500)
+
+# How long a path with no content is remembered as missing, so repeated requests
+# for it (e.g. from crawlers) return a 404 without querying the database and S3.
+# Set to 0 to disable.
+STATIC_CONTENT_MISSING_TIMEOUT = env.int("STATIC_CONTENT_MISSING_TIMEOUT", default=300)
+
+# Static content that is served as is (images, stylesheets, PDFs...) and larger than
+# this many bytes is streamed from S3 instead of being read into memory and cached.
+STATIC_CONTENT_MAX_BUFFERED_SIZE = env.int(
+    "STATIC_CONTENT_MAX_BUFFERED_SIZE", default=1024 * 1024
+)
+
+# Local disk cache of S3 objects, between the static_content cache and S3. Disabled
+# unless a directory is set. Sizes are in bytes; entries older than
+# STATIC_CONTENT_DISK_CACHE_REVALIDATE_AFTER seconds are revalidated with S3.
+STATIC_CONTENT_DISK_CACHE_DIR = env("STATIC_CONTENT_DISK_CACHE_DIR", default="")
+STATIC_CONTENT_DISK_CACHE_MAX_SIZE = env.int(
+    "STATIC_CONTENT_DISK_CACHE_MAX_SIZE", default=5 * 1024 * 1024 * 1024
+)
+STATIC_CONTENT_DISK_CACHE_MAX_ENTRY_SIZE = env.int(
+    "STATIC_CONTENT_DISK_CACHE_MAX_ENTRY_SIZE", default=100 * 1024 * 1024
+)
+STATIC_CONTENT_DISK_CACHE_REVALIDATE_AFTER = env.int(
+    "STATIC_CONTENT_DISK_CACHE_REVALIDATE_AFTER", default=60 * 60
+)
+
+# Long-lived asciidoctor processes converting AsciiDoc to HTML, per process: number
+# of workers (0 runs the asciidoctor command for each document instead), number of
+# documents a worker converts before it is replaced, and timeout in seconds.
+ASCIIDOCTOR_WORKERS = env.int("ASCIIDOCTOR_WORKERS", default=2)
+ASCIIDOCTOR_WORKER_MAX_JOBS = env.int("ASCIIDOCTOR_WORKER_MAX_JOBS", default=500)
+ASCIIDOCTOR_TIMEOUT = env.int("ASCIIDOCTOR_TIMEOUT", default=60)
+
+# How long the HTML converted from AsciiDoc and Markdown is cached, by the hash of the
+# source text. Set to 0 to disable.
+CONVERSION_CACHE_TIMEOUT = env.int(
+    "CONVERSION_CACHE_TIMEOUT", default=60 * 60 * 24 * 30
+)
+
 # Hyperkitty
 HYPERKITTY_DATABASE_NAME = env("HYPERKITTY_DATABASE_NAME", default="")
 if HYPERKITTY_DATABASE_NAME:
@@ -307,6 +389,8 @@ MAILMAN_CORE_DATABASE = env("MAILMAN_CORE_DATABASE", default="unknown")
 FASTLY_SERVICE = env("FASTLY_SERVICE", default="empty")
 FASTLY_SERVICE2 = env("FASTLY_SERVICE2", default="empty")
 FASTLY_API_TOKEN = env("FASTLY_API_TOKEN", default="empty")
+# Class used to purge responses from the CDN by surrogate key (see core.cdn)
+CDN_PURGE_CLIENT = env("CDN_PURGE_CLIENT", default="core.cdn.FastlyPurgeClient")
 
 HAYSTACK_CONNECTIONS = {
     "default": {
@@ -458,9 +542,25 @@ STATIC_CONTENT_BUCKET_NAME = env("STATIC_CONTENT_BUCKET_NAME", default="changeme
 
 STATIC_CONTENT_REGION = env("STATIC_CONTENT_REGION", default="us-east-2")
 
+# Only used when set, e.g. for a local S3 stand-in; otherwise boto3 picks the
+# endpoint of STATIC_CONTENT_REGION
 STATIC_CONTENT_AWS_S3_ENDPOINT_URL = env(
-    "STATIC_CONTENT_AWS_S3_ENDPOINT_URL", default="https://s3.us-east-2.amazonaws.com"
+    "STATIC_CONTENT_AWS_S3_ENDPOINT_URL", default=None
+)
+
+# Shared S3 client for the static content bucket: connection pool size, timeouts in
+# seconds, and botocore retry mode ("legacy", "standard" or "adaptive")
+STATIC_CONTENT_S3_MAX_POOL_CONNECTIONS = env.int(
+    "STATIC_CONTENT_S3_MAX_POOL_CONNECTIONS", default=50
+)
+STATIC_CONTENT_S3_CONNECT_TIMEOUT = env.float(
+    "STATIC_CONTENT_S3_CONNECT_TIMEOUT", default=5
 )
+STATIC_CONTENT_S3_READ_TIMEOUT = env.float("STATIC_CONTENT_S3_READ_TIMEOUT", default=30)
+STATIC_CONTENT_S3_RETRY_MODE = env("STATIC_CONTENT_S3_RETRY_MODE", default="standard")
+STATIC_CONTENT_S3_MAX_ATTEMPTS = env.int("STATIC_CONTENT_S3_MAX_ATTEMPTS", default=3)
+# Threads used to request a page's candidate S3 keys concurrently
+STATIC_CONTENT_S3_PROBE_WORKERS = env.int("STATIC_CONTENT_S3_PROBE_WORKERS", default=20)
 
 # LinkPreview API Key
 # LINK_PREVIEW_API_KEY = env(
@@ -474,6 +574,9 @@ STATIC_CONTENT_MAPPING = env(
 
 # Markdown content
 BASE_CONTENT = env("BOOST_CONTENT_DIRECTORY", "/website")
+# Render all the Markdown pages when a web worker starts, instead of on their first
+# request in that worker
+MARKDOWN_WARM_UP = env.bool("MARKDOWN_WARM_UP", default=False)
 
 # News: list of users who are allowed to post without requiring moderation.
 # This complements the 'moderator' Group that also have posting privileges.
@@ -25,6 +25,7 @@ OAUTH2_PROVIDER_GRANT_MODEL = "oauth2_provider.Grant"
 OAUTH2_PROVIDER_REFRESH_TOKEN_MODEL = "oauth2_provider.RefreshToken"
 
 EMAIL_BACKEND = "django.core.mail.backends.locmem.EmailBackend"
+CDN_PURGE_CLIENT = "core.cdn.LocMemPurgeClient"
 
 MIGRATION_MODULES = DisableMigrations()
 
@@ -33,6 +34,9 @@ PASSWORD_HASHERS = ["django.contrib.auth.hashers.MD5PasswordHasher"]
 
 GITHUB_TOKEN = "changeme"
 
+# The in-process static content cache would outlive the caches of each test
+STATIC_CONTENT_LOCAL_CACHE_SIZE = 0
+
 # Make content relative to the project root
 BASE_CONTENT = BASE_DIR / "core/tests/content"  # noqa
 
@@ -22,6 +22,7 @@ from core.views import (
     DocLibsTemplateView,
     ImageView,
     MarkdownTemplateView,
+    MetricsView,
     RedirectToDocsView,
     RedirectToHTMLDocsView,
     RedirectToHTMLToolsView,
@@ -326,6 +327,7 @@ urlpatterns = (
         ),
         # Internal functions
         path("internal/clear-cache/", ClearCacheView.as_view(), name="clear-cache"),
+        path("internal/metrics/", MetricsView.as_view(), name="metrics"),
     ]
     + [
         # Redirects for old boost.org urls.
@@ -0,0 +1,88 @@
+import re
+
+from requests.compat import chardet
+
+from .boostrenderer import get_meta_redirect_from_html
+from .constants import SourceDocType
+
+GENERATOR_RE = re.compile(
+    rb"<meta\s[^>]*name\s*=\s*[\"']?generator[\"']?"
+    rb"[^>]*content\s*=\s*[\"']?([^\"'>]*)",
+    re.IGNORECASE,
+)
+# Cheap test for a meta refresh, before parsing the document to get its target
+REFRESH_RE = re.compile(rb"http-equiv\s*=\s*[\"']?refresh", re.IGNORECASE)
+
+
+def analyze_document(content):
+    """Return the facts about an HTML document from S3 that serving it depends on,
+    so they are worked out once when it is fetched rather than on every request:
+
+    - "encoding": the encoding to decode it with
+    - "redirect": the target of its meta refresh, or None
+    - "source_type": the `SourceDocType` it was generated with
+
+    The record is stored with the content in the static content cache.
+    """
+    if isinstance(content, str):
+        content = content.encode("utf-8")
+    return {
+        "encoding": detect_encoding(content),
+        "redirect": (
+            get_meta_redirect_from_html(content) if REFRESH_RE.search(content) else None
+        ),
+        "source_type": get_source_type(content),
+    }
+
+
+def detect_encoding(content):
+    """Return the encoding of `content`. Most documents are UTF-8 (or ASCII), which
+    is checked first, as detecting the encoding reads the whole document."""
+    try:
+        content.decode("utf-8")
+    except UnicodeDecodeError:
+        return chardet.detect(content)["encoding"]
+    return "utf-8"
+
+
+def get_source_type(content):
+    """Return the `SourceDocType` the HTML document was generated with: LEGACY for
+    the BoostBook and QuickBook pages, which have a "spirit-nav" navigation bar, and
+    ANTORA or ASCIIDOC otherwise, going by its generator meta tag."""
+    if b"spirit-nav" in content:
+        return SourceDocType.LEGACY
+    generator = GENERATOR_RE.search(content)
+    if generator and generator.group(1).lower().startswith(b"antora"):
+        return SourceDocType.ANTORA
+    return SourceDocType.ASCIIDOC
+
+
+def prepare_content(result, convert_adoc_to_html):
+    """Prepare the content of an S3 object (see `get_content_from_s3`) to be cached
+    and served, in place: AsciiDoc is converted to HTML with `convert_adoc_to_html`,
+    and HTML documents are analyzed, see `analyze_document`.
+
+    The views and the refresh of stale content both go through this, so a refreshed
+    entry is the same as the one it replaces.
+    """
+    content = result["content"]
+    content_type = result.get("content_type")
+    result["source_content_type"] = None
+
+    # Check if the content is an asciidoc file. If so, convert it to HTML.
+    # todo: confirm necessary: not clear where this is still needed, as the
+    #  content type for library docs is set to text/html, maybe descriptions and
+    #  release notes
+    if content_type == "text/asciidoc":
+        result["content"] = convert_adoc_to_html(content)
+
+    # Check if the content is an HTML file. If so, work out its encoding,
+    # meta redirect and source type once, to be cached with it.
+    if content_type.startswith("text/html"):
+        analysis = analyze_document(content)
+        result["analysis"] = analysis
+        result["redirect"] = analysis["redirect"]
+        if not result["redirect"] and analysis["source_type"] != SourceDocType.LEGACY:
+            result["source_content_type"] = analysis["source_type"]
+
+    return result
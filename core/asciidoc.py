@@ -1,4 +1,29 @@
+import os
+import queue
+import select
 import subprocess
+import threading
+import time
+
+import structlog
+from django.conf import settings
+
+from .caching import memoize_conversion
+
+logger = structlog.get_logger()
+
+# Ruby script run by each worker, see AsciidoctorWorker
+WORKER_SCRIPT = os.path.join(os.path.dirname(__file__), "asciidoctor_worker.rb")
+# Idle workers are pinged before they are reused if they haven't converted anything
+# for this many seconds.
+HEALTH_CHECK_INTERVAL = 60
+HEALTH_CHECK_TIMEOUT = 5
+# Seconds a recycled worker is given to exit before it is killed
+WORKER_EXIT_TIMEOUT = 5
+
+
+class AsciidoctorError(Exception):
+    """Raised when an AsciiDoc document can't be converted to HTML."""
 
 
 def convert_adoc_to_html(input):
@@ -8,12 +33,24 @@ def convert_adoc_to_html(input):
     Note: This returns an html fragment, not the full <html> document with the
     <head> and <body> tags.
 
-    The asciidoctor package is a Ruby gem, which is why we're using subprocess
-    to run the command.
+    The asciidoctor package is a Ruby gem, which is why we're using a separate
+    process. Starting Ruby and loading the gems takes far longer than most
+    conversions, so documents are sent to a pool of long-lived asciidoctor
+    processes, unless `ASCIIDOCTOR_WORKERS` is 0. The output is cached by the hash
+    of the input, so unchanged documents aren't converted again.
     https://docs.asciidoctor.org/asciidoctor/latest/
 
     :param input: The contents of the AsciiDoc file
     """
+    return memoize_conversion("asciidoc", input, run_asciidoctor)
+
+
+def run_asciidoctor(input):
+    """Convert AsciiDoc to HTML with asciidoctor, without caching."""
+    pool = get_asciidoctor_pool()
+    if pool is not None:
+        return pool.convert(input)
+
     result = subprocess.run(
         ["asciidoctor", "-r", "asciidoctor_boost", "-e", "-o", "-", "-"],
         check=True,
@@ -24,3 +61,205 @@ def convert_adoc_to_html(input):
 
     # Get the output from the command
     return result.stdout
+
+
+class AsciidoctorWorker:
+    """A long-lived asciidoctor process that converts the documents written to its
+    stdin, one at a time (see asciidoctor_worker.rb for the protocol).
+
+    A worker that times out or stops responding is killed: the caller can't tell
+    where it is in the protocol anymore.
+    """
+
+    def __init__(self, command=None):
+        self.process = subprocess.Popen(
+            command or ["ruby", WORKER_SCRIPT],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            # Warnings about the documents would fill the pipe if it wasn't read
+            stderr=subprocess.DEVNULL,
+        )
+        self.jobs = 0
+        self.last_used = time.monotonic()
+        self._buffer = bytearray()
+
+    def is_alive(self):
+        return self.process.poll() is None
+
+    def ping(self, timeout=HEALTH_CHECK_TIMEOUT):
+        """Return True if the worker answers within `timeout` seconds."""
+        try:
+            self._send(b"ping\n")
+            return self._read_line(time.monotonic() + timeout) == b"pong"
+        except AsciidoctorError:
+            return False
+
+    def convert(self, input, timeout):
+        """Return `input` converted to HTML, in at most `timeout` seconds."""
+        data = input.encode("utf-8")
+        deadline = time.monotonic() + timeout
+        self._send(b"convert %d\n" % len(data) + data)
+        status, _, length = self._read_line(deadline).partition(b" ")
+        try:
+            length = int(length)
+        except ValueError:
+            self._fail("Unexpected response from the asciidoctor worker")
+        output = self._read_exact(length, deadline).decode("utf-8")
+        self.jobs += 1
+        self.last_used = time.monotonic()
+        if status != b"ok":
+            raise AsciidoctorError(output)
+        return output
+
+    def close(self, kill=False):
+        """Stop the worker, letting it finish unless `kill` is True."""
+        if self.is_alive() and not kill:
+            try:
+                self.process.stdin.close()
+                self.process.wait(timeout=WORKER_EXIT_TIMEOUT)
+            except (OSError, subprocess.TimeoutExpired):
+                pass
+        if self.is_alive():
+            self.process.kill()
+            self.process.wait()
+        for pipe in (self.process.stdin, self.process.stdout):
+            try:
+                pipe.close()
+            except OSError:
+                pass
+
+    def _send(self, data):
+        try:
+            self.process.stdin.write(data)
+            self.process.stdin.flush()
+        except (OSError, ValueError):
+            self._fail("The asciidoctor worker exited")
+
+    def _read_line(self, deadline):
+        while True:
+            index = self._buffer.find(b"\n")
+            if index >= 0:
+                line = bytes(self._buffer[:index])
+                del self._buffer[: index + 1]
+                return line
+            self._fill(deadline)
+
+    def _read_exact(self, size, deadline):
+        while len(self._buffer) < size:
+            self._fill(deadline)
+        data = bytes(self._buffer[:size])
+        del self._buffer[:size]
+        return data
+
+    def _fill(self, deadline):
+        # The pipe is read directly, so select sees everything not yet buffered
+        fd = self.process.stdout.fileno()
+        remaining = deadline - time.monotonic()
+        if remaining <= 0 or not select.select([fd], [], [], remaining)[0]:
+            self._fail("Timed out waiting for the asciidoctor worker")
+        chunk = os.read(fd, 64 * 1024)
+        if not chunk:
+            self._fail("The asciidoctor worker exited")
+        self._buffer += chunk
+
+    def _fail(self, message):
+        self.close(kill=True)
+        raise AsciidoctorError(message)
+
+
+class AsciidoctorPool:
+    """Up to `size` asciidoctor workers, started on demand and shared by the
+    threads (or greenlets) of a process.
+
+    Workers are replaced after `max_jobs` conversions, to bound the memory a Ruby
+    process accumulates, and when they fail a health check. A conversion waits at
+    most `timeout` seconds for a worker, and as long again for the conversion.
+    """
+
+    def __init__(self, size, max_jobs, timeout, command=None):
+        self.size = size
+        self.max_jobs = max_jobs
+        self.timeout = timeout
+        self.command = command
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+
+    def convert(self, input):
+        if not self._slots.acquire(timeout=self.timeout):
+            raise AsciidoctorError("Timed out waiting for an asciidoctor worker")
+        worker = None
+        try:
+            worker = self._get_worker()
+            return worker.convert(input, self.timeout)
+        finally:
+            if worker is not None:
+                self._put_worker(worker)
+            self._slots.release()
+
+    def close(self):
+        """Stop the idle workers."""
+        while True:
+            try:
+                worker = self._idle.get_nowait()
+            except queue.Empty:
+                return
+            worker.close()
+
+    def _get_worker(self):
+        while True:
+            try:
+                worker = self._idle.get_nowait()
+            except queue.Empty:
+                return AsciidoctorWorker(self.command)
+            if self._is_healthy(worker):
+                return worker
+            logger.warning("asciidoctor_worker_unhealthy", pid=worker.process.pid)
+            worker.close(kill=True)
+
+    def _is_healthy(self, worker):
+        if not worker.is_alive():
+            return False
+        if time.monotonic() - worker.last_used < HEALTH_CHECK_INTERVAL:
+            return True
+        return worker.ping()
+
+    def _put_worker(self, worker):
+        if worker.is_alive() and worker.jobs < self.max_jobs:
+            self._idle.put(worker)
+        else:
+            worker.close()
+
+
+_asciidoctor_pool = None
+_asciidoctor_pool_pid = None
+_asciidoctor_pool_lock = threading.Lock()
+
+
+def get_asciidoctor_pool():
+    """Return this process's pool of asciidoctor workers, or None if it is disabled
+    (`ASCIIDOCTOR_WORKERS` is 0)."""
+    global _asciidoctor_pool, _asciidoctor_pool_pid
+    if not settings.ASCIIDOCTOR_WORKERS:
+        return None
+    pid = os.getpid()
+    # A forked process can't share its parent's workers
+    if _asciidoctor_pool is None or _asciidoctor_pool_pid != pid:
+        with _asciidoctor_pool_lock:
+            if _asciidoctor_pool is None or _asciidoctor_pool_pid != pid:
+                _asciidoctor_pool = AsciidoctorPool(
+                    settings.ASCIIDOCTOR_WORKERS,
+                    settings.ASCIIDOCTOR_WORKER_MAX_JOBS,
+                    settings.ASCIIDOCTOR_TIMEOUT,
+                )
+                _asciidoctor_pool_pid = pid
+    return _asciidoctor_pool
+
+
+def reset_asciidoctor_pool():
+    """Stop this process's idle asciidoctor workers and drop the pool."""
+    global _asciidoctor_pool, _asciidoctor_pool_pid
+    with _asciidoctor_pool_lock:
+        if _asciidoctor_pool is not None and _asciidoctor_pool_pid == os.getpid():
+            _asciidoctor_pool.close()
+        _asciidoctor_pool = None
+        _asciidoctor_pool_pid = None
@@ -0,0 +1,38 @@
+# Converts AsciiDoc documents to HTML for core.asciidoc.AsciidoctorWorker.
+#
+# Loading Ruby, asciidoctor and asciidoctor_boost takes far longer than
+# converting a typical document, so this runs for many conversions. Requests are
+# read from stdin and responses written to stdout, one at a time:
+#
+#   ping\n                  -> pong\n
+#   convert <bytes>\n<doc>  -> ok <bytes>\n<html> or error <bytes>\n<message>
+#
+# The output matches `asciidoctor -r asciidoctor_boost -e -o - -`.
+require "asciidoctor"
+require "asciidoctor_boost"
+
+$stdin.binmode
+$stdout.binmode
+
+while (line = $stdin.gets)
+  command, length = line.split
+  case command
+  when "ping"
+    $stdout.write("pong\n")
+  when "convert"
+    input = $stdin.read(Integer(length)).force_encoding(Encoding::UTF_8)
+    begin
+      # Like the asciidoctor command: unsafe mode, and a trailing newline
+      output = "#{Asciidoctor.convert(input, safe: :unsafe).chomp}\n"
+      status = "ok"
+    rescue StandardError => e
+      output = e.message
+      status = "error"
+    end
+    output = output.b
+    $stdout.write("#{status} #{output.bytesize}\n", output)
+  else
+    exit 1
+  end
+  $stdout.flush
+end
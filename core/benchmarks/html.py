@@ -0,0 +1,180 @@
+import gc
+import json
+import os
+import platform
+import statistics
+import time
+import tracemalloc
+
+from bs4 import BeautifulSoup
+from django.template.loader import render_to_string
+
+from ..boostrenderer import convert_img_paths, get_meta_redirect_from_html
+from ..constants import SourceDocType
+from ..htmlhelper import (
+    modernize_legacy_page,
+    modernize_release_notes,
+    remove_cpp_alliance_links,
+)
+
+CORPUS_DIR = os.path.join(os.path.dirname(__file__), "corpus")
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), "baseline.json")
+# A result is a regression when it is worse than the baseline by more than this share
+DEFAULT_THRESHOLD = 0.2
+# The measurements compared with the baseline. The median wall time is reported but
+# not compared: it varies too much from run to run.
+COMPARED_MEASUREMENTS = ("wall_min", "peak_memory", "allocated")
+
+
+def load_corpus(directory=CORPUS_DIR):
+    """Return the pages listed in the corpus manifest, with their content."""
+    with open(os.path.join(directory, "manifest.json")) as f:
+        pages = json.load(f)
+    for page in pages:
+        with open(os.path.join(directory, page["file"]), encoding="utf-8") as f:
+            page["content"] = f.read()
+    return pages
+
+
+def get_base_html():
+    """Return the placeholder page DocLibsTemplateView modernizes pages with."""
+    return render_to_string(
+        "docs_libs_placeholder.html",
+        {
+            "disable_theme_switcher": False,
+            "hide_footer": True,
+            "skip_use_boostbook_v2": False,
+            "disable_plausible": True,
+        },
+    )
+
+
+def get_benchmarks(page, base_html):
+    """Return the functions to time for a corpus page, by name, each called with no
+    arguments. They are called the way the views and tasks call them."""
+    content = page["content"]
+    benchmarks = {
+        "get_meta_redirect_from_html": lambda: get_meta_redirect_from_html(content),
+    }
+    if page["kind"] == "docs":
+        # The default ("med") modernization of DocLibsTemplateView
+        benchmarks["modernize_legacy_page"] = lambda: modernize_legacy_page(
+            content,
+            base_html,
+            insert_body=False,
+            head_selector="head",
+            original_docs_type=SourceDocType.ANTORA,
+            show_footer=False,
+            show_navbar=False,
+        )
+        benchmarks["convert_img_paths"] = lambda: convert_img_paths(
+            content, page["s3_path"]
+        )
+    elif page["kind"] == "release_notes":
+        benchmarks["modernize_release_notes"] = lambda: modernize_release_notes(content)
+        # Parsed once here: the function is given a soup, and doesn't modify it
+        soup = BeautifulSoup(content, "html.parser")
+        benchmarks["remove_cpp_alliance_links"] = lambda: remove_cpp_alliance_links(
+            soup
+        )
+    return benchmarks
+
+
+def measure(func, repeat):
+    """Time `func` and measure the memory it allocates.
+
+    `func` is called `repeat` times after a first untimed call. It is then called
+    once more while memory allocations are traced. Returns:
+
+    - "wall_min" and "wall_median": its fastest and median wall time, in seconds
+    - "peak_memory": the most memory, in bytes, it had allocated at once
+    - "allocated": the memory, in bytes, it allocated and still held when it
+      returned, which includes its result
+    """
+    # Warm up caches (e.g. compiled templates) outside of the measurements
+    func()
+    times = []
+    # Like timeit, collections are left out of the timings: when they happen
+    # depends on what ran before.
+    gc.collect()
+    gc.disable()
+    try:
+        for _ in range(repeat):
+            start = time.perf_counter()
+            func()
+            times.append(time.perf_counter() - start)
+    finally:
+        gc.enable()
+
+    gc.collect()
+    tracemalloc.start()
+    try:
+        start_memory = tracemalloc.get_traced_memory()[0]
+        # The result is kept alive until the memory is measured
+        result = func()
+        peak = tracemalloc.get_traced_memory()[1]
+        # Parse trees are freed by the garbage collector, not when they go out of
+        # scope
+        gc.collect()
+        allocated = tracemalloc.get_traced_memory()[0]
+        del result
+    finally:
+        tracemalloc.stop()
+    return {
+        "wall_min": min(times),
+        "wall_median": statistics.median(times),
+        "peak_memory": peak - start_memory,
+        "allocated": allocated - start_memory,
+    }
+
+
+def run_benchmarks(repeat=10, names=None, files=None, directory=CORPUS_DIR):
+    """Time every benchmark on every corpus page, or only those in `names` and
+    `files`. Returns the measurements by "<benchmark>:<file>"."""
+    base_html = get_base_html()
+    results = {}
+    for page in load_corpus(directory):
+        if files and page["file"] not in files:
+            continue
+        for name, func in get_benchmarks(page, base_html).items():
+            if names and name not in names:
+                continue
+            results[f"{name}:{page['file']}"] = measure(func, repeat)
+    return results
+
+
+def load_baseline(path=BASELINE_PATH):
+    """Return the stored baseline, or None if there is none."""
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_baseline(results, path=BASELINE_PATH):
+    """Store `results` as the baseline, along with the machine they come from."""
+    baseline = {
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "processor": platform.processor(),
+        "results": results,
+    }
+    with open(path, "w") as f:
+        json.dump(baseline, f, indent=2, sort_keys=True)
+        f.write("\n")
+
+
+def compare(results, baseline, threshold=DEFAULT_THRESHOLD):
+    """Return the measurements that are worse than in the baseline by more than
+    `threshold`, as (benchmark, measurement, baseline value, value) tuples."""
+    regressions = []
+    for key, measurements in results.items():
+        previous = baseline["results"].get(key)
+        if previous is None:
+            continue
+        for measurement in COMPARED_MEASUREMENTS:
+            before = previous.get(measurement)
+            after = measurements[measurement]
+            if before and after > before * (1 + threshold):
+                regressions.append((key, measurement, before, after))
+    return regressions
@@ -1,10 +1,16 @@
+import functools
 import html
 import json
 import os
 import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from html.parser import HTMLParser
 
 import boto3
 import structlog
+from botocore.config import Config
 from botocore.exceptions import ClientError
 from bs4 import BeautifulSoup, Tag
 from django.conf import settings
@@ -14,14 +20,34 @@ from pygments import highlight
 from pygments.formatter import Formatter
 from pygments.lexers import get_lexer_by_name as get_lexer
 from pygments.lexers import guess_lexer
-from pygments.util import get_bool_opt
+from pygments.util import ClassNotFound, get_bool_opt
+
+from .diskcache import (
+    get_disk_cache,
+    get_disk_cache_metadata,
+    get_file_data_from_disk_cache,
+)
+from .metrics import timed_s3_fetch
 
 logger = structlog.get_logger()
 
+# How often, in seconds, the STATIC_CONTENT_MAPPING file is checked for changes
+MAPPING_CHECK_INTERVAL = 5
+# How many resolved content paths are memoized per mapping
+MAPPING_LOOKUP_CACHE_SIZE = 4096
+# Size of the chunks S3 bodies are streamed to clients in
+S3_STREAM_CHUNK_SIZE = 64 * 1024
+# Documents without a match have no img tag to rewrite
+IMG_TAG_RE = re.compile(r"<img[\s/>]", re.IGNORECASE)
+# An attribute of a tag, with its value if it has one
+IMG_ATTRIBUTE_RE = re.compile(
+    r"""(?P<name>[^\s/>="']+)(?:\s*=\s*(?P<value>"[^"]*"|'[^']*'|[^\s>]+))?"""
+)
+
 
 def extract_file_data(response, s3_key):
-    """Extracts the file content, content type, and last modified date from an S3
-    response object."""
+    """Extracts the file content, content type, last modified date and ETag from an
+    S3 response object."""
     file_content = response["Body"].read()
     content_type = get_content_type(s3_key, response["ContentType"])
     last_modified = response["LastModified"]
@@ -30,9 +56,20 @@ def extract_file_data(response, s3_key):
         "content_key": s3_key,
         "content_type": content_type,
         "last_modified": last_modified,
+        "etag": response.get("ETag"),
     }
 
 
+def is_not_modified_error(error):
+    """Return True if the ClientError is S3 answering a conditional request with
+    304 Not Modified."""
+    status_code = error.response.get("ResponseMetadata", {}).get("HTTPStatusCode")
+    return status_code == 304 or error.response.get("Error", {}).get("Code") in (
+        "304",
+        "NotModified",
+    )
+
+
 def get_meta_redirect_from_html(html_string: str) -> str | None:
     """Use BeautifulSoup to get the meta redirect from an HTML document, if it exists.
 
@@ -80,31 +117,92 @@ def get_body_from_html(html_string: str) -> str:
     return body_content
 
 
-def get_content_from_s3(key=None, bucket_name=None):
+def get_s3_candidate_keys(s3_keys):
+    """Return the S3 keys to try for a request, in priority order.
+
+    Keys that look like directories are followed by their `index.html`.
+    """
+    candidates = []
+    for s3_key in s3_keys:
+        candidates.append(s3_key)
+        # Handle URLs that are directories looking for `index.html` files
+        if s3_key.endswith("/"):
+            candidates.append(f"{s3_key}index.html")
+    return list(dict.fromkeys(candidates))
+
+
+def get_content_from_s3(
+    key=None,
+    bucket_name=None,
+    if_none_match=None,
+    max_buffered_size=None,
+    byte_range=None,
+):
     """
     Get content from S3. Returns the decoded file contents if able
+
+    When there are several candidate keys, they are all opened at once and the
+    body of the first one that exists, in priority order, is read; the others are
+    closed unread. A miss on the preferred keys costs about one S3 round trip
+    instead of one per key.
+
+    If `if_none_match` is an ETag and the matching object still has it, the content
+    isn't downloaded and `{"not_modified": True, ...}` is returned instead.
+
+    If `max_buffered_size` or `byte_range` is given, the body is only read when no
+    range is requested and it is at most `max_buffered_size` bytes. Otherwise it is
+    left unread in "stream" (see `get_file_stream`), for the caller to stream.
     """
     if not key:
         raise ValueError("No key provided.")
 
     bucket_name = bucket_name or settings.STATIC_CONTENT_BUCKET_NAME
+
+    # The local disk cache is skipped for range requests, and when the caller
+    # revalidates its own copy.
+    disk_cache = None if if_none_match or byte_range else get_disk_cache()
+    disk_cache_key = f"{bucket_name}/{key}"
+    entry = disk_cache.get(disk_cache_key) if disk_cache else None
+    if entry:
+        if disk_cache.is_fresh(entry):
+            file_data = get_file_data_from_disk_cache(
+                disk_cache, entry, max_buffered_size
+            )
+            if file_data:
+                return file_data
+        # Only download the object again if it changed
+        if_none_match = entry.get("etag")
+
     # s3_keys = get_s3_keys(key) or [key]
     # Force a successful lookup from get_s3_keys, otherwise no match at all.
     # That removes any random default "/" lookups.
     s3_keys = get_s3_keys(key) or []
+    candidates = get_s3_candidate_keys(s3_keys)
     client = get_s3_client()
 
-    for s3_key in s3_keys:
-        file_data = get_file_data(client, bucket_name, s3_key)
-        if file_data:
-            return file_data
+    kwargs = {"if_none_match": if_none_match} if if_none_match else {}
+    if max_buffered_size is not None or byte_range or len(candidates) != 1:
+        file_data = get_content_stream_from_s3(
+            client, bucket_name, candidates, max_buffered_size, byte_range, **kwargs
+        )
+    else:
+        file_data = timed_s3_fetch(
+            get_file_data, 0, client, bucket_name, candidates[0], **kwargs
+        )
 
-        # Handle URLs that are directories looking for `index.html` files
-        if s3_key.endswith("/"):
-            index_html_key = f"{s3_key}index.html"
-            file_data = get_file_data(client, bucket_name, index_html_key)
-            if file_data:
-                return file_data
+    if entry and file_data and file_data.get("not_modified"):
+        disk_cache.revalidate(disk_cache_key, entry)
+        file_data = get_file_data_from_disk_cache(disk_cache, entry, max_buffered_size)
+        if file_data is None:
+            # Evicted in the meantime
+            return get_content_from_s3(
+                key, bucket_name, max_buffered_size=max_buffered_size
+            )
+    elif disk_cache and file_data:
+        save_to_disk_cache(disk_cache, disk_cache_key, file_data)
+
+    if file_data:
+        return file_data
 
     logger.info(
         "get_content_from_s3_no_valid_object",
@@ -115,6 +213,187 @@ def get_content_from_s3(key=None, bucket_name=None):
     return {}
 
 
+def save_to_disk_cache(disk_cache, disk_cache_key, file_data):
+    """Store S3 file data in the disk cache. Content that is streamed is stored as
+    it is read, if it isn't too large."""
+    metadata = get_disk_cache_metadata(file_data)
+    if "stream" in file_data:
+        if not file_data.get("content_range"):
+            file_data["disk_cache_writer"] = disk_cache.writer(
+                disk_cache_key, metadata, size=file_data.get("content_length")
+            )
+    elif len(file_data["content"]) <= disk_cache.max_entry_size:
+        disk_cache.set(disk_cache_key, file_data["content"], metadata)
+
+
+def get_content_stream_from_s3(
+    client, bucket_name, candidates, max_buffered_size=None, byte_range=None, **kwargs
+):
+    """Open the first of the candidate keys that exists, reading its body only if
+    it is small enough to buffer. See `get_content_from_s3`."""
+    if byte_range:
+        kwargs["byte_range"] = byte_range
+    if len(candidates) == 1:
+        file_data = timed_s3_fetch(
+            get_file_stream, 0, client, bucket_name, candidates[0], **kwargs
+        )
+    else:
+        file_data = probe_s3_keys(client, bucket_name, candidates, **kwargs)
+    if not file_data or byte_range or file_data.get("not_modified"):
+        return file_data
+    content_length = file_data["content_length"]
+    if max_buffered_size is not None and (
+        content_length is None or content_length > max_buffered_size
+    ):
+        return file_data
+    stream = file_data.pop("stream")
+    file_data["content"] = stream.read()
+    stream.close()
+    for name in ("content_length", "content_range"):
+        file_data.pop(name)
+    return file_data
+
+
+_s3_probe_executor = None
+_s3_probe_executor_pid = None
+_s3_probe_executor_lock = threading.Lock()
+
+
+def get_s3_probe_executor():
+    """Get the thread pool used to request candidate keys concurrently.
+
+    Under the gevent worker the threads are greenlets. As with the S3 client, a new
+    pool is created after a fork, since the parent's threads don't survive it.
+    """
+    global _s3_probe_executor, _s3_probe_executor_pid
+    pid = os.getpid()
+    if _s3_probe_executor is None or _s3_probe_executor_pid != pid:
+        with _s3_probe_executor_lock:
+            if _s3_probe_executor is None or _s3_probe_executor_pid != pid:
+                _s3_probe_executor = ThreadPoolExecutor(
+                    max_workers=settings.STATIC_CONTENT_S3_PROBE_WORKERS,
+                    thread_name_prefix="s3-probe",
+                )
+                _s3_probe_executor_pid = pid
+    return _s3_probe_executor
+
+
+def probe_s3_keys(client, bucket_name, s3_keys, fetch=None, discard=None, **kwargs):
+    """Request the given S3 keys concurrently and return the file data of the first
+    one, in the order given, that exists.
+
+    `fetch` is called with the client, bucket name, S3 key and `kwargs` for each
+    key, and defaults to `get_file_stream`, so only the winner's body is ever read.
+    Waits only for the keys ahead of the winner; requests for the keys after it
+    that have not started yet are cancelled, and the results of those in flight
+    are passed to `discard`, which defaults to closing their streams.
+    """
+    fetch = fetch or get_file_stream
+    discard = discard or close_file_stream
+    executor = get_s3_probe_executor()
+    futures = [
+        executor.submit(
+            timed_s3_fetch, fetch, rank, client, bucket_name, s3_key, **kwargs
+        )
+        for rank, s3_key in enumerate(s3_keys)
+    ]
+    winner = None
+    try:
+        for future in futures:
+            file_data = future.result()
+            if file_data:
+                winner = future
+                return file_data
+    finally:
+        for future in futures:
+            if future is winner or future.cancel():
+                continue
+            future.add_done_callback(functools.partial(_discard_result, discard))
+    return None
+
+
+def _discard_result(discard, future):
+    if not future.cancelled() and future.exception() is None and future.result():
+        discard(future.result())
+
+
+def get_file_stream(client, bucket_name, s3_key, byte_range=None, if_none_match=None):
+    """Open an S3 object without reading its body. Returns the file data with the
+    body in "stream", or None if there is no such object.
+
+    `byte_range` is an HTTP Range header value; an unsatisfiable range raises the
+    ClientError so it can be answered with a 416. `if_none_match` works as in
+    `get_file_data`.
+    """
+    params = {"Bucket": bucket_name, "Key": s3_key.lstrip("/")}
+    if byte_range:
+        params["Range"] = byte_range
+    if if_none_match:
+        params["IfNoneMatch"] = if_none_match
+    try:
+        response = client.get_object(**params)
+    except ClientError as e:
+        if if_none_match and is_not_modified_error(e):
+            return {"not_modified": True, "content_key": s3_key, "etag": if_none_match}
+        if e.response.get("Error", {}).get("Code") == "InvalidRange":
+            raise
+        logger.exception(
+            "get_content_from_s3_error",
+            s3_key=s3_key,
+            error=str(e),
+            function_name="get_content_from_s3",
+        )
+        return None
+    return extract_file_stream(response, s3_key)
+
+
+def extract_file_stream(response, s3_key):
+    """Like `extract_file_data`, but leaves the body unread in "stream", along with
+    the length and range of the content it returns."""
+    return {
+        "stream": response["Body"],
+        "content_key": s3_key,
+        "content_type": get_content_type(s3_key, response["ContentType"]),
+        "content_length": response.get("ContentLength"),
+        "content_range": response.get("ContentRange"),
+        "last_modified": response["LastModified"],
+        "etag": response.get("ETag"),
+    }
+
+
+def close_file_stream(file_data):
+    """Close the body of file data returned by `get_file_stream`, releasing its
+    connection, without reading it."""
+    if "stream" in file_data:
+        file_data["stream"].close()
+    if file_data.get("disk_cache_writer"):
+        file_data["disk_cache_writer"].abort()
+
+
+def iter_file_stream(stream, chunk_size=S3_STREAM_CHUNK_SIZE, disk_cache_writer=None):
+    """Yield an S3 body (or a file) in chunks, closing it when done or when the
+    response is closed early.
+
+    If a `core.diskcache.DiskCacheWriter` is given, the chunks are also written to
+    the disk cache, and stored there once the whole body has been read.
+    """
+    if hasattr(stream, "iter_chunks"):
+        chunks = stream.iter_chunks(chunk_size)
+    else:
+        chunks = iter(functools.partial(stream.read, chunk_size), b"")
+    try:
+        for chunk in chunks:
+            if disk_cache_writer:
+                disk_cache_writer.write(chunk)
+            yield chunk
+        if disk_cache_writer:
+            disk_cache_writer.commit()
+    finally:
+        stream.close()
+        if disk_cache_writer:
+            disk_cache_writer.abort()
+
+
 def get_content_type(s3_key, content_type):
     """In some cases, manually set the content-type for a given S3 key based on the
     file extension. This is useful for files types that are not recognized by S3, or for
@@ -134,12 +413,21 @@ def get_content_type(s3_key, content_type):
     return content_type
 
 
-def get_file_data(client, bucket_name, s3_key):
-    """Get the file data from S3. Returns the decoded file contents if able."""
+def get_file_data(client, bucket_name, s3_key, if_none_match=None):
+    """Get the file data from S3. Returns the decoded file contents if able.
+
+    If `if_none_match` is given and the object's ETag matches it, the object isn't
+    downloaded and `{"not_modified": True, ...}` is returned.
+    """
+    params = {"Bucket": bucket_name, "Key": s3_key.lstrip("/")}
+    if if_none_match:
+        params["IfNoneMatch"] = if_none_match
     try:
-        response = client.get_object(Bucket=bucket_name, Key=s3_key.lstrip("/"))
+        response = client.get_object(**params)
         return extract_file_data(response, s3_key)
     except ClientError as e:
+        if if_none_match and is_not_modified_error(e):
+            return {"not_modified": True, "content_key": s3_key, "etag": if_none_match}
         # Log the exception but ignore it otherwise, since it's not necessarily an error
         logger.exception(
             "get_content_from_s3_error",
@@ -150,16 +438,69 @@ def get_file_data(client, bucket_name, s3_key):
     return
 
 
-def get_s3_client():
-    """Get an S3 client."""
-    return boto3.client(
+_s3_client = None
+_s3_client_pid = None
+_s3_client_lock = threading.Lock()
+
+
+def create_s3_client():
+    """Create a new S3 client for the static content bucket, with connection pool,
+    timeouts and retries configured from settings.
+
+    The client uses the default endpoint of the region unless
+    `STATIC_CONTENT_AWS_S3_ENDPOINT_URL` is set."""
+    config = Config(
+        max_pool_connections=settings.STATIC_CONTENT_S3_MAX_POOL_CONNECTIONS,
+        connect_timeout=settings.STATIC_CONTENT_S3_CONNECT_TIMEOUT,
+        read_timeout=settings.STATIC_CONTENT_S3_READ_TIMEOUT,
+        retries={
+            "mode": settings.STATIC_CONTENT_S3_RETRY_MODE,
+            "max_attempts": settings.STATIC_CONTENT_S3_MAX_ATTEMPTS,
+        },
+        tcp_keepalive=True,
+    )
+    # Use a dedicated session: creating clients from the default session is not
+    # thread-safe.
+    session = boto3.session.Session()
+    kwargs = {}
+    if settings.STATIC_CONTENT_AWS_S3_ENDPOINT_URL:
+        kwargs["endpoint_url"] = settings.STATIC_CONTENT_AWS_S3_ENDPOINT_URL
+    return session.client(
         "s3",
         aws_access_key_id=settings.STATIC_CONTENT_AWS_ACCESS_KEY_ID,
         aws_secret_access_key=settings.STATIC_CONTENT_AWS_SECRET_ACCESS_KEY,
         region_name=settings.STATIC_CONTENT_REGION,
+        config=config,
+        **kwargs,
     )
 
 
+def get_s3_client():
+    """Get the shared S3 client.
+
+    The client is created on first use and then reused, so requests share its pool
+    of keep-alive connections instead of paying for a new client and TLS handshake
+    each time. boto3 clients are safe to share between threads and greenlets, but
+    not between processes, so a new client is created after a fork.
+    """
+    global _s3_client, _s3_client_pid
+    pid = os.getpid()
+    if _s3_client is None or _s3_client_pid != pid:
+        with _s3_client_lock:
+            if _s3_client is None or _s3_client_pid != pid:
+                _s3_client = create_s3_client()
+                _s3_client_pid = pid
+    return _s3_client
+
+
+def reset_s3_client():
+    """Drop the shared S3 client, e.g. after changing the S3 settings."""
+    global _s3_client, _s3_client_pid
+    with _s3_client_lock:
+        _s3_client = None
+        _s3_client_pid = None
+
+
 def does_s3_key_exist(client, bucket_name, s3_key):
     try:
         client.head_object(Bucket=bucket_name, Key=s3_key.lstrip("/"))
@@ -169,6 +510,76 @@ def does_s3_key_exist(client, bucket_name, s3_key):
         return False
 
 
+class StaticContentMapping:
+    """The STATIC_CONTENT_MAPPING config compiled into a prefix trie of site paths.
+
+    Resolving a content path walks the trie once, instead of testing every entry of
+    the config, and the results are memoized in a bounded LRU cache.
+    """
+
+    def __init__(self, config_data, cache_size=MAPPING_LOOKUP_CACHE_SIZE):
+        self.root = {}
+        for index, item in enumerate(config_data):
+            node = self.root
+            for char in item["site_path"]:
+                node = node.setdefault(char, {})
+            # The None key holds the entries whose site_path ends at this node
+            node.setdefault(None, []).append(
+                (index, item["site_path"], item["s3_path"])
+            )
+        self.get_s3_keys = functools.lru_cache(maxsize=cache_size)(self._get_s3_keys)
+
+    def _get_s3_keys(self, content_path):
+        # Collect every site_path that is a prefix of the content path
+        matches = list(self.root.get(None, []))
+        node = self.root
+        for char in content_path:
+            node = node.get(char)
+            if node is None:
+                break
+            matches.extend(node.get(None, []))
+        # Keep the order of the config file
+        matches.sort()
+
+        s3_keys = []
+        for _, site_path, s3_path in matches:
+            if site_path == "/":
+                if s3_path in content_path:
+                    s3_keys.append(content_path)
+                else:
+                    s3_keys.append(os.path.join(s3_path, content_path.lstrip("/")))
+            else:
+                s3_keys.append(content_path.replace(site_path, s3_path))
+        return tuple(s3_keys)
+
+
+_static_content_mappings = {}
+_static_content_mappings_lock = threading.Lock()
+
+
+def get_static_content_mapping(config_file_path):
+    """Return the compiled StaticContentMapping for a config file.
+
+    The file is loaded once and reloaded when its modification time changes. The
+    modification time is checked at most every MAPPING_CHECK_INTERVAL seconds.
+    """
+    now = time.monotonic()
+    loaded = _static_content_mappings.get(config_file_path)
+    if loaded and now - loaded["checked_at"] < MAPPING_CHECK_INTERVAL:
+        return loaded["mapping"]
+
+    with _static_content_mappings_lock:
+        loaded = _static_content_mappings.get(config_file_path)
+        mtime = os.stat(config_file_path).st_mtime_ns
+        if not loaded or loaded["mtime"] != mtime:
+            with open(config_file_path, "r") as f:
+                config_data = json.load(f)
+            loaded = {"mapping": StaticContentMapping(config_data), "mtime": mtime}
+            _static_content_mappings[config_file_path] = loaded
+        loaded["checked_at"] = now
+        return loaded["mapping"]
+
+
 def get_s3_keys(content_path, config_filename=None):
     """
     Get the S3 key for a given content path
@@ -184,24 +595,46 @@ def get_s3_keys(content_path, config_filename=None):
     if not content_path.startswith("/"):
         content_path = f"/{content_path}"
 
-    with open(config_file_path, "r") as f:
-        config_data = json.load(f)
+    mapping = get_static_content_mapping(config_file_path)
+    return list(mapping.get_s3_keys(content_path))
 
-    s3_keys = []
-    for item in config_data:
-        site_path = item["site_path"]
-        s3_path = item["s3_path"]
 
-        if site_path == "/" and content_path.startswith(site_path):
-            if s3_path in content_path:
-                s3_keys.append(content_path)
-            else:
-                s3_keys.append(os.path.join(s3_path, content_path.lstrip("/")))
+class ImageTagFinder(HTMLParser):
+    """Tokenizes a document and records where its `img` tags are, without building
+    a tree."""
 
-        elif content_path.startswith(site_path):
-            s3_keys.append(content_path.replace(site_path, s3_path))
-
-    return s3_keys
+    def __init__(self):
+        super().__init__(convert_charrefs=False)
+        # ((line, column), tag text) of each img tag, in document order
+        self.img_tags = []
+
+    def handle_starttag(self, tag, attrs):
+        if tag == "img":
+            self.img_tags.append((self.getpos(), self.get_starttag_text()))
+
+
+def rewrite_img_src(tag_text, s3_path):
+    """Return the text of an `img` tag with its relative `src` prefixed with
+    `s3_path`. The rest of the tag is left as it is."""
+    # Attributes are matched one after the other, so a quoted value that contains
+    # "src=" is not taken for the attribute.
+    for match in IMG_ATTRIBUTE_RE.finditer(tag_text, len("<img")):
+        if match.group("name").lower() != "src" or match.group("value") is None:
+            continue
+        value = match.group("value")
+        if value[0] in ("'", '"'):
+            quote, original_src = value[0], value[1:-1]
+        else:
+            quote, original_src = '"', value
+        if original_src.startswith(("http://", "https://")):
+            return tag_text
+        # Construct the new absolute URL for the image
+        new_src = "/".join([s3_path, original_src])
+        if not new_src.startswith("/"):
+            new_src = f"/{new_src}"
+        start, end = match.span("value")
+        return f"{tag_text[:start]}{quote}{new_src}{quote}{tag_text[end:]}"
+    return tag_text
 
 
 def convert_img_paths(html_content: str, s3_path: str = None):
@@ -227,6 +660,9 @@ def convert_img_paths(html_content: str, s3_path: str = None):
     by routing them through our `/images/` view, which will retrieve them from S3
     directly.
 
+    The document is tokenized rather than parsed into a tree, and only the `src`
+    attributes of `img` tags are changed: everything else is copied as it is.
+
     NOTE: This hasn't been well-tested and it's possible it will need updates as
     we encounter more special cases related to the static content.
     """
@@ -238,18 +674,27 @@ def convert_img_paths(html_content: str, s3_path: str = None):
             f"HTML content must be a string, and it is {type(html_content)}."
         )
 
-    soup = BeautifulSoup(html_content, "html.parser")
-
-    for img in soup.find_all("img"):
-        original_src = img.get("src", "")
-        if not original_src.startswith(("http://", "https://")):
-            # Construct the new absolute URL for the image
-            new_src = "/".join([s3_path, original_src])
-            if not new_src.startswith("/"):
-                new_src = f"/{new_src}"
-            img["src"] = new_src
-
-    return str(soup)
+    if not IMG_TAG_RE.search(html_content):
+        return html_content
+
+    finder = ImageTagFinder()
+    finder.feed(html_content)
+    finder.close()
+    if not finder.img_tags:
+        return html_content
+
+    # The parser gives positions as (line, column), turn them into offsets
+    line_offsets = [0]
+    line_offsets.extend(match.end() for match in re.finditer("\n", html_content))
+    parts = []
+    copied = 0
+    for (line, column), tag_text in finder.img_tags:
+        start = line_offsets[line - 1] + column
+        parts.append(html_content[copied:start])
+        parts.append(rewrite_img_src(tag_text, s3_path))
+        copied = start + len(tag_text)
+    parts.append(html_content[copied:])
+    return "".join(parts)
 
 
 class Youtube(SpanToken):
@@ -282,13 +727,58 @@ class NoStyleHtmlFormatter(Formatter):
             outfile.write(html.escape(value))
 
 
+# Number of highlighted code blocks kept in memory, by language and code
+HIGHLIGHT_CACHE_SIZE = 1024
+# Only this many characters of a code block without a (known) language are used to
+# guess its language: guessing runs every lexer over the text.
+GUESS_LEXER_MAX_LENGTH = 1000
+# Most code blocks in the docs are C++, so code that looks like it is lexed as C++
+# without guessing.
+CPP_CODE_RE = re.compile(
+    r"^\s*#(?:include|define|if|ifdef|ifndef|pragma)\b"
+    r"|\b(?:std|boost)::"
+    r"|\btemplate\s*<"
+    r"|\bnamespace\s+\w+\s*(?:\{|=)"
+    r"|\b(?:int|void|auto)\s+main\s*\(",
+    re.MULTILINE,
+)
+
+
+@functools.lru_cache(maxsize=128)
+def get_lexer_for_language(language):
+    """Return the Pygments lexer for a fence language, e.g. `cpp`, or None if
+    there isn't one."""
+    try:
+        return get_lexer(language)
+    except ClassNotFound:
+        return None
+
+
+def resolve_lexer(language, code):
+    """Return the lexer for a code block: the one for its language if it is known,
+    C++ if it looks like C++, and otherwise the one Pygments guesses from the start
+    of the code."""
+    lexer = get_lexer_for_language(language) if language else None
+    if lexer is None and CPP_CODE_RE.search(code):
+        lexer = get_lexer_for_language("cpp")
+    if lexer is None:
+        lexer = guess_lexer(code[:GUESS_LEXER_MAX_LENGTH])
+    return lexer
+
+
+@functools.lru_cache(maxsize=HIGHLIGHT_CACHE_SIZE)
+def highlight_code(language, code, formatter):
+    """Return the highlighted HTML for a code block. The same snippets appear in
+    many documents, so the result is cached."""
+    return highlight(code, resolve_lexer(language, code), formatter)
+
+
 class PygmentsRenderer(HtmlRenderer):
     formatter = NoStyleHtmlFormatter(nowrap=True)
 
     def render_block_code(self, token):
         code = token.children[0].content
-        lexer = get_lexer(token.language) if token.language else guess_lexer(code)
-        tokenized_code = highlight(code, lexer, self.formatter)
+        tokenized_code = highlight_code(token.language, code, self.formatter)
         return f'<pre class="highlightjs highlight"><code class="language-{token.language} hljs">{tokenized_code}</code></pre>'  # noqa E501
 
 
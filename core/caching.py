@@ -0,0 +1,385 @@
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT
+
+from .compression import compress_content
+from .localcache import get_local_cache, publish_invalidation
+from .metrics import CACHE_LOOKUPS
+
+# Cache keys of the generation counters of static content: for all of it, by content
+# type and by release (the first segment of its path, e.g. `1_86_0` or `develop`).
+GENERATION_CACHE_KEY = "static_content_generation"
+CONTENT_TYPE_GENERATION_CACHE_KEY = "static_content_generation_type_{}"
+RELEASE_GENERATION_CACHE_KEY = "static_content_generation_release_{}"
+# Cache key of the generation counter of the local disk caches of S3 objects (see
+# `core.diskcache`). Flushes and cleared keys increment it, after which entries on
+# disk are revalidated with S3 before they are used again.
+DISK_CACHE_GENERATION_CACHE_KEY = "static_content_generation_disk"
+# Generation counters are read from Redis at most once per this many seconds per
+# process, so a flush takes up to this long to be seen everywhere.
+GENERATION_CHECK_INTERVAL = 1
+
+# Generation counters read by this process: {cache key: (value, read at)}
+_generations = {}
+
+# The modernization variants a processed page can be rendered with. These match the
+# values accepted by the `modernize` query parameter of the docs views.
+PROCESSED_CONTENT_VARIANTS = ("max", "med", "min")
+
+
+def get_source_hash(content):
+    """Return a stable hash of the raw (unprocessed) content.
+
+    Content from S3 is bytes, content from the database is a string; both hash to
+    the same value for the same text.
+    """
+    if isinstance(content, str):
+        content = content.encode("utf-8")
+    return hashlib.sha256(content).hexdigest()
+
+
+def get_static_content(cache_key):
+    """Return the value cached under `cache_key` in the `static_content` cache,
+    looking in this process's local cache first, or None."""
+    local_cache = get_local_cache()
+    cached = local_cache.get(cache_key) if local_cache else None
+    if local_cache:
+        CACHE_LOOKUPS.labels(
+            tier="local", result="miss" if cached is None else "hit"
+        ).inc()
+    if cached is None:
+        cached = caches["static_content"].get(cache_key)
+        CACHE_LOOKUPS.labels(tier="redis", result="hit" if cached else "miss").inc()
+        if cached and local_cache:
+            local_cache.set(cache_key, cached)
+    return cached if cached else None
+
+
+def set_static_content(cache_key, result, timeout=DEFAULT_TIMEOUT, stale=False):
+    """Cache the static content `result` under `cache_key`.
+
+    The content is fresh for `timeout` seconds (the soft timeout, the cache's
+    own timeout by default). It is then kept for `STATIC_CONTENT_STALE_TIMEOUT`
+    more seconds (the hard timeout), during which it is served stale while it is
+    refreshed in the background. `stale` caches it as already due for a refresh.
+    """
+    cache = caches["static_content"]
+    if timeout is DEFAULT_TIMEOUT:
+        timeout = cache.default_timeout
+    result = {
+        **result,
+        "generation": get_generation(cache_key, result.get("content_type")),
+    }
+    if timeout is None:
+        # Never expires, so never needs a refresh
+        cache.set(cache_key, result, timeout=None)
+        return
+    refresh_at = time.time() + (0 if stale else timeout)
+    cache.set(
+        cache_key,
+        {**result, "refresh_at": refresh_at},
+        timeout=timeout + settings.STATIC_CONTENT_STALE_TIMEOUT,
+    )
+
+
+def is_stale(result):
+    """Return True if the cached static content is past its soft timeout."""
+    refresh_at = result.get("refresh_at")
+    return refresh_at is not None and refresh_at <= time.time()
+
+
+def get_release(cache_key):
+    """Return the release a static content cache key belongs to: the first segment
+    of its path, without a `boost_` prefix, e.g. `1_86_0` for
+    `static_content_boost_1_86_0/libs/any/index.html`."""
+    path = cache_key.removeprefix("static_content_").lstrip("/")
+    return path.split("/", 1)[0].removeprefix("boost_")
+
+
+def get_generation_cache_keys(cache_key, content_type):
+    """Return the cache keys of the generation counters that apply to the static
+    content cached under `cache_key`."""
+    return [
+        GENERATION_CACHE_KEY,
+        CONTENT_TYPE_GENERATION_CACHE_KEY.format(content_type),
+        RELEASE_GENERATION_CACHE_KEY.format(get_release(cache_key)),
+    ]
+
+
+def get_generation(cache_key, content_type):
+    """Return the current generation of the static content cached under
+    `cache_key`: the values of its generation counters."""
+    return get_counter_values(get_generation_cache_keys(cache_key, content_type))
+
+
+def get_disk_cache_generation():
+    """Return the current generation of the disk caches of S3 objects."""
+    return get_counter_values([DISK_CACHE_GENERATION_CACHE_KEY])[0]
+
+
+def get_counter_values(counter_keys):
+    """Return the values of generation counters, read from the cache at most once
+    per `GENERATION_CHECK_INTERVAL`."""
+    now = time.monotonic()
+    expired = [
+        key
+        for key in counter_keys
+        if now - _generations.get(key, (None, 0))[1] >= GENERATION_CHECK_INTERVAL
+    ]
+    if expired:
+        values = caches["static_content"].get_many(expired)
+        for key in expired:
+            _generations[key] = (values.get(key, 0), now)
+    return tuple(_generations[key][0] for key in counter_keys)
+
+
+def is_current_generation(cache_key, result):
+    """Return False if the cached static content was flushed since it was cached,
+    see `flush_static_content`."""
+    generation = result.get("generation")
+    if generation is None:
+        return True
+    return tuple(generation) == get_generation(cache_key, result.get("content_type"))
+
+
+def flush_static_content(content_type=None, release=None):
+    """Invalidate the cached static content of a content type, of a release, or all
+    of it.
+
+    This increments a generation counter: cached content is stamped with the
+    generations it was cached under and treated as missing when they are outdated,
+    so nothing is deleted, and the old entries expire on their own.
+    """
+    if content_type is not None:
+        counter_key = CONTENT_TYPE_GENERATION_CACHE_KEY.format(content_type)
+    elif release is not None:
+        counter_key = RELEASE_GENERATION_CACHE_KEY.format(release)
+    else:
+        counter_key = GENERATION_CACHE_KEY
+    generation = increment_counter(counter_key)
+    invalidate_disk_cache()
+    # Drop the flushed content from the memory of every process
+    publish_invalidation()
+    return generation
+
+
+def invalidate_disk_cache():
+    """Make the disk caches of S3 objects revalidate their entries with S3 before
+    using them again. The disk caches are keyed by S3 key rather than by cache key,
+    so this applies to all their entries."""
+    increment_counter(DISK_CACHE_GENERATION_CACHE_KEY)
+
+
+def increment_counter(counter_key):
+    """Increment a generation counter and return its new value."""
+    cache = caches["static_content"]
+    cache.add(counter_key, 0, timeout=None)
+    generation = cache.incr(counter_key)
+    _generations.pop(counter_key, None)
+    return generation
+
+
+def get_refresh_lock_cache_key(cache_key):
+    """Return the cache key held while the content stored under `cache_key` is
+    being refreshed, e.g. `static_content_{path}_refreshing`."""
+    return f"{cache_key}_refreshing"
+
+
+def acquire_refresh_lock(cache_key):
+    """Return True if the caller should refresh the content stored under
+    `cache_key`, or False if a refresh is already scheduled.
+
+    The lock expires after `STATIC_CONTENT_REFRESH_LOCK_TIMEOUT` seconds, so a
+    refresh that never ran or failed is retried by a later request.
+    """
+    cache = caches["static_content"]
+    return cache.add(
+        get_refresh_lock_cache_key(cache_key),
+        True,
+        timeout=settings.STATIC_CONTENT_REFRESH_LOCK_TIMEOUT,
+    )
+
+
+def release_refresh_lock(cache_key):
+    """Allow the content stored under `cache_key` to be refreshed again."""
+    cache = caches["static_content"]
+    cache.delete(get_refresh_lock_cache_key(cache_key))
+
+
+def get_processed_content_cache_key(cache_key, variant):
+    """Return the cache key for the processed version of the content stored under
+    `cache_key`, e.g. `static_content_{path}_processed_med`."""
+    return f"{cache_key}_processed_{variant}"
+
+
+def get_processed_content_cache_keys(cache_key):
+    """Return all the processed content cache keys derived from `cache_key`."""
+    return [
+        get_processed_content_cache_key(cache_key, variant)
+        for variant in PROCESSED_CONTENT_VARIANTS
+    ]
+
+
+def get_processed_content(cache_key, variant, source_hash, rules_version):
+    """Return the cached processed content, or None.
+
+    A cached entry is only used when it was produced from the same source content,
+    with the same version of the transformation rules and by the deployed
+    `IMAGE_TAG`, since the templates and code they use change with it.
+    """
+    cached = get_static_content(get_processed_content_cache_key(cache_key, variant))
+    if not cached:
+        return None
+    if (
+        cached.get("source_hash") != source_hash
+        or cached.get("rules_version") != rules_version
+        or cached.get("image_tag") != settings.IMAGE_TAG
+    ):
+        return None
+    return cached.get("content")
+
+
+def set_processed_content(
+    cache_key, variant, source_hash, rules_version, content, timeout=DEFAULT_TIMEOUT
+):
+    """Cache the processed content for `cache_key` and `variant`."""
+    cache = caches["static_content"]
+    cache.set(
+        get_processed_content_cache_key(cache_key, variant),
+        {
+            "source_hash": source_hash,
+            "rules_version": rules_version,
+            "image_tag": settings.IMAGE_TAG,
+            "content": content,
+        },
+        timeout=timeout,
+    )
+
+
+def get_encoded_content_cache_key(cache_key):
+    """Return the cache key for the compressed variants of the response built from
+    the content stored under `cache_key`, e.g. `static_content_{path}_encoded`."""
+    return f"{cache_key}_encoded"
+
+
+def get_encoded_content(cache_key, source_hash, version):
+    """Return the cached compressed variants of the response, by content encoding,
+    or None.
+
+    Like processed content, they are only used when they were produced from the
+    same source content and by the same version of the code.
+    """
+    cached = get_static_content(get_encoded_content_cache_key(cache_key))
+    if not cached:
+        return None
+    if cached.get("source_hash") != source_hash or cached.get("version") != version:
+        return None
+    return cached.get("variants")
+
+
+def set_encoded_content(
+    cache_key, source_hash, version, content, timeout=DEFAULT_TIMEOUT
+):
+    """Compress the response `content` built from the content stored under
+    `cache_key`, cache the variants and return them."""
+    variants = compress_content(content)
+    cache = caches["static_content"]
+    cache.set(
+        get_encoded_content_cache_key(cache_key),
+        {"source_hash": source_hash, "version": version, "variants": variants},
+        timeout=timeout,
+    )
+    return variants
+
+
+def get_conversion_cache_key(renderer, source, options=()):
+    """Return the cache key for the output of `renderer` for the `source` text, e.g.
+    `converted_asciidoc_{hash}`.
+
+    The hash covers the deployed `IMAGE_TAG` too, since the renderers and their
+    configuration change with it, and the `options` the output depends on.
+    """
+    digest = hashlib.sha256()
+    for part in (renderer, settings.IMAGE_TAG, *options, source):
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\0")
+    return f"converted_{renderer}_{digest.hexdigest()}"
+
+
+def memoize_conversion(renderer, source, convert, options=()):
+    """Return `convert(source)`, reusing the cached result of an earlier conversion
+    of the same text by the same renderer with the same `options` (strings).
+
+    Results are kept for `CONVERSION_CACHE_TIMEOUT` seconds; 0 disables the cache.
+    """
+    timeout = settings.CONVERSION_CACHE_TIMEOUT
+    if not timeout:
+        return convert(source)
+    cache = caches["static_content"]
+    cache_key = get_conversion_cache_key(renderer, source, options)
+    result = cache.get(cache_key)
+    if result is None:
+        result = convert(source)
+        cache.set(cache_key, result, timeout=timeout)
+    return result
+
+
+def get_missing_content_cache_key(cache_key):
+    """Return the cache key recording that there is no content for `cache_key`,
+    e.g. `static_content_{path}_missing`."""
+    return f"{cache_key}_missing"
+
+
+def is_missing_content(cache_key):
+    """Return True if the content for `cache_key` was recently looked up and not
+    found."""
+    cache = caches["static_content"]
+    return bool(cache.get(get_missing_content_cache_key(cache_key)))
+
+
+def set_missing_content(cache_key, timeout=None):
+    """Record that there is no content for `cache_key`, so repeated requests for it
+    can be answered without going to the database and S3.
+
+    The entry expires after `STATIC_CONTENT_MISSING_TIMEOUT` seconds, which keeps
+    the number of entries bounded by the rate of distinct missing paths.
+    """
+    if timeout is None:
+        timeout = settings.STATIC_CONTENT_MISSING_TIMEOUT
+    if not timeout:
+        return
+    cache = caches["static_content"]
+    cache.set(get_missing_content_cache_key(cache_key), True, timeout=timeout)
+
+
+def delete_missing_content(cache_key):
+    """Forget that the content for `cache_key` was missing."""
+    cache = caches["static_content"]
+    cache.delete(get_missing_content_cache_key(cache_key))
+
+
+def get_prerendered_cache_key(cache_key):
+    """Return the cache key recording that the content stored under `cache_key` was
+    pre-rendered, e.g. `static_content_{path}_prerendered`."""
+    return f"{cache_key}_prerendered"
+
+
+def delete_static_content_cache_keys(cache_keys):
+    """Delete the given static content cache keys along with their processed
+    variants, compressed variants, missing content and pre-rendering entries, here
+    and in the local cache of every process. Entries of the disk caches are
+    revalidated before they are used again."""
+    cache = caches["static_content"]
+    keys = []
+    for cache_key in cache_keys:
+        keys.append(cache_key)
+        keys.extend(get_processed_content_cache_keys(cache_key))
+        keys.append(get_encoded_content_cache_key(cache_key))
+        keys.append(get_missing_content_cache_key(cache_key))
+        keys.append(get_prerendered_cache_key(cache_key))
+    cache.delete_many(keys)
+    invalidate_disk_cache()
+    publish_invalidation(keys)
@@ -0,0 +1,143 @@
+from urllib.parse import quote
+
+import requests
+import structlog
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+logger = structlog.get_logger()
+
+# Surrogate keys of responses, which the CDN can purge by. Keys are separated by
+# spaces in the Surrogate-Key header.
+# Every response of the static content views
+STATIC_CONTENT_KEY = "static-content"
+# Pages of the latest release, e.g. /doc/libs/release/ and /releases/latest/. This
+# key was set by the CDN configuration before responses carried their own keys.
+RELEASE_KEY = "release"
+# Pages that list the versions, e.g. in the version dropdown
+VERSIONS_KEY = "versions"
+# Pages that list the libraries
+LIBRARIES_KEY = "libraries"
+# Number of leading segments of a content path that get a key of their own
+PATH_KEY_DEPTH = 4
+# Fastly's limit for the length of a key
+MAX_KEY_LENGTH = 1024
+# Fastly's limit for the number of keys purged by a request
+PURGE_BATCH_SIZE = 256
+
+
+def get_version_key(version_slug):
+    """Return the surrogate key of a release, e.g. `version-1_86_0` for "1_86_0"
+    (see `Version.stripped_boost_url_slug`)."""
+    return f"version-{version_slug}"
+
+
+def get_library_key(library_slug):
+    """Return the surrogate key of a library, e.g. `library-json`."""
+    return f"library-{library_slug}"
+
+
+def get_content_type_key(content_type):
+    """Return the surrogate key of a content type, e.g. `type-text/html` for
+    "text/html; charset=utf-8"."""
+    return f"type-{content_type.split(';')[0].strip()}"
+
+
+def get_path_key(content_path):
+    """Return the surrogate key of a content path, e.g. `path-1_86_0/libs/json`."""
+    return f"path-{quote(content_path.strip('/'), safe='/')}"
+
+
+def get_path_keys(content_path):
+    """Return the surrogate keys of a content path: those of its first
+    `PATH_KEY_DEPTH` directories, which purge the content under them, and its own.
+
+    For example `1_86_0/libs/json/doc/index.html` has the keys of `1_86_0`,
+    `1_86_0/libs`, `1_86_0/libs/json`, `1_86_0/libs/json/doc` and itself.
+    """
+    segments = content_path.strip("/").split("/")
+    prefixes = [
+        "/".join(segments[:depth])
+        for depth in range(1, min(len(segments), PATH_KEY_DEPTH + 1))
+    ]
+    return [get_path_key(path) for path in [*prefixes, content_path]]
+
+
+def patch_surrogate_keys(response, keys):
+    """Add `keys` to the Surrogate-Key header of `response`, keeping those already
+    there. Keys longer than Fastly accepts are left out."""
+    existing = response.headers.get("Surrogate-Key", "").split()
+    keys = [key for key in keys if key and len(key) <= MAX_KEY_LENGTH]
+    merged = list(dict.fromkeys([*existing, *keys]))
+    if merged:
+        response.headers["Surrogate-Key"] = " ".join(merged)
+    return response
+
+
+class SurrogateKeyMixin:
+    """Adds the keys returned by `get_surrogate_keys` to the Surrogate-Key header
+    of the view's responses, so the CDN can purge them when what they show
+    changes."""
+
+    def dispatch(self, request, *args, **kwargs):
+        response = super().dispatch(request, *args, **kwargs)
+        return patch_surrogate_keys(response, self.get_surrogate_keys())
+
+    def get_surrogate_keys(self):
+        return []
+
+
+class FastlyPurgeClient:
+    """Soft purges surrogate keys from the Fastly services in settings."""
+
+    def purge(self, keys):
+        if not settings.FASTLY_API_TOKEN or settings.FASTLY_API_TOKEN == "empty":
+            logger.warning("FASTLY_API_TOKEN not found. Not purging cache.")
+            return
+
+        for service in [settings.FASTLY_SERVICE, settings.FASTLY_SERVICE2]:
+            if not service or service == "empty":
+                continue
+            for start in range(0, len(keys), PURGE_BATCH_SIZE):
+                batch = keys[start : start + PURGE_BATCH_SIZE]
+                response = requests.post(
+                    f"https://api.fastly.com/service/{service}/purge",
+                    headers={
+                        "Fastly-Key": settings.FASTLY_API_TOKEN,
+                        "Fastly-Soft-Purge": "1",
+                        "Surrogate-Key": " ".join(batch),
+                        "Accept": "application/json",
+                    },
+                    timeout=10,
+                )
+                logger.info(
+                    "fastly_purge_sent",
+                    service=service,
+                    keys=batch,
+                    status_code=response.status_code,
+                )
+
+
+# The keys purged by LocMemPurgeClient, one list per purge
+purges = []
+
+
+class LocMemPurgeClient:
+    """Records the purged keys in `purges` instead of sending them, for tests and
+    local development."""
+
+    def purge(self, keys):
+        purges.append(keys)
+
+
+def get_purge_client():
+    """Return an instance of the `CDN_PURGE_CLIENT` class."""
+    return import_string(settings.CDN_PURGE_CLIENT)()
+
+
+def purge_surrogate_keys(keys):
+    """Purge the responses with any of `keys` from the CDN."""
+    keys = list(dict.fromkeys(key for key in keys if key))
+    if not keys:
+        return
+    get_purge_client().purge(keys)
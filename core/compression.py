@@ -0,0 +1,94 @@
+import gzip
+
+import brotli
+from django_redis.compressors.zlib import ZlibCompressor
+
+# Content encodings we store precompressed variants in, by order of preference
+CONTENT_ENCODINGS = ("br", "gzip")
+# Content smaller than this many bytes isn't worth compressing
+MIN_COMPRESS_SIZE = 256
+# Compression is done once per content and cached, so favor size over speed, short
+# of brotli's slowest levels.
+BROTLI_QUALITY = 9
+GZIP_LEVEL = 9
+# Content types worth compressing, besides text/*. Others, like images, PDFs and
+# archives, are compressed already.
+COMPRESSIBLE_CONTENT_TYPES = (
+    "application/javascript",
+    "application/json",
+    "image/svg+xml",
+)
+
+
+def is_compressible(content_type):
+    """Return True if content of `content_type` is worth compressing."""
+    content_type = (content_type or "").split(";")[0].strip().lower()
+    return (
+        content_type.startswith("text/") or content_type in COMPRESSIBLE_CONTENT_TYPES
+    )
+
+
+def compress_content(content):
+    """Return the brotli and gzip variants of `content`, by content encoding, or an
+    empty dict if it is too small to be worth compressing."""
+    if isinstance(content, str):
+        content = content.encode("utf-8")
+    if len(content) < MIN_COMPRESS_SIZE:
+        return {}
+    return {
+        "br": brotli.compress(content, quality=BROTLI_QUALITY),
+        # A fixed mtime keeps the output, and so the cached value, stable
+        "gzip": gzip.compress(content, compresslevel=GZIP_LEVEL, mtime=0),
+    }
+
+
+def decompress_content(variants):
+    """Return the original content of the variants from `compress_content`."""
+    if "gzip" in variants:
+        return gzip.decompress(variants["gzip"])
+    return brotli.decompress(variants["br"])
+
+
+def get_accepted_encoding(accept_encoding, available=CONTENT_ENCODINGS):
+    """Return the preferred content encoding among `available` that the
+    Accept-Encoding header allows, or None if the content should be sent as is."""
+    qualities = {}
+    for part in (accept_encoding or "").split(","):
+        coding, _, params = part.strip().partition(";")
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        quality = 1.0
+        for param in params.split(";"):
+            name, _, value = param.strip().partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        qualities[coding] = quality
+
+    best, best_quality = None, 0.0
+    for coding in CONTENT_ENCODINGS:
+        if coding not in available:
+            continue
+        quality = qualities.get(coding, qualities.get("*", 0.0))
+        if quality > best_quality:
+            best, best_quality = coding, quality
+    return best
+
+
+class StaticContentCompressor(ZlibCompressor):
+    """Zlib-compresses the values of the static content cache that it shrinks, and
+    stores the others, like cached images and the brotli and gzip variants of
+    responses, as they are. django-redis reads values that aren't zlib data as they
+    are."""
+
+    # A value is stored compressed only if that takes at most this share of its size
+    max_ratio = 0.9
+
+    def compress(self, value):
+        compressed = super().compress(value)
+        if len(compressed) > len(value) * self.max_ratio:
+            return value
+        return compressed
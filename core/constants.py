@@ -4,3 +4,5 @@ from enum import Enum
 class SourceDocType(Enum):
     ASCIIDOC = "asciidoc"
     ANTORA = "antora"
+    # BoostBook and QuickBook pages
+    LEGACY = "legacy"
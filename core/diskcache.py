@@ -0,0 +1,376 @@
+import datetime
+import hashlib
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+
+import structlog
+from django.conf import settings
+
+from .caching import get_disk_cache_generation
+
+logger = structlog.get_logger()
+
+# Entries and blobs are only touched (marked as recently used) when their last touch
+# is older than this many seconds, to avoid a metadata write on every hit.
+TOUCH_INTERVAL = 60
+# The total size of the cache is checked each time a process has written this
+# fraction of its maximum size.
+SIZE_CHECK_INTERVAL = 0.05
+# After evicting, the cache is shrunk to this fraction of its maximum size, so
+# eviction doesn't run again on the next write.
+EVICTION_TARGET = 0.9
+# Temporary files older than this many seconds are left over from interrupted
+# writes and removed on eviction.
+STALE_TEMP_FILE_AGE = 60 * 60
+
+
+class DiskCache:
+    """A size-bounded cache of S3 objects on the local disk.
+
+    Object bodies are stored once per distinct content, in files named after the
+    SHA-256 of the content (`blobs/`). Each cache key has a small JSON entry
+    (`entries/`, named after the SHA-256 of the key) that points to its blob and
+    holds the object's metadata. Files are written to a temporary file and renamed
+    into place, so readers never see partial files, and several processes can share
+    the directory.
+
+    Reading an entry updates the modification time of its files; when the total
+    size exceeds `max_size`, the least recently used files are deleted, in the
+    background.
+
+    Entries record the generation of the disk caches they were last validated in
+    (see `core.caching.invalidate_disk_cache`), and are only fresh in the current
+    one.
+    """
+
+    def __init__(self, directory, max_size, max_entry_size, revalidate_after):
+        self.directory = directory
+        self.max_size = max_size
+        self.max_entry_size = max_entry_size
+        self.revalidate_after = revalidate_after
+        self.entries_dir = os.path.join(directory, "entries")
+        self.blobs_dir = os.path.join(directory, "blobs")
+        self.tmp_dir = os.path.join(directory, "tmp")
+        for path in (self.entries_dir, self.blobs_dir, self.tmp_dir):
+            os.makedirs(path, exist_ok=True)
+        # Bytes written by this process since the size was last checked. None
+        # forces a check on the first write, to account for other processes.
+        self._written = None
+        self._evicting = False
+        self._lock = threading.Lock()
+
+    def get_entry_path(self, key):
+        digest = hashlib.sha256(key.encode("utf-8")).hexdigest()
+        return os.path.join(self.entries_dir, digest[:2], f"{digest}.json")
+
+    def get_blob_path(self, content_hash):
+        return os.path.join(self.blobs_dir, content_hash[:2], content_hash)
+
+    def get(self, key):
+        """Return the entry for `key`, or None.
+
+        The entry is a dict of the metadata it was stored with, plus "path" (the
+        file holding the content), "size" and "validated_at".
+        """
+        entry_path = self.get_entry_path(key)
+        try:
+            with open(entry_path) as f:
+                entry = json.load(f)
+        except FileNotFoundError:
+            return None
+        except ValueError:
+            self._remove(entry_path)
+            return None
+
+        blob_path = self.get_blob_path(entry["content_hash"])
+        try:
+            self._touch(blob_path)
+        except FileNotFoundError:
+            # The content was evicted before its entry
+            self._remove(entry_path)
+            return None
+        self._touch(entry_path)
+        entry["path"] = blob_path
+        return entry
+
+    def is_fresh(self, entry):
+        """Return True if the entry was checked against S3 recently enough, and
+        since the static content was last cleared, to be used without revalidating
+        it."""
+        return (
+            entry.get("generation") == get_disk_cache_generation()
+            and time.time() - entry["validated_at"] < self.revalidate_after
+        )
+
+    def revalidate(self, key, entry):
+        """Record that S3 confirmed the entry is still current."""
+        entry = {k: v for k, v in entry.items() if k != "path"}
+        entry["validated_at"] = time.time()
+        entry["generation"] = get_disk_cache_generation()
+        self._write_entry(key, entry)
+
+    def read(self, entry):
+        """Return the content of an entry, or None if it was evicted meanwhile."""
+        try:
+            with open(entry["path"], "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def open(self, entry):
+        """Return the content of an entry as an open binary file, or None if it was
+        evicted meanwhile."""
+        try:
+            return open(entry["path"], "rb")
+        except FileNotFoundError:
+            return None
+
+    def set(self, key, content, metadata):
+        """Store `content` under `key` with the given JSON-serializable metadata."""
+        writer = self.writer(key, metadata)
+        if writer is None:
+            return
+        writer.write(content)
+        writer.commit()
+
+    def writer(self, key, metadata, size=None):
+        """Return a `DiskCacheWriter` to store content under `key` as it is read,
+        or None if `size` is known to be over `max_entry_size`."""
+        if size is not None and size > self.max_entry_size:
+            return None
+        return DiskCacheWriter(self, key, metadata)
+
+    def delete(self, key):
+        """Delete the entry for `key`. Its content is left for eviction, as other
+        entries may share it."""
+        self._remove(self.get_entry_path(key))
+
+    def _write_entry(self, key, entry):
+        entry_path = self.get_entry_path(key)
+        os.makedirs(os.path.dirname(entry_path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.tmp_dir)
+        with os.fdopen(fd, "w") as f:
+            json.dump(entry, f)
+        os.replace(tmp_path, entry_path)
+
+    def _commit(self, key, tmp_path, content_hash, size, metadata):
+        blob_path = self.get_blob_path(content_hash)
+        os.makedirs(os.path.dirname(blob_path), exist_ok=True)
+        if os.path.exists(blob_path):
+            # Same content as another entry
+            self._remove(tmp_path)
+            self._touch(blob_path, force=True)
+        else:
+            os.replace(tmp_path, blob_path)
+        self._write_entry(
+            key,
+            {
+                **metadata,
+                "key": key,
+                "content_hash": content_hash,
+                "size": size,
+                "validated_at": time.time(),
+                "generation": get_disk_cache_generation(),
+            },
+        )
+        self._account(size)
+
+    def _account(self, size):
+        with self._lock:
+            if self._written is not None:
+                self._written += size
+                if self._written < self.max_size * SIZE_CHECK_INTERVAL:
+                    return
+            if self._evicting:
+                return
+            self._written = 0
+            self._evicting = True
+        # Walking the cache takes a while on a large cache, so it doesn't hold up
+        # the request that wrote to it
+        run_in_os_thread(self._evict_in_background)
+
+    def _evict_in_background(self):
+        try:
+            self.evict()
+        finally:
+            self._evicting = False
+
+    def evict(self):
+        """Delete the least recently used files until the cache fits in
+        `max_size`."""
+        files = []
+        total = 0
+        now = time.time()
+        for root in (self.entries_dir, self.blobs_dir, self.tmp_dir):
+            for dirpath, _, filenames in os.walk(root):
+                for filename in filenames:
+                    path = os.path.join(dirpath, filename)
+                    try:
+                        stat = os.stat(path)
+                    except FileNotFoundError:
+                        continue
+                    if (
+                        root == self.tmp_dir
+                        and now - stat.st_mtime > STALE_TEMP_FILE_AGE
+                    ):
+                        self._remove(path)
+                        continue
+                    files.append((stat.st_mtime, stat.st_size, path))
+                    total += stat.st_size
+        if total <= self.max_size:
+            return
+
+        target = self.max_size * EVICTION_TARGET
+        evicted = 0
+        for _, size, path in sorted(files):
+            if total <= target:
+                break
+            if path.startswith(self.tmp_dir):
+                continue
+            self._remove(path)
+            total -= size
+            evicted += 1
+        logger.info(
+            "disk_cache_evicted",
+            directory=self.directory,
+            count=evicted,
+            size=total,
+        )
+
+    def _touch(self, path, force=False):
+        if not force and time.time() - os.stat(path).st_mtime < TOUCH_INTERVAL:
+            return
+        os.utime(path)
+
+    def _remove(self, path):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+class DiskCacheWriter:
+    """Writes content to a `DiskCache` as it arrives, e.g. while it is streamed to
+    a client. Nothing is stored unless `commit` is called."""
+
+    def __init__(self, cache, key, metadata):
+        self.cache = cache
+        self.key = key
+        self.metadata = metadata
+        self.size = 0
+        self.hash = hashlib.sha256()
+        fd, self.tmp_path = tempfile.mkstemp(dir=cache.tmp_dir)
+        self.file = os.fdopen(fd, "wb")
+
+    def write(self, chunk):
+        if self.file is None:
+            return
+        self.size += len(chunk)
+        if self.size > self.cache.max_entry_size:
+            self.abort()
+            return
+        self.file.write(chunk)
+        self.hash.update(chunk)
+
+    def commit(self):
+        if self.file is None:
+            return
+        self.file.close()
+        self.file = None
+        self.cache._commit(
+            self.key, self.tmp_path, self.hash.hexdigest(), self.size, self.metadata
+        )
+
+    def abort(self):
+        if self.file is None:
+            return
+        self.file.close()
+        self.file = None
+        self.cache._remove(self.tmp_path)
+
+
+def run_in_os_thread(function):
+    """Run `function` in a background OS thread.
+
+    Under the gevent worker, threads are greenlets, which block every request
+    while they make blocking system calls like `os.walk`, so gevent's pool of OS
+    threads is used instead.
+    """
+    if "gevent" in sys.modules:
+        from gevent import get_hub, monkey
+
+        if monkey.is_module_patched("threading"):
+            get_hub().threadpool.spawn(function)
+            return
+    threading.Thread(target=function, daemon=True).start()
+
+
+_disk_caches = {}
+_disk_caches_lock = threading.Lock()
+
+
+def get_disk_cache():
+    """Return the static content disk cache, or None if it is disabled (no
+    `STATIC_CONTENT_DISK_CACHE_DIR`)."""
+    directory = settings.STATIC_CONTENT_DISK_CACHE_DIR
+    if not directory:
+        return None
+    options = (
+        directory,
+        settings.STATIC_CONTENT_DISK_CACHE_MAX_SIZE,
+        settings.STATIC_CONTENT_DISK_CACHE_MAX_ENTRY_SIZE,
+        settings.STATIC_CONTENT_DISK_CACHE_REVALIDATE_AFTER,
+    )
+    disk_cache = _disk_caches.get(options)
+    if disk_cache is None:
+        with _disk_caches_lock:
+            disk_cache = _disk_caches.get(options)
+            if disk_cache is None:
+                disk_cache = _disk_caches[options] = DiskCache(*options)
+    return disk_cache
+
+
+def get_disk_cache_metadata(file_data):
+    """Return the metadata of S3 file data to store with it in the disk cache."""
+    last_modified = file_data.get("last_modified")
+    return {
+        "content_key": file_data.get("content_key"),
+        "content_type": file_data.get("content_type"),
+        "etag": file_data.get("etag"),
+        "last_modified": last_modified.isoformat() if last_modified else None,
+    }
+
+
+def get_file_data_from_disk_cache(disk_cache, entry, max_buffered_size=None):
+    """Return S3-style file data for a disk cache entry (see
+    `core.boostrenderer.extract_file_data`), or None if it was evicted meanwhile.
+
+    If the content is larger than `max_buffered_size`, it is returned as an open
+    file in "stream" instead of being read (see `core.boostrenderer.get_file_stream`).
+    """
+    last_modified = entry.get("last_modified")
+    file_data = {
+        "content_key": entry.get("content_key"),
+        "content_type": entry.get("content_type"),
+        "last_modified": (
+            datetime.datetime.fromisoformat(last_modified) if last_modified else None
+        ),
+        "etag": entry.get("etag"),
+    }
+    if max_buffered_size is not None and entry["size"] > max_buffered_size:
+        stream = disk_cache.open(entry)
+        if stream is None:
+            return None
+        file_data.update(
+            {"stream": stream, "content_length": entry["size"], "content_range": None}
+        )
+        return file_data
+    content = disk_cache.read(entry)
+    if content is None:
+        return None
+    file_data["content"] = content
+    return file_data
@@ -1,8 +1,13 @@
-from bs4 import BeautifulSoup, Comment
+from collections import defaultdict
+
+from bs4 import BeautifulSoup, Comment, SoupStrainer, Tag
 from django.template.loader import render_to_string
 
 from core.boostrenderer import get_body_from_html
 
+# Bump this whenever the modernization rules or the templates they inject change, so
+# that previously cached processed pages are no longer used.
+MODERNIZE_RULES_VERSION = 2
 
 # List HTML elements (with relevant attributes) to remove the FIRST occurrence
 REMOVE_TAGS = [
@@ -87,6 +92,83 @@ REMOVE_CSS_CLASSES = [
 ]
 
 
+def _compile_rules(rules):
+    """Compile (tag_name, tag_attrs) rules into matchers grouped by tag name.
+
+    Returns a dict of tag name -> list of (rule index, SoupStrainer), so a tag only
+    has to be checked against the rules that can possibly match it.
+    """
+    compiled = defaultdict(list)
+    for index, (tag_name, tag_attrs) in enumerate(rules):
+        compiled[tag_name].append((index, SoupStrainer(tag_name, tag_attrs)))
+    return compiled
+
+
+_REMOVE_TAGS_MATCHERS = _compile_rules(REMOVE_TAGS)
+_REMOVE_ALL_MATCHERS = _compile_rules(REMOVE_ALL)
+_REMOVE_CSS_CLASSES_MATCHERS = _compile_rules(REMOVE_CSS_CLASSES)
+
+
+def _matches_any(tag, matchers):
+    return any(strainer.search_tag(tag) for _, strainer in matchers.get(tag.name, []))
+
+
+def apply_legacy_page_rules(soup):
+    """Apply REMOVE_TAGS, REMOVE_ALL, REMOVE_CSS_CLASSES and convert_name_to_id to
+    the soup in a single pass over its elements.
+
+    The result is the same as applying each rule table in turn with find/find_all:
+
+    - A REMOVE_TAGS rule removes the first element it matches in document order,
+      once the elements removed by the previous REMOVE_TAGS rules are gone. An
+      element inside an element removed by rule N can therefore still be the match
+      of a rule before N, but not of a rule after it.
+    - REMOVE_ALL, REMOVE_CSS_CLASSES and the name to id conversion then only apply
+      to the elements that are left.
+
+    Removals are collected during the pass and applied at the end.
+    """
+    rule_count = len(REMOVE_TAGS)
+    fired = [False] * rule_count
+    to_remove = []
+
+    # (tag, REMOVE_TAGS rules the tag is still eligible for, inside a removed tag)
+    stack = [(soup, rule_count, False)]
+    while stack:
+        tag, eligible_rules, removed = stack.pop()
+        if tag is not soup:
+            for index, strainer in _REMOVE_TAGS_MATCHERS.get(tag.name, []):
+                if index >= eligible_rules:
+                    break
+                if not fired[index] and strainer.search_tag(tag):
+                    fired[index] = True
+                    eligible_rules = index
+                    if not removed:
+                        to_remove.append(tag)
+                        removed = True
+                    break
+            if not removed:
+                if _matches_any(tag, _REMOVE_ALL_MATCHERS):
+                    to_remove.append(tag)
+                    removed = True
+                else:
+                    if _matches_any(tag, _REMOVE_CSS_CLASSES_MATCHERS):
+                        tag.attrs.pop("class")
+                    if tag.get("name") is not None:
+                        tag["id"] = tag["name"]
+                        del tag["name"]
+        stack.extend(
+            (child, eligible_rules, removed)
+            for child in reversed(tag.contents)
+            if isinstance(child, Tag)
+        )
+
+    for tag in to_remove:
+        tag.decompose()
+
+    return soup
+
+
 def _insert_in_doc(target, elements, append=True):
     to_add = [
         BeautifulSoup("<!-- BEGIN Manually appending items -->"),
@@ -160,23 +242,9 @@ def modernize_legacy_page(
     if result.html is None:
         # Not an HTML file we care about
         return content
-    # Remove the first occurrence of legacy header(s) and other stuff
-    for tag_name, tag_attrs in REMOVE_TAGS:
-        tag = result.find(tag_name, tag_attrs)
-        if tag:
-            tag.decompose()
-
-    # Remove all navbar-like divs, if any
-    for tag_name, tag_attrs in REMOVE_ALL:
-        for tag in result.find_all(tag_name, tag_attrs):
-            tag.decompose()
-
-    # Remove CSS classes that produce visual harm
-    for tag_name, tag_attrs in REMOVE_CSS_CLASSES:
-        for tag in result.find_all(tag_name, tag_attrs):
-            tag.attrs.pop("class")
-
-    result = convert_name_to_id(result)
+    # Remove the first occurrence of legacy header(s), all navbar-like divs and CSS
+    # classes that produce visual harm, and convert name attributes to ids
+    result = apply_legacy_page_rules(result)
 
     # Use the base HTML to later extract the <head> and (part of) the <body>
     placeholder = BeautifulSoup(base_html, "html.parser")
@@ -0,0 +1,330 @@
+import os
+import random
+import statistics
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from django.core.cache import caches
+from django.db import connection
+from prometheus_client.parser import text_string_to_metric_families
+
+from .benchmarks.html import load_corpus
+
+# Bucket the docs trees are generated in
+LOADTEST_BUCKET_NAME = "boost-loadtest"
+VERSIONS = ("1_86_0", "1_85_0", "1_84_0")
+LIBRARIES = (
+    "accumulators",
+    "algorithm",
+    "any",
+    "asio",
+    "beast",
+    "container",
+    "filesystem",
+    "geometry",
+    "graph",
+    "json",
+    "log",
+    "math",
+    "multiprecision",
+    "optional",
+    "program_options",
+    "python",
+    "regex",
+    "serialization",
+    "spirit",
+    "system",
+    "test",
+    "thread",
+    "unordered",
+    "variant2",
+)
+PAGES_PER_LIBRARY = 12
+USER_GUIDE_PAGES = 30
+MARKDOWN_PAGES = 20
+IMAGE_NAMES = ("prev.png", "up.png", "home.png", "next.png", "note.png")
+# Share of the requests of each kind of URL
+URL_MIX = {
+    "docs": 0.6,
+    "user_guide": 0.1,
+    "markdown": 0.1,
+    "images": 0.1,
+    "missing": 0.1,
+}
+# Seconds between two readings of the workers' memory
+RSS_SAMPLE_INTERVAL = 0.5
+
+
+def generate_docs_tree():
+    """Yield the S3 key, body and content type of every object of the generated
+    docs trees: library documentation for a few releases, the user guide and the
+    images they link to. Pages are taken from the benchmark corpus.
+    """
+    pages = {}
+    for page in load_corpus():
+        if page["kind"] == "docs":
+            pages[page["file"]] = page["content"].encode("utf-8")
+    docs_pages = [
+        content
+        for name, content in pages.items()
+        if name not in ("json_index_redirect.html", "antora_user_guide.html")
+    ]
+    # A tiny valid PNG is enough, images are streamed as they are
+    png = bytes.fromhex(
+        "89504e470d0a1a0a0000000d4948445200000001000000010806000000"
+        "1f15c4890000000d49444154789c6360000002000001e221bc330000000049454e44ae426082"
+    )
+    for version in VERSIONS:
+        prefix = f"archives/boost_{version}"
+        for name in IMAGE_NAMES:
+            yield f"{prefix}/doc/src/images/{name}", png, "image/png"
+        for library in LIBRARIES:
+            yield f"{prefix}/libs/{library}/index.html", pages[
+                "json_index_redirect.html"
+            ], "text/html"
+            for number in range(PAGES_PER_LIBRARY):
+                content = docs_pages[(len(library) + number) % len(docs_pages)]
+                yield (
+                    f"{prefix}/libs/{library}/doc/html/page_{number}.html",
+                    content,
+                    "text/html",
+                )
+    for number in range(USER_GUIDE_PAGES):
+        yield (
+            f"site-docs/develop/user-guide/page_{number}.html",
+            pages["antora_user_guide.html"],
+            "text/html",
+        )
+
+
+def seed_bucket(client, bucket_name=LOADTEST_BUCKET_NAME):
+    """Create the bucket and upload the generated docs trees to it. Returns the
+    number of objects uploaded."""
+    client.create_bucket(
+        Bucket=bucket_name,
+        CreateBucketConfiguration={"LocationConstraint": client.meta.region_name},
+    )
+    count = 0
+    for key, body, content_type in generate_docs_tree():
+        client.put_object(
+            Bucket=bucket_name, Key=key, Body=body, ContentType=content_type
+        )
+        count += 1
+    return count
+
+
+def write_markdown_pages(directory):
+    """Write the Markdown pages served from `BOOST_CONTENT_DIRECTORY`."""
+    paragraph = "Boost provides free peer-reviewed portable C++ source libraries. " * 8
+    for number in range(MARKDOWN_PAGES):
+        with open(os.path.join(directory, f"page-{number}.md"), "w") as f:
+            f.write(f"---\ntitle: Page {number}\n---\n\n# Page {number}\n\n")
+            for section in range(10):
+                f.write(f"## Section {section}\n\n{paragraph}\n\n")
+                f.write("```cpp\n#include <boost/json.hpp>\nint main() {}\n```\n\n")
+
+
+def get_urls():
+    """Return the URLs of the generated content, by kind, most popular first."""
+    urls = {"docs": [], "user_guide": [], "markdown": [], "images": []}
+    for version in VERSIONS:
+        for library in LIBRARIES:
+            urls["docs"].append(f"/doc/libs/{version}/libs/{library}/index.html")
+            for number in range(PAGES_PER_LIBRARY):
+                urls["docs"].append(
+                    f"/doc/libs/{version}/libs/{library}/doc/html/page_{number}.html"
+                )
+        for name in IMAGE_NAMES:
+            urls["images"].append(
+                f"/images/archives/boost_{version}/doc/src/images/{name}"
+            )
+    urls["user_guide"] = [
+        f"/doc/user-guide/page_{number}.html" for number in range(USER_GUIDE_PAGES)
+    ]
+    urls["markdown"] = [f"/markdown/page-{number}" for number in range(MARKDOWN_PAGES)]
+    return urls
+
+
+def build_url_mix(urls, count, seed=0):
+    """Return `count` URLs to request, drawn by kind according to `URL_MIX`.
+
+    Within a kind, the URL of rank n is requested about 1/n as often as the most
+    popular one, like real traffic. The missing URLs are all different, like those
+    of crawlers.
+    """
+    rng = random.Random(seed)
+    kinds = rng.choices(list(URL_MIX), weights=list(URL_MIX.values()), k=count)
+    weights = {
+        kind: [1 / rank for rank in range(1, len(kind_urls) + 1)]
+        for kind, kind_urls in urls.items()
+    }
+    mix = []
+    for number, kind in enumerate(kinds):
+        if kind == "missing":
+            version = rng.choice(VERSIONS)
+            mix.append(f"/doc/libs/{version}/libs/missing_{number}/index.html")
+        else:
+            mix.append(rng.choices(urls[kind], weights=weights[kind])[0])
+    return mix
+
+
+def run_load(base_url, urls, concurrency):
+    """Request the URLs from `concurrency` threads, without following redirects.
+    Returns the (URL, status code, latency in seconds) of each request."""
+    local = threading.local()
+
+    def fetch(url):
+        session = getattr(local, "session", None)
+        if session is None:
+            session = local.session = requests.Session()
+        start = time.perf_counter()
+        try:
+            response = session.get(
+                base_url + url,
+                allow_redirects=False,
+                headers={"Accept-Encoding": "br, gzip"},
+                timeout=60,
+            )
+            status = response.status_code
+        except requests.RequestException:
+            status = None
+        return url, status, time.perf_counter() - start
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        return list(executor.map(fetch, urls))
+
+
+def get_percentile(values, percentile):
+    """Return the value below which `percentile` percent of the sorted `values`
+    fall."""
+    index = min(len(values) - 1, int(len(values) * percentile / 100))
+    return values[index]
+
+
+def summarize(results, elapsed):
+    """Return the throughput, latency percentiles and status codes of a run."""
+    latencies = sorted(latency for _, _, latency in results)
+    return {
+        "requests": len(results),
+        "elapsed": elapsed,
+        "throughput": len(results) / elapsed if elapsed else 0,
+        "latency_mean": statistics.mean(latencies),
+        "latency_p50": get_percentile(latencies, 50),
+        "latency_p90": get_percentile(latencies, 90),
+        "latency_p99": get_percentile(latencies, 99),
+        "latency_max": latencies[-1],
+        "statuses": Counter(status for _, status, _ in results),
+    }
+
+
+def scrape_metrics(base_url, token):
+    """Return the app's metrics (see `core.metrics`) by (name, labels)."""
+    response = requests.get(
+        f"{base_url}/internal/metrics/",
+        headers={"Authorization": f"Bearer {token}"},
+        timeout=10,
+    )
+    response.raise_for_status()
+    samples = {}
+    for family in text_string_to_metric_families(response.text):
+        for sample in family.samples:
+            samples[(sample.name, tuple(sorted(sample.labels.items())))] = sample.value
+    return samples
+
+
+def get_call_counts(base_url, token):
+    """Return counters of the calls to Redis, the database and S3.
+
+    Redis and database calls are counted by the servers, so they include those of
+    every other client, e.g. Celery.
+    """
+    counts = {"redis_commands": None, "db_transactions": None}
+    client = getattr(caches["static_content"], "client", None)
+    if client is not None and hasattr(client, "get_client"):
+        info = client.get_client(write=True).info("stats")
+        counts["redis_commands"] = info["total_commands_processed"]
+    if connection.vendor == "postgresql":
+        with connection.cursor() as cursor:
+            # In autocommit mode, about one transaction per query
+            cursor.execute(
+                "SELECT xact_commit + xact_rollback FROM pg_stat_database "
+                "WHERE datname = current_database()"
+            )
+            counts["db_transactions"] = cursor.fetchone()[0]
+    for (name, labels), value in scrape_metrics(base_url, token).items():
+        labels = dict(labels)
+        if name == "boost_s3_fetch_seconds_count":
+            key = f"s3_requests_{labels['result']}"
+        elif name == "boost_static_content_requests_total":
+            key = f"content_from_{labels['source']}"
+        elif name == "boost_static_content_cache_lookups_total":
+            key = f"{labels['tier']}_cache_{labels['result']}"
+        else:
+            continue
+        counts[key] = counts.get(key, 0) + value
+    return counts
+
+
+def get_counts_delta(before, after):
+    """Return how much each counter increased between two `get_call_counts`."""
+    return {
+        key: None if after[key] is None else after[key] - (before.get(key) or 0)
+        for key in after
+    }
+
+
+def get_rss(pid):
+    """Return the resident memory of a process in bytes, read from /proc."""
+    with open(f"/proc/{pid}/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) * 1024
+    return 0
+
+
+def get_child_pids(pid):
+    """Return the pids of the children of a process (e.g. the gunicorn workers of
+    the master), read from /proc."""
+    pids = []
+    for task in os.listdir(f"/proc/{pid}/task"):
+        with open(f"/proc/{pid}/task/{task}/children") as f:
+            pids.extend(int(child) for child in f.read().split())
+    return pids
+
+
+class RSSSampler:
+    """Samples the resident memory of the workers of a gunicorn master in a
+    background thread, and keeps the peak of each."""
+
+    def __init__(self, master_pid, interval=RSS_SAMPLE_INTERVAL):
+        self.master_pid = master_pid
+        self.interval = interval
+        self.peaks = {}
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def sample(self):
+        """Return the resident memory of each worker, by pid, right now."""
+        rss = {}
+        for pid in get_child_pids(self.master_pid):
+            try:
+                rss[pid] = get_rss(pid)
+            except FileNotFoundError:
+                # The worker exited meanwhile
+                continue
+            self.peaks[pid] = max(self.peaks.get(pid, 0), rss[pid])
+        return rss
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.sample()
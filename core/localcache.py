@@ -0,0 +1,211 @@
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import structlog
+from django.conf import settings
+from django.core.cache import caches
+
+logger = structlog.get_logger()
+
+# Redis channel on which invalidated static content cache keys are published
+INVALIDATION_CHANNEL = "static_content_invalidation"
+# Published instead of a list of keys to invalidate everything
+INVALIDATE_ALL = "*"
+# Seconds to wait before resubscribing after losing the Redis connection
+RESUBSCRIBE_DELAY = 5
+
+
+class LocalCache:
+    """A small least-recently-used cache in process memory, in front of the
+    `static_content` Redis cache.
+
+    Only keys requested at least twice while they were among the recently seen
+    keys are admitted, so a crawl of rarely visited pages doesn't push the popular
+    ones out. The cache holds at most `max_entries` entries and roughly `max_size`
+    bytes of content.
+    """
+
+    def __init__(self, max_entries, max_size, timeout):
+        self.max_entries = max_entries
+        self.max_size = max_size
+        self.timeout = timeout
+        self.size = 0
+        self._entries = OrderedDict()
+        self._seen = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Return the cached value, or None."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, size, expires = entry
+            if expires < time.monotonic():
+                self._remove(key)
+                return None
+            self._entries.move_to_end(key)
+        # Callers may update the dict they get back
+        return dict(value) if isinstance(value, dict) else value
+
+    def set(self, key, value, timeout=None):
+        """Cache the value if the key is popular enough. `timeout` can only shorten
+        the cache's own timeout."""
+        timeout = self.timeout if timeout is None else min(timeout, self.timeout)
+        size = get_value_size(value)
+        if timeout <= 0 or size > self.max_size:
+            return
+        with self._lock:
+            if key not in self._entries and not self._admit(key):
+                return
+            self._remove(key)
+            self._entries[key] = (value, size, time.monotonic() + timeout)
+            self.size += size
+            while len(self._entries) > self.max_entries or self.size > self.max_size:
+                self._remove(next(iter(self._entries)))
+
+    def delete_many(self, keys):
+        with self._lock:
+            for key in keys:
+                self._remove(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._seen.clear()
+            self.size = 0
+
+    def _admit(self, key):
+        if key in self._seen:
+            del self._seen[key]
+            return True
+        self._seen[key] = None
+        while len(self._seen) > self.max_entries * 4:
+            self._seen.popitem(last=False)
+        return False
+
+    def _remove(self, key):
+        entry = self._entries.pop(key, None)
+        if entry:
+            self.size -= entry[1]
+
+
+def get_value_size(value):
+    """Return the approximate size of a cached value, going by its content."""
+    if isinstance(value, dict):
+        value = value.get("content")
+    if isinstance(value, (bytes, str)):
+        return len(value)
+    return 0
+
+
+_local_cache = None
+_local_cache_pid = None
+_local_cache_lock = threading.Lock()
+
+
+def get_local_cache():
+    """Return this process's local static content cache, or None if it is disabled
+    (`STATIC_CONTENT_LOCAL_CACHE_SIZE` is 0).
+
+    The first call in a process also starts listening for invalidations published
+    by other processes.
+    """
+    global _local_cache, _local_cache_pid
+    if not settings.STATIC_CONTENT_LOCAL_CACHE_SIZE:
+        return None
+    pid = os.getpid()
+    if _local_cache is None or _local_cache_pid != pid:
+        with _local_cache_lock:
+            if _local_cache is None or _local_cache_pid != pid:
+                _local_cache = LocalCache(
+                    settings.STATIC_CONTENT_LOCAL_CACHE_SIZE,
+                    settings.STATIC_CONTENT_LOCAL_CACHE_MAX_SIZE,
+                    settings.STATIC_CONTENT_LOCAL_CACHE_TIMEOUT,
+                )
+                _local_cache_pid = pid
+                start_invalidation_listener(_local_cache)
+    return _local_cache
+
+
+def reset_local_cache():
+    """Drop this process's local cache, e.g. after changing its settings."""
+    global _local_cache, _local_cache_pid
+    with _local_cache_lock:
+        _local_cache = None
+        _local_cache_pid = None
+
+
+def get_redis_client():
+    """Return the Redis client of the `static_content` cache, or None if it isn't a
+    django-redis cache (e.g. in tests)."""
+    client = getattr(caches["static_content"], "client", None)
+    if client is None or not hasattr(client, "get_client"):
+        return None
+    return client.get_client(write=True)
+
+
+def publish_invalidation(cache_keys=None):
+    """Drop the given static content cache keys, or everything if None, from the
+    local cache of every process.
+
+    The local cache of this process is updated right away, other processes are
+    notified through Redis pub/sub.
+    """
+    local_cache = _local_cache if _local_cache_pid == os.getpid() else None
+    if local_cache:
+        apply_invalidation(local_cache, cache_keys)
+
+    redis_client = get_redis_client()
+    if redis_client is None:
+        return
+    message = INVALIDATE_ALL if cache_keys is None else json.dumps(list(cache_keys))
+    try:
+        redis_client.publish(INVALIDATION_CHANNEL, message)
+    except Exception as e:
+        # The local caches expire on their own, so this isn't fatal
+        logger.exception("local_cache_publish_invalidation_error", error=str(e))
+
+
+def apply_invalidation(local_cache, cache_keys):
+    if cache_keys is None:
+        local_cache.clear()
+    else:
+        local_cache.delete_many(cache_keys)
+
+
+def start_invalidation_listener(local_cache):
+    """Start a daemon thread (a greenlet under gevent) that applies the
+    invalidations published by other processes to `local_cache`."""
+    if get_redis_client() is None:
+        return
+    thread = threading.Thread(
+        target=listen_for_invalidations,
+        args=(local_cache,),
+        name="static-content-invalidation",
+        daemon=True,
+    )
+    thread.start()
+
+
+def listen_for_invalidations(local_cache):
+    while True:
+        try:
+            pubsub = get_redis_client().pubsub(ignore_subscribe_messages=True)
+            pubsub.subscribe(INVALIDATION_CHANNEL)
+            # Invalidations may have been missed while we weren't subscribed
+            local_cache.clear()
+            for message in pubsub.listen():
+                data = message["data"]
+                if isinstance(data, bytes):
+                    data = data.decode("utf-8")
+                apply_invalidation(
+                    local_cache, None if data == INVALIDATE_ALL else json.loads(data)
+                )
+        except Exception as e:
+            logger.exception("local_cache_invalidation_listener_error", error=str(e))
+            local_cache.clear()
+            time.sleep(RESUBSCRIBE_DELAY)
@@ -0,0 +1,93 @@
+import djclick as click
+
+from core.benchmarks.html import (
+    BASELINE_PATH,
+    DEFAULT_THRESHOLD,
+    compare,
+    load_baseline,
+    run_benchmarks,
+    save_baseline,
+)
+
+
+@click.command()
+@click.option(
+    "--repeat",
+    type=int,
+    default=10,
+    help="Number of timed calls of each benchmark on each page.",
+)
+@click.option(
+    "--benchmark",
+    "names",
+    multiple=True,
+    help="Only run this benchmark (example: modernize_legacy_page). Repeatable.",
+)
+@click.option(
+    "--page",
+    "files",
+    multiple=True,
+    help="Only use this corpus page (example: asio_reference.html). Repeatable.",
+)
+@click.option(
+    "--baseline",
+    "baseline_path",
+    default=BASELINE_PATH,
+    help="The baseline file to compare with or save to.",
+)
+@click.option(
+    "--threshold",
+    type=float,
+    default=DEFAULT_THRESHOLD,
+    help="Share by which a measurement must exceed the baseline to be reported as "
+    "a regression.",
+)
+@click.option(
+    "--save-baseline",
+    "save",
+    is_flag=True,
+    help="Store the results as the new baseline instead of comparing with it.",
+)
+def command(repeat, names, files, baseline_path, threshold, save):
+    """Benchmarks the HTML transformations of legacy documentation pages.
+
+    Times modernize_legacy_page, modernize_release_notes, remove_cpp_alliance_links,
+    convert_img_paths and get_meta_redirect_from_html on the pages of the corpus in
+    core/benchmarks/corpus, and reports the wall time, the memory allocated and the
+    peak memory of each call. The results are compared with the stored baseline,
+    and the command exits with an error if any of them regressed.
+
+    Timings depend on the machine: save a baseline and compare with it on the same
+    machine.
+    """
+    results = run_benchmarks(repeat=repeat, names=names, files=files)
+    for key, measurements in results.items():
+        click.echo(
+            f"{key:<65} {measurements['wall_min'] * 1000:9.2f} ms "
+            f"(median {measurements['wall_median'] * 1000:9.2f} ms) "
+            f"peak {measurements['peak_memory'] / 1024:9.1f} KiB "
+            f"allocated {measurements['allocated'] / 1024:9.1f} KiB"
+        )
+
+    if save:
+        save_baseline(results, baseline_path)
+        click.secho(f"Saved the baseline to {baseline_path}.", fg="green")
+        return
+
+    baseline = load_baseline(baseline_path)
+    if baseline is None:
+        click.secho(f"No baseline in {baseline_path}.", fg="yellow")
+        return
+    regressions = compare(results, baseline, threshold)
+    for key, measurement, before, after in regressions:
+        click.secho(
+            f"{key}: {measurement} went from {before:.6g} to {after:.6g} "
+            f"({(after / before - 1) * 100:+.0f}%)",
+            fg="red",
+        )
+    if regressions:
+        raise click.ClickException(
+            f"{len(regressions)} measurements regressed by more than "
+            f"{threshold:.0%}."
+        )
+    click.secho("No regressions.", fg="green")
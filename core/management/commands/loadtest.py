@@ -0,0 +1,182 @@
+import os
+import secrets
+import subprocess
+import sys
+import tempfile
+import time
+
+import boto3
+import djclick as click
+import requests
+from django.conf import settings
+from moto.server import ThreadedMotoServer
+
+from core.loadtest import (
+    LOADTEST_BUCKET_NAME,
+    RSSSampler,
+    build_url_mix,
+    get_call_counts,
+    get_counts_delta,
+    get_urls,
+    run_load,
+    seed_bucket,
+    summarize,
+    write_markdown_pages,
+)
+
+# Seconds to wait for gunicorn to serve its first request
+STARTUP_TIMEOUT = 60
+
+
+def wait_for_server(base_url, token):
+    deadline = time.monotonic() + STARTUP_TIMEOUT
+    while time.monotonic() < deadline:
+        try:
+            response = requests.get(
+                f"{base_url}/internal/metrics/",
+                headers={"Authorization": f"Bearer {token}"},
+                timeout=5,
+            )
+            if response.status_code == 200:
+                return
+        except requests.ConnectionError:
+            pass
+        time.sleep(0.5)
+    raise click.ClickException(f"gunicorn did not start within {STARTUP_TIMEOUT}s.")
+
+
+@click.command()
+@click.option(
+    "--requests",
+    "count",
+    type=int,
+    default=5000,
+    help="Number of requests to replay.",
+)
+@click.option(
+    "--concurrency",
+    type=int,
+    default=20,
+    help="Number of requests in flight at once.",
+)
+@click.option(
+    "--workers",
+    type=int,
+    default=None,
+    help="Number of gunicorn workers. Defaults to that of gunicorn.conf.py.",
+)
+@click.option("--port", type=int, default=8100, help="Port gunicorn listens on.")
+@click.option(
+    "--s3-port", type=int, default=8101, help="Port the moto S3 server listens on."
+)
+@click.option(
+    "--seed", type=int, default=0, help="Seed of the random mix of URLs requested."
+)
+def command(count, concurrency, workers, port, s3_port, seed):
+    """Load tests the documentation serving path.
+
+    Starts a moto S3 server with a bucket of generated docs trees, and the app in
+    gunicorn with its gevent configuration (gunicorn.conf.py) reading from it.
+    Then replays a mix of /doc/libs/, /doc/user-guide/, Markdown, image and missing
+    URLs, and reports the throughput, the latency percentiles, the calls to Redis,
+    the database and S3, and the memory used by the workers.
+
+    The app uses the database and Redis of the current settings, e.g. those of
+    docker compose.
+    """
+    s3_server = ThreadedMotoServer(ip_address="127.0.0.1", port=s3_port)
+    s3_server.start()
+    s3_url = f"http://127.0.0.1:{s3_port}"
+    client = boto3.client(
+        "s3",
+        endpoint_url=s3_url,
+        region_name=settings.STATIC_CONTENT_REGION,
+        aws_access_key_id="loadtest",
+        aws_secret_access_key="loadtest",
+    )
+    seeded = seed_bucket(client)
+    click.secho(f"Seeded {seeded} objects in {s3_url}.", fg="green")
+
+    token = secrets.token_urlsafe()
+    base_url = f"http://127.0.0.1:{port}"
+    with tempfile.TemporaryDirectory() as directory:
+        content_dir = os.path.join(directory, "content")
+        metrics_dir = os.path.join(directory, "prometheus")
+        os.makedirs(content_dir)
+        write_markdown_pages(content_dir)
+        env = {
+            **os.environ,
+            "H": str(settings.BASE_DIR),
+            "ALLOWED_HOSTS": "127.0.0.1",
+            "BOOST_CONTENT_DIRECTORY": content_dir,
+            "METRICS_TOKEN": token,
+            "PROMETHEUS_MULTIPROC_DIR": metrics_dir,
+            "STATIC_CONTENT_AWS_S3_ENDPOINT_URL": s3_url,
+            "STATIC_CONTENT_BUCKET_NAME": LOADTEST_BUCKET_NAME,
+            "STATIC_CONTENT_AWS_ACCESS_KEY_ID": "loadtest",
+            "STATIC_CONTENT_AWS_SECRET_ACCESS_KEY": "loadtest",
+        }
+        args = [
+            sys.executable,
+            "-m",
+            "gunicorn",
+            "-c",
+            os.path.join(settings.BASE_DIR, "gunicorn.conf.py"),
+            "--bind",
+            f"127.0.0.1:{port}",
+            "--access-logfile",
+            "/dev/null",
+        ]
+        if workers is not None:
+            args.extend(["--workers", str(workers)])
+        gunicorn = subprocess.Popen([*args, "config.wsgi"], env=env)
+        try:
+            wait_for_server(base_url, token)
+            sampler = RSSSampler(gunicorn.pid)
+            idle_rss = sampler.sample()
+            urls = build_url_mix(get_urls(), count, seed=seed)
+            click.secho(
+                f"Replaying {count} requests, {concurrency} at once...", fg="green"
+            )
+            before = get_call_counts(base_url, token)
+            sampler.start()
+            start = time.perf_counter()
+            results = run_load(base_url, urls, concurrency)
+            elapsed = time.perf_counter() - start
+            sampler.stop()
+            after = get_call_counts(base_url, token)
+        finally:
+            gunicorn.terminate()
+            gunicorn.wait()
+            s3_server.stop()
+
+    summary = summarize(results, elapsed)
+    click.echo(
+        f"Throughput: {summary['throughput']:.1f} requests/s "
+        f"({summary['requests']} in {summary['elapsed']:.1f}s)"
+    )
+    click.echo(
+        "Latency: "
+        + ", ".join(
+            f"{name} {summary[f'latency_{name}'] * 1000:.1f} ms"
+            for name in ("mean", "p50", "p90", "p99", "max")
+        )
+    )
+    click.echo(
+        "Statuses: "
+        + ", ".join(
+            f"{status or 'error'}: {number}"
+            for status, number in sorted(
+                summary["statuses"].items(), key=lambda item: str(item[0])
+            )
+        )
+    )
+    click.echo("Calls:")
+    for key, value in sorted(get_counts_delta(before, after).items()):
+        click.echo(f"  {key:<32} {'n/a' if value is None else int(value)}")
+    click.echo("Worker memory (RSS):")
+    for pid, peak in sorted(sampler.peaks.items()):
+        click.echo(
+            f"  {pid}: {idle_rss.get(pid, 0) / 2**20:.1f} MiB idle, "
+            f"{peak / 2**20:.1f} MiB peak"
+        )
@@ -0,0 +1,72 @@
+import djclick as click
+
+from django.conf import settings
+
+from core.prerender import prerender_release_docs
+from versions.models import Version
+
+
+@click.command()
+@click.option(
+    "--release",
+    help="Boost version name (example: boost-1.87.0). Defaults to the most recent "
+    "release.",
+)
+@click.option(
+    "--workers",
+    type=int,
+    default=None,
+    help="Number of worker processes. Defaults to the number of CPUs.",
+)
+@click.option(
+    "--batch-size",
+    type=int,
+    default=50,
+    help="Number of pages handed to a worker process at a time.",
+)
+@click.option(
+    "--timeout",
+    type=int,
+    default=settings.STATIC_CONTENT_PRERENDER_TIMEOUT,
+    help="Cache timeout for the pre-rendered pages, in seconds.",
+)
+@click.option(
+    "--restart",
+    is_flag=True,
+    help="Pre-render every page, ignoring the progress of a previous run.",
+)
+def command(release, workers, batch_size, timeout, restart):
+    """Pre-renders the documentation of a release into the static content cache.
+
+    Lists every HTML page under the release's docs prefix in the static content
+    bucket, processes each one the way DocLibsTemplateView does, and caches the
+    result, so the first visitors after a release don't all pay for the S3 fetch
+    and the page modernization.
+
+    Progress is recorded as pages are rendered; running the command again resumes
+    where it stopped unless --restart is passed.
+    """
+    if release:
+        version = Version.objects.filter(name=release).first()
+    else:
+        version = Version.objects.most_recent()
+    if not version:
+        click.secho(f"Could not find version {release}.", fg="red")
+        return
+
+    click.secho(f"Pre-rendering documentation for {version.name}...", fg="green")
+    stats = prerender_release_docs(
+        version,
+        workers=workers,
+        resume=not restart,
+        timeout=timeout,
+        batch_size=batch_size,
+        echo=click.echo,
+    )
+    click.secho(
+        f"Finished pre-rendering {version.name}: {stats['rendered']} rendered, "
+        f"{stats['skipped']} skipped, {stats['missing']} missing, of "
+        f"{stats['total']} pages in {stats['elapsed']:.1f}s "
+        f"({stats['pages_per_second']:.1f} pages/s).",
+        fg="green",
+    )
@@ -0,0 +1,29 @@
+import djclick as click
+
+from django.conf import settings
+
+from core.warming import get_popular_paths, warm_paths
+
+
+@click.command()
+@click.option(
+    "--limit",
+    type=int,
+    default=settings.STATIC_CONTENT_WARM_PATHS,
+    help="Number of most requested pages to warm.",
+)
+def command(limit):
+    """Warms the static content cache with the most requested pages.
+
+    Requests each page through its view, the way a visitor would, so the content
+    and its processed and compressed variants are cached. Run after a deploy, or
+    after the cache was flushed.
+    """
+    paths = get_popular_paths(limit)
+    click.secho(f"Warming {len(paths)} pages...", fg="green")
+    warmed = warm_paths(paths)
+    click.secho(
+        f"Finished warming: {len(warmed)} warmed, {len(paths) - len(warmed)} "
+        "missing.",
+        fg="green",
+    )
@@ -1,12 +1,13 @@
 import structlog
 
-from django.core.cache import caches
 from django.db import models
 
 from django.utils import timezone
 import datetime
 from django.conf import settings
 
+from .caching import flush_static_content
+
 logger = structlog.get_logger()
 
 
@@ -27,17 +28,17 @@ class RenderedContentManager(models.Manager):
         )
 
     def clear_cache_by_content_type(self, content_type):
-        """Clears the static content cache of all rendered content of a given type."""
-        cache = caches["static_content"]
-        results = self.filter(content_type=content_type)
-        for result in results:
-            cache.delete(result.cache_key)
+        """Clears the static content cache of all rendered content of a given type.
+
+        This bumps the generation of the content type rather than deleting each
+        key, see `core.caching.flush_static_content`."""
+        generation = flush_static_content(content_type=content_type)
 
         logger.info(
             "rendered_content_manager_clear_cache_by_content_type",
             cache_name="static_content",
             content_type=content_type,
-            count=len(results),
+            generation=generation,
         )
 
     def delete_by_cache_key(self, cache_key):
@@ -1,16 +1,76 @@
+import os
+
 import frontmatter
+import structlog
+from django.conf import settings
 from core.boostrenderer import BoostRenderer
+from core.caching import memoize_conversion
 from mistletoe import Document
 
+logger = structlog.get_logger()
+
+# Rendered Markdown pages of this process, by path: ((mtime, size), result)
+_pages = {}
+
 
 def process_md(filename):
+    """Return the frontmatter and the rendered HTML of a Markdown file. The result
+    is cached by the hash of the file's contents."""
     with open(filename) as f:
-        post = frontmatter.load(f)
-        metadata = post.metadata
-        content = post.content
+        source = f.read()
+    return memoize_conversion("markdown", source, render_md)
+
+
+def render_md(source):
+    """Return the frontmatter and the rendered HTML of Markdown text, without
+    caching."""
+    post = frontmatter.loads(source)
+    with BoostRenderer() as renderer:
+        doc = Document(post.content)
+        rendered = renderer.render(doc)
+
+    return post.metadata, rendered
+
+
+def get_markdown_page(path):
+    """Return the frontmatter and the rendered HTML of a Markdown file, like
+    `process_md`, from this process's memory if the file hasn't changed since it
+    was last rendered.
+
+    Pages are kept until the file changes; there are few of them, and they are
+    requested all the time.
+    """
+    stat = os.stat(path)
+    version = (stat.st_mtime_ns, stat.st_size)
+    key = os.path.normpath(path)
+    entry = _pages.get(key)
+    if entry is not None and entry[0] == version:
+        return entry[1]
+    result = process_md(path)
+    _pages[key] = (version, result)
+    return result
 
-        with BoostRenderer() as renderer:
-            doc = Document(content)
-            rendered = renderer.render(doc)
 
-    return metadata, rendered
+def warm_markdown_pages(directories=None):
+    """Render the Markdown files under `directories` into this process's memory,
+    by default those served by `core.views.MarkdownTemplateView`. Returns the
+    number of pages rendered."""
+    if directories is None:
+        directories = [
+            settings.BASE_CONTENT,
+            os.path.join(settings.TEMPLATES[0]["DIRS"][0], "markdown"),
+        ]
+    count = 0
+    for directory in directories:
+        for dirpath, _, filenames in os.walk(directory):
+            for filename in filenames:
+                if not filename.endswith(".md"):
+                    continue
+                path = os.path.join(dirpath, filename)
+                try:
+                    get_markdown_page(path)
+                except Exception as e:
+                    logger.warning("markdown_warm_up_error", path=path, error=str(e))
+                    continue
+                count += 1
+    return count
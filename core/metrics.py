@@ -0,0 +1,87 @@
+import os
+import time
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Histogram,
+    generate_latest,
+)
+from prometheus_client import multiprocess
+
+# When PROMETHEUS_MULTIPROC_DIR is set (see gunicorn.conf.py), each process writes
+# its metrics to files in that directory, and the metrics endpoint adds up the
+# files of every process. It must be set before prometheus_client is imported.
+
+CACHE_LOOKUPS = Counter(
+    "boost_static_content_cache_lookups_total",
+    "Lookups in the static content cache, by tier (local or redis) and result "
+    "(hit or miss).",
+    ["tier", "result"],
+)
+CONTENT_SOURCES = Counter(
+    "boost_static_content_requests_total",
+    "Static content requested from the views, by view and where it was found "
+    "(cache, stale, database, s3, missing or not_found).",
+    ["view", "source"],
+)
+REFRESHES = Counter(
+    "boost_static_content_refreshes_total",
+    "Background refreshes of static content from S3, by result (queued or "
+    "already_queued).",
+    ["result"],
+)
+S3_FETCH_SECONDS = Histogram(
+    "boost_s3_fetch_seconds",
+    "Duration of S3 requests for static content, by rank of the candidate key "
+    "and result (found, not_modified, missing or error).",
+    ["candidate", "result"],
+)
+MODERNIZE_CPU_SECONDS = Histogram(
+    "boost_modernize_cpu_seconds",
+    "CPU time spent modernizing documentation pages, by modernize variant.",
+    ["variant"],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+)
+IMAGE_REQUESTS = Counter(
+    "boost_image_requests_total",
+    "Images requested from ImageView, by where they were served from "
+    "(disk_cache, s3, not_modified or not_found).",
+    ["source"],
+)
+
+
+def get_fetch_result(file_data):
+    """Return the `result` label of an S3 request that returned `file_data`."""
+    if not file_data:
+        return "missing"
+    if file_data.get("not_modified"):
+        return "not_modified"
+    return "found"
+
+
+def timed_s3_fetch(fetch, candidate, *args, **kwargs):
+    """Call `fetch(*args, **kwargs)`, which requests an S3 object and returns its
+    file data, recording its duration for the candidate key of the given rank."""
+    start = time.perf_counter()
+    result = "error"
+    try:
+        file_data = fetch(*args, **kwargs)
+        result = get_fetch_result(file_data)
+        return file_data
+    finally:
+        S3_FETCH_SECONDS.labels(candidate=str(candidate), result=result).observe(
+            time.perf_counter() - start
+        )
+
+
+def generate_metrics():
+    """Return the metrics in the Prometheus text format, and its content type."""
+    if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
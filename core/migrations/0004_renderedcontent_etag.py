@@ -0,0 +1,23 @@
+# Generated by Django 4.2.16 on 2026-10-17 12:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0003_sitesettings_and_more"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="renderedcontent",
+            name="etag",
+            field=models.CharField(
+                blank=True,
+                help_text="The ETag of the content in S3.",
+                max_length=255,
+                null=True,
+            ),
+        ),
+    ]
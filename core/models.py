@@ -40,6 +40,12 @@ class RenderedContent(TimeStampedModel):
         null=True,
         blank=True,
     )
+    etag = models.CharField(
+        max_length=255,
+        help_text=_("The ETag of the content in S3."),
+        null=True,
+        blank=True,
+    )
 
     objects = RenderedContentManager()
 
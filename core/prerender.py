@@ -0,0 +1,214 @@
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+import structlog
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import caches
+from django.test import RequestFactory
+
+from .boostrenderer import get_s3_client
+from .caching import get_generation, get_prerendered_cache_key
+
+logger = structlog.get_logger()
+
+HTML_EXTENSIONS = (".html", ".htm")
+# The content type pre-rendered pages are cached with, whose generation counter
+# applies to them
+PRERENDERED_CONTENT_TYPE = "text/html"
+
+
+def get_release_docs_prefix(version):
+    """Return the S3 prefix under which the docs for a version are stored, e.g.
+    `archives/boost_1_87_0/`."""
+    return f"archives/{version.boost_url_slug}/"
+
+
+def list_html_keys(prefix, bucket_name=None):
+    """Return the S3 keys of every HTML object under the given prefix."""
+    bucket_name = bucket_name or settings.STATIC_CONTENT_BUCKET_NAME
+    client = get_s3_client()
+    paginator = client.get_paginator("list_objects_v2")
+    keys = []
+    for page in paginator.paginate(Bucket=bucket_name, Prefix=prefix):
+        for obj in page.get("Contents", []):
+            if obj["Key"].lower().endswith(HTML_EXTENSIONS):
+                keys.append(obj["Key"])
+    return keys
+
+
+def get_docs_content_path(s3_key, version):
+    """Return the /doc/libs/ content path that serves the given S3 key.
+
+    Example: "archives/boost_1_87_0/libs/json/index.html" ->
+    "1_87_0/libs/json/index.html"
+    """
+    relative_key = s3_key[len(get_release_docs_prefix(version)) :]
+    return f"{version.stripped_boost_url_slug}/{relative_key}"
+
+
+def prerender_doc_page(content_path, timeout=None):
+    """Fetch a library documentation page from S3, process it the same way
+    DocLibsTemplateView does, and store the raw and processed content in the static
+    content cache.
+
+    Returns True if the page was found and cached.
+    """
+    # Imported here because core.views imports core.tasks, which uses this module.
+    from .views import DocLibsTemplateView
+
+    if timeout is None:
+        timeout = settings.STATIC_CONTENT_PRERENDER_TIMEOUT
+
+    request = RequestFactory().get(f"/doc/libs/{content_path}")
+    request.user = AnonymousUser()
+    view = DocLibsTemplateView(cache_timeout=timeout)
+    view.setup(request, content_path=content_path)
+
+    result = view.get_from_s3(content_path)
+    if not result:
+        logger.info("prerender_doc_page_not_found", content_path=content_path)
+        return False
+
+    view.cache_key = f"static_content_{content_path}"
+    view.content_dict = result
+    view.cache_result(caches["static_content"], view.cache_key, result)
+    if not result.get("redirect"):
+        # Stores the processed page in the cache as a side effect
+        view.process_content(result["content"])
+    return True
+
+
+def prerender_doc_pages(content_paths, timeout=None):
+    """Pre-render a batch of pages. Returns the content paths that were cached."""
+    return [path for path in content_paths if prerender_doc_page(path, timeout)]
+
+
+def mark_prerendered(content_paths, timeout=None):
+    """Record pages as pre-rendered so an interrupted run can be resumed.
+
+    Each page is recorded under its own key (see `get_prerendered_cache_key`), so
+    concurrent batches don't overwrite each other's progress. The record holds the
+    generation of the page's cached content, so a page flushed since (see
+    `flush_static_content`) is pre-rendered again on resume.
+    """
+    if timeout is None:
+        timeout = settings.STATIC_CONTENT_PRERENDER_TIMEOUT
+    records = {}
+    for content_path in content_paths:
+        cache_key = f"static_content_{content_path}"
+        records[get_prerendered_cache_key(cache_key)] = get_generation(
+            cache_key, PRERENDERED_CONTENT_TYPE
+        )
+    caches["static_content"].set_many(records, timeout=timeout)
+
+
+def get_prerendered(content_paths):
+    """Return those of the content paths that were pre-rendered since their cached
+    content was last flushed."""
+    cache_keys = {f"static_content_{path}": path for path in content_paths}
+    records = caches["static_content"].get_many(
+        [get_prerendered_cache_key(cache_key) for cache_key in cache_keys]
+    )
+    return {
+        path
+        for cache_key, path in cache_keys.items()
+        if tuple(records.get(get_prerendered_cache_key(cache_key), ()))
+        == get_generation(cache_key, PRERENDERED_CONTENT_TYPE)
+    }
+
+
+def get_pending_content_paths(version, resume=True):
+    """Return all the documentation content paths for a version, and those that
+    still have to be pre-rendered."""
+    prefix = get_release_docs_prefix(version)
+    content_paths = [
+        get_docs_content_path(key, version) for key in list_html_keys(prefix)
+    ]
+    done = get_prerendered(content_paths) if resume else set()
+    return content_paths, [path for path in content_paths if path not in done]
+
+
+def get_batches(content_paths, batch_size):
+    """Split the content paths into batches of at most `batch_size` paths."""
+    return [
+        content_paths[i : i + batch_size]
+        for i in range(0, len(content_paths), batch_size)
+    ]
+
+
+def _init_worker():
+    django.setup()
+
+
+def prerender_release_docs(
+    version, workers=None, resume=True, timeout=None, batch_size=50, echo=None
+):
+    """Pre-render every HTML page of a release's documentation.
+
+    Pages are processed in a pool of `workers` processes; with a single worker they
+    are processed in this process. Progress is recorded after each batch, and pages
+    already pre-rendered are skipped when `resume` is True.
+
+    Args:
+        version (Version): The release to pre-render.
+        workers (int): Number of worker processes. Defaults to the CPU count.
+        resume (bool): Skip pages recorded as pre-rendered by a previous run.
+        timeout (int): Cache timeout for the pre-rendered content, in seconds.
+        batch_size (int): Number of pages handed to a worker at a time.
+        echo (callable): Called with a progress message after each batch.
+
+    Returns:
+        dict: Counts of pages found, skipped, rendered and missing, and the elapsed
+        time and throughput.
+    """
+    workers = workers or multiprocessing.cpu_count()
+    prefix = get_release_docs_prefix(version)
+    start = time.monotonic()
+
+    content_paths, pending = get_pending_content_paths(version, resume)
+    batches = get_batches(pending, batch_size)
+
+    rendered = 0
+    processed = 0
+
+    def record(batch, cached_paths):
+        nonlocal rendered, processed
+        mark_prerendered(cached_paths, timeout)
+        rendered += len(cached_paths)
+        processed += len(batch)
+        if echo:
+            elapsed = time.monotonic() - start
+            echo(
+                f"{processed}/{len(pending)} pages "
+                f"({processed / elapsed if elapsed else 0:.1f} pages/s)"
+            )
+
+    if workers > 1 and len(batches) > 1:
+        # "spawn" avoids sharing the parent's database and cache connections
+        context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(
+            max_workers=workers, mp_context=context, initializer=_init_worker
+        ) as executor:
+            results = executor.map(
+                prerender_doc_pages, batches, [timeout] * len(batches)
+            )
+            for batch, cached_paths in zip(batches, results):
+                record(batch, cached_paths)
+    else:
+        for batch in batches:
+            record(batch, prerender_doc_pages(batch, timeout))
+
+    elapsed = time.monotonic() - start
+    stats = {
+        "total": len(content_paths),
+        "skipped": len(content_paths) - len(pending),
+        "rendered": rendered,
+        "missing": processed - rendered,
+        "elapsed": elapsed,
+        "pages_per_second": processed / elapsed if elapsed else 0,
+    }
+    logger.info("prerender_release_docs_finished", prefix=prefix, **stats)
+    return stats
@@ -1,13 +1,36 @@
 import structlog
 
-from celery import shared_task
-from dateutil.parser import parse
-
+from celery import group, shared_task
+from django.conf import settings
 from django.core.cache import caches
 
+from versions.models import Version
+
 from core.asciidoc import convert_adoc_to_html
+from .analysis import prepare_content
 from .boostrenderer import get_content_from_s3
+from .caching import (
+    delete_missing_content,
+    delete_static_content_cache_keys,
+    invalidate_disk_cache,
+    release_refresh_lock,
+    set_static_content,
+)
+from .cdn import (
+    get_content_type_key,
+    get_path_key,
+    purge_surrogate_keys,
+)
+from .localcache import publish_invalidation
 from .models import RenderedContent
+from .prerender import (
+    get_batches,
+    get_pending_content_paths,
+    get_release_docs_prefix,
+    mark_prerendered,
+    prerender_doc_pages,
+)
+from .warming import get_popular_paths, warm_paths
 
 logger = structlog.get_logger()
 
@@ -16,8 +39,7 @@ logger = structlog.get_logger()
 def clear_rendered_content_cache_by_cache_key(cache_key):
     """Deletes a RenderedContent object by its cache key from redis and
     database."""
-    cache = caches["static_content"]
-    cache.delete(cache_key)
+    delete_static_content_cache_keys([cache_key])
     RenderedContent.objects.delete_by_cache_key(cache_key)
 
 
@@ -27,43 +49,119 @@ def clear_rendered_content_cache_by_content_type(content_type):
     and database."""
     RenderedContent.objects.clear_cache_by_content_type(content_type)
     RenderedContent.objects.delete_by_content_type(content_type)
+    purge_surrogate_keys([get_content_type_key(content_type)])
+    warm_static_content.delay()
 
 
 @shared_task
 def clear_static_content_cache():
-    """Runs the manager method to clear the static content cache"""
+    """Runs the manager method to clear the static content cache.
+
+    Only old RenderedContent objects are deleted, which changes no content, so
+    nothing is purged from the CDN."""
     RenderedContent.objects.clear_cache_by_cache_type_and_date(
         cache_type="static_content_"
     )
+    invalidate_disk_cache()
+    publish_invalidation()
+    warm_static_content.delay()
 
 
 @shared_task
-def refresh_content_from_s3(s3_key, cache_key):
-    """Calls S3 with the s3_key, then saves the result to the
-    RenderedContent object with the given cache_key."""
-    content_dict = get_content_from_s3(key=s3_key)
-
-    content = content_dict.get("content")
-    if content_dict and content:
-        content_type = content_dict.get("content_type")
-        if content_type == "text/asciidoc":
-            content = convert_adoc_to_html(content)
-        last_updated_at_raw = content_dict.get("last_updated_at")
-        last_updated_at = parse(last_updated_at_raw) if last_updated_at_raw else None
-        # Clear the cache because we're going to update it.
-        clear_rendered_content_cache_by_cache_key(cache_key)
+def purge_cdn_keys(keys):
+    """Purges the responses with any of the surrogate keys from the CDN."""
+    purge_surrogate_keys(keys)
 
+
+@shared_task
+def refresh_content_from_s3(s3_key, cache_key):
+    """Calls S3 with the s3_key, then caches the result under the given cache_key,
+    prepared like the views prepare it (see `core.analysis.prepare_content`).
+    AsciiDoc content is also saved to its RenderedContent object.
+
+    If the cached content has an ETag, S3 is asked for the content only if it
+    changed; when it hasn't, the cached content is cached again as is. When it
+    has, the content's path is purged from the CDN.
+
+    Views schedule this at most once at a time per cache key, see
+    `core.caching.acquire_refresh_lock`; the lock is released when it is done. A
+    refresh that fails keeps it until it expires, so it isn't retried on every
+    request."""
+    _refresh_content_from_s3(s3_key, cache_key)
+    release_refresh_lock(cache_key)
+
+
+def get_current_content(cache_key):
+    """Return the content being refreshed: the cached entry, without its cache
+    metadata, or else the stored RenderedContent, or None."""
+    cached = caches["static_content"].get(cache_key)
+    if cached:
+        return {
+            key: value
+            for key, value in cached.items()
+            if key not in ("generation", "refresh_at")
+        }
+    content_obj = RenderedContent.objects.filter(cache_key=cache_key).first()
+    if content_obj:
+        return {
+            "content": content_obj.content_html,
+            "content_type": content_obj.content_type,
+            "etag": content_obj.etag,
+            "last_modified": content_obj.last_updated_at,
+        }
+    return None
+
+
+def _refresh_content_from_s3(s3_key, cache_key):
+    current = get_current_content(cache_key)
+    etag = current.get("etag") if current else None
+    content_dict = get_content_from_s3(key=s3_key, if_none_match=etag)
+
+    if content_dict.get("not_modified"):
+        logger.info("refresh_content_from_s3_not_modified", cache_key=cache_key)
+        set_static_content(cache_key, current)
+        # Other processes may hold the stale entry in memory
+        publish_invalidation([cache_key])
+        return
+
+    if not content_dict.get("content"):
+        return
+
+    result = prepare_content(content_dict, convert_adoc_to_html)
+    if result["content_type"] == "text/asciidoc":
         # Update the rendered content.
         save_rendered_content(
-            cache_key, content_type, content, last_updated_at=last_updated_at
+            cache_key,
+            result["content_type"],
+            result["content"],
+            last_updated_at=result.get("last_modified"),
+            etag=result.get("etag"),
         )
-        # Cache the refreshed rendered content
-        cache = caches["static_content"]
-        cache.set(cache_key, {"content": content, "content_type": content_type})
+    # Cache the refreshed rendered content
+    set_static_content(cache_key, result)
+    delete_missing_content(cache_key)
+    publish_invalidation([cache_key])
+
+    if has_content_changed(current, result):
+        purge_surrogate_keys([get_path_key(cache_key.removeprefix("static_content_"))])
+
+
+def has_content_changed(previous, content):
+    """Return True if `content` from S3 differs from the `previous` content (see
+    `get_current_content`): by ETag when both have one, by their content
+    otherwise. Content without a previous version counts as changed, as the CDN
+    may hold an older version of it."""
+    if previous is None:
+        return True
+    if previous.get("etag") and content.get("etag"):
+        return previous["etag"] != content["etag"]
+    return previous.get("content") != content.get("content")
 
 
 @shared_task
-def save_rendered_content(cache_key, content_type, content_html, last_updated_at=None):
+def save_rendered_content(
+    cache_key, content_type, content_html, last_updated_at=None, etag=None
+):
     """Saves a RenderedContent object to database."""
     defaults = {
         "content_type": content_type,
@@ -72,10 +170,16 @@ def save_rendered_content(cache_key, content_type, content_html, last_updated_at
 
     if last_updated_at:
         defaults["last_updated_at"] = last_updated_at
+    if etag:
+        defaults["etag"] = etag
 
     obj, created = RenderedContent.objects.update_or_create(
         cache_key=cache_key[:255], defaults=defaults
     )
+    # The content may have been recorded as missing before it was published
+    delete_missing_content(cache_key)
+    # Other processes may hold the previous content in memory
+    publish_invalidation([cache_key])
     logger.info(
         "content_saved_to_rendered_content",
         cache_key=cache_key,
@@ -85,3 +189,63 @@ def save_rendered_content(cache_key, content_type, content_html, last_updated_at
         obj_created=created,
     )
     return obj
+
+
+@shared_task
+def prerender_release_docs(version_pk, resume=True, batch_size=50):
+    """Queues the pre-rendering of every documentation page of a release, in
+    batches, so the pages are cached before the release is announced."""
+    version = Version.objects.get(pk=version_pk)
+    prefix = get_release_docs_prefix(version)
+    content_paths, pending = get_pending_content_paths(version, resume)
+    logger.info(
+        "prerender_release_docs_queued",
+        prefix=prefix,
+        total=len(content_paths),
+        pending=len(pending),
+    )
+    if pending:
+        group(
+            prerender_release_docs_batch.s(prefix, batch)
+            for batch in get_batches(pending, batch_size)
+        )()
+
+
+@shared_task
+def prerender_release_docs_batch(prefix, content_paths):
+    """Pre-renders a batch of documentation pages and records the progress."""
+    cached_paths = prerender_doc_pages(content_paths)
+    mark_prerendered(cached_paths)
+    logger.info(
+        "prerender_release_docs_batch_finished",
+        prefix=prefix,
+        total=len(content_paths),
+        rendered=len(cached_paths),
+    )
+
+
+@shared_task
+def warm_static_content(limit=None, batch_size=50):
+    """Queues the warming of the most requested static content pages, in batches,
+    so they are cached before visitors request them after a flush, a release or a
+    deploy."""
+    if limit is None:
+        limit = settings.STATIC_CONTENT_WARM_PATHS
+    paths = get_popular_paths(limit)
+    logger.info("warm_static_content_queued", total=len(paths))
+    if paths:
+        group(
+            warm_static_content_batch.s(batch)
+            for batch in get_batches(paths, batch_size)
+        )()
+
+
+@shared_task
+def warm_static_content_batch(paths):
+    """Warms a batch of static content pages."""
+    warmed = warm_paths(paths)
+    logger.info(
+        "warm_static_content_batch_finished",
+        warmed=len(warmed),
+        missing=len(paths) - len(warmed),
+    )
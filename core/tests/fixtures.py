@@ -1,3 +1,5 @@
+from unittest.mock import Mock
+
 import pytest
 from model_bakery import baker
 
@@ -32,7 +34,17 @@ def mock_get_file_data(monkeypatch):
                 result = None
             return result
 
+        def get_file_stream(client, bucket_name, s3_key):
+            result = get_file_data(client, bucket_name, s3_key)
+            if result:
+                result["stream"] = Mock(**{"read.return_value": content})
+                result["content_length"] = len(content)
+                result["content_range"] = None
+                del result["content"]
+            return result
+
         monkeypatch.setattr("core.boostrenderer.get_file_data", get_file_data)
+        monkeypatch.setattr("core.boostrenderer.get_file_stream", get_file_stream)
 
     return _mock_get_file_data
 
@@ -45,3 +57,14 @@ def mock_get_leaf_data():
 @pytest.fixture
 def mock_get_accumulators_data():
     return open("core/tests/content/accumulators.html", "rb").read()
+
+
+@pytest.fixture
+def cdn_purges():
+    """The surrogate keys purged from the CDN during the test, one list per
+    purge."""
+    from core import cdn
+
+    cdn.purges.clear()
+    yield cdn.purges
+    cdn.purges.clear()
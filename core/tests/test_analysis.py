@@ -0,0 +1,38 @@
+from ..analysis import analyze_document, detect_encoding
+from ..constants import SourceDocType
+
+
+def test_analyze_document():
+    content = (
+        b"<html><head>"
+        b'<meta name="generator" content="Asciidoctor 2.0.20">'
+        b"</head><body><p>Boost</p></body></html>"
+    )
+    analysis = analyze_document(content)
+    assert analysis == {
+        "encoding": "utf-8",
+        "redirect": None,
+        "source_type": SourceDocType.ASCIIDOC,
+    }
+
+
+def test_analyze_document_redirect():
+    content = (
+        b'<html><head><meta http-equiv="refresh" content="0; URL=index.html">'
+        b"</head><body></body></html>"
+    )
+    assert analyze_document(content)["redirect"] == "index.html"
+
+
+def test_analyze_document_source_type():
+    legacy = b'<html><body><div class="spirit-nav"></div></body></html>'
+    antora = b'<html><head><meta name="generator" content="Antora 3.1.7"></head></html>'
+    assert analyze_document(legacy)["source_type"] == SourceDocType.LEGACY
+    assert analyze_document(antora)["source_type"] == SourceDocType.ANTORA
+
+
+def test_detect_encoding():
+    assert detect_encoding("Beman Dawes – Boost".encode("utf-8")) == "utf-8"
+    latin1 = ("Café crème brûlée, très déjà vu. " * 20).encode("latin-1")
+    assert detect_encoding(latin1) != "utf-8"
+    assert latin1.decode(detect_encoding(latin1)).startswith("Caf")
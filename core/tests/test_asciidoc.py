@@ -1,12 +1,81 @@
+import sys
 from os import getcwd, makedirs
 from unittest.mock import patch
 
 import pytest
+from django.test import override_settings
 
+from core.asciidoc import AsciidoctorError, AsciidoctorPool, convert_adoc_to_html
 
-from core.asciidoc import convert_adoc_to_html
+# Speaks the protocol of asciidoctor_worker.rb, "converting" by upper-casing, and
+# hangs on "sleep" and fails on "fail".
+FAKE_WORKER = [
+    sys.executable,
+    "-c",
+    """
+import sys, time
+stdin, stdout = sys.stdin.buffer, sys.stdout.buffer
+for line in iter(stdin.readline, b""):
+    command, _, length = line.strip().partition(b" ")
+    if command == b"ping":
+        stdout.write(b"pong\\n")
+    else:
+        data = stdin.read(int(length))
+        if data == b"sleep":
+            time.sleep(10)
+        output = data.decode("utf-8").upper().encode("utf-8")
+        status, output = (b"error", b"bad") if data == b"fail" else (b"ok", output)
+        stdout.write(b"%s %d\\n%s" % (status, len(output), output))
+    stdout.flush()
+""",
+]
 
 
+@pytest.fixture
+def pool():
+    pool = AsciidoctorPool(size=2, max_jobs=2, timeout=2, command=FAKE_WORKER)
+    yield pool
+    pool.close()
+
+
+def test_pool_reuses_and_recycles_workers(pool):
+    assert pool.convert("é") == "É"
+    worker = pool._idle.queue[0]
+    assert pool.convert("two") == "TWO"
+    # Replaced after max_jobs conversions
+    assert not pool._idle.queue
+    assert not worker.is_alive()
+    assert pool.convert("three") == "THREE"
+    assert pool._idle.queue[0] is not worker
+
+
+def test_pool_conversion_error(pool):
+    with pytest.raises(AsciidoctorError, match="bad"):
+        pool.convert("fail")
+    # The worker is still usable after an error in a document
+    worker = pool._idle.queue[0]
+    assert worker.ping()
+    assert pool.convert("ok") == "OK"
+
+
+def test_pool_timeout_kills_worker(pool):
+    pool.timeout = 0.5
+    with pytest.raises(AsciidoctorError, match="Timed out"):
+        pool.convert("sleep")
+    assert not pool._idle.queue
+    assert pool.convert("next") == "NEXT"
+
+
+def test_pool_replaces_dead_worker(pool):
+    pool.convert("one")
+    worker = pool._idle.queue[0]
+    worker.process.kill()
+    worker.process.wait()
+    assert pool.convert("two") == "TWO"
+    assert pool._idle.queue[0] is not worker
+
+
+@override_settings(ASCIIDOCTOR_WORKERS=0)
 def test_convert_adoc_to_html_subprocess():
     # The content of the sample adoc file
     sample_adoc_content = "= Document Title\n\nThis is a sample document.\n"
@@ -0,0 +1,38 @@
+from ..benchmarks.html import compare, load_corpus, run_benchmarks
+
+
+def test_load_corpus():
+    pages = load_corpus()
+    assert pages
+    for page in pages:
+        assert page["kind"] in ("docs", "release_notes")
+        assert page["content"]
+
+
+def test_run_benchmarks():
+    results = run_benchmarks(repeat=1, files=["json_index_redirect.html"])
+    assert set(results) == {
+        "get_meta_redirect_from_html:json_index_redirect.html",
+        "modernize_legacy_page:json_index_redirect.html",
+        "convert_img_paths:json_index_redirect.html",
+    }
+    for measurements in results.values():
+        assert measurements["wall_min"] > 0
+        assert measurements["peak_memory"] > 0
+
+
+def test_compare():
+    baseline = {
+        "results": {
+            "a:page.html": {"wall_min": 1.0, "peak_memory": 100, "allocated": 10},
+            "b:page.html": {"wall_min": 1.0, "peak_memory": 100, "allocated": 10},
+        }
+    }
+    results = {
+        "a:page.html": {"wall_min": 1.05, "peak_memory": 150, "allocated": 10},
+        "b:page.html": {"wall_min": 0.5, "peak_memory": 100, "allocated": 10},
+        "c:page.html": {"wall_min": 9.0, "peak_memory": 900, "allocated": 90},
+    }
+    assert compare(results, baseline, threshold=0.1) == [
+        ("a:page.html", "peak_memory", 100, 150)
+    ]
@@ -0,0 +1,176 @@
+from unittest.mock import MagicMock
+
+from django.core.cache import caches
+from django.test import override_settings
+
+from ..caching import (
+    _generations,
+    delete_missing_content,
+    delete_static_content_cache_keys,
+    flush_static_content,
+    get_encoded_content,
+    get_processed_content,
+    get_processed_content_cache_key,
+    get_release,
+    get_source_hash,
+    is_current_generation,
+    is_missing_content,
+    memoize_conversion,
+    set_encoded_content,
+    set_missing_content,
+    set_static_content,
+    set_processed_content,
+)
+
+TEST_CACHES = {
+    "static_content": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "caching-tests",
+        "TIMEOUT": "60",
+    },
+}
+
+
+def test_get_source_hash_bytes_and_str_match():
+    assert get_source_hash(b"<html></html>") == get_source_hash("<html></html>")
+    assert get_source_hash(b"a") != get_source_hash(b"b")
+
+
+@override_settings(CACHES=TEST_CACHES)
+def test_processed_content_round_trip():
+    source_hash = get_source_hash(b"source")
+    set_processed_content("static_content_foo", "med", source_hash, 1, "processed")
+
+    assert get_processed_content("static_content_foo", "med", source_hash, 1) == (
+        "processed"
+    )
+    # A different variant, source or rules version is a miss
+    assert get_processed_content("static_content_foo", "max", source_hash, 1) is None
+    assert (
+        get_processed_content(
+            "static_content_foo", "med", get_source_hash(b"changed"), 1
+        )
+        is None
+    )
+    assert get_processed_content("static_content_foo", "med", source_hash, 2) is None
+    # So is content processed by another deploy
+    with override_settings(IMAGE_TAG="new-release"):
+        assert (
+            get_processed_content("static_content_foo", "med", source_hash, 1) is None
+        )
+
+
+@override_settings(CACHES=TEST_CACHES)
+def test_delete_static_content_cache_keys_clears_processed_variants():
+    cache = caches["static_content"]
+    cache.set("static_content_foo", "raw")
+    set_processed_content("static_content_foo", "min", "hash", 1, "processed")
+    cache.set("static_content_bar", "keep")
+
+    delete_static_content_cache_keys(["static_content_foo"])
+
+    assert cache.get("static_content_foo") is None
+    assert (
+        cache.get(get_processed_content_cache_key("static_content_foo", "min")) is None
+    )
+    assert cache.get("static_content_bar") == "keep"
+
+
+@override_settings(CACHES=TEST_CACHES)
+def test_encoded_content():
+    content = "<p>Boost</p>" * 100
+    variants = set_encoded_content("static_content_foo", "hash", "v1", content)
+    assert set(variants) == {"br", "gzip"}
+
+    assert get_encoded_content("static_content_foo", "hash", "v1") == variants
+    # A different source or code version is a miss
+    assert get_encoded_content("static_content_foo", "changed", "v1") is None
+    assert get_encoded_content("static_content_foo", "hash", "v2") is None
+
+    delete_static_content_cache_keys(["static_content_foo"])
+    assert get_encoded_content("static_content_foo", "hash", "v1") is None
+
+
+@override_settings(CACHES=TEST_CACHES, STATIC_CONTENT_MISSING_TIMEOUT=60)
+def test_missing_content():
+    assert not is_missing_content("static_content_foo")
+    set_missing_content("static_content_foo")
+    assert is_missing_content("static_content_foo")
+    delete_missing_content("static_content_foo")
+    assert not is_missing_content("static_content_foo")
+
+    set_missing_content("static_content_foo")
+    delete_static_content_cache_keys(["static_content_foo"])
+    assert not is_missing_content("static_content_foo")
+
+
+@override_settings(CACHES=TEST_CACHES, STATIC_CONTENT_MISSING_TIMEOUT=0)
+def test_missing_content_disabled():
+    set_missing_content("static_content_foo")
+    assert not is_missing_content("static_content_foo")
+
+
+@override_settings(CACHES=TEST_CACHES, CONVERSION_CACHE_TIMEOUT=60)
+def test_memoize_conversion():
+    convert = MagicMock(side_effect=lambda source: source.upper())
+    assert memoize_conversion("asciidoc", "text", convert) == "TEXT"
+    assert memoize_conversion("asciidoc", "text", convert) == "TEXT"
+    assert convert.call_count == 1
+
+    # Another source or renderer is converted
+    assert memoize_conversion("asciidoc", "other", convert) == "OTHER"
+    assert memoize_conversion("markdown", "text", convert) == "TEXT"
+    assert convert.call_count == 3
+
+    with override_settings(IMAGE_TAG="new-release"):
+        memoize_conversion("asciidoc", "text", convert)
+    assert convert.call_count == 4
+
+    # Another option is converted
+    memoize_conversion("img_paths", "text", convert, options=("/images/a",))
+    memoize_conversion("img_paths", "text", convert, options=("/images/a",))
+    memoize_conversion("img_paths", "text", convert, options=("/images/b",))
+    assert convert.call_count == 6
+
+
+@override_settings(CACHES=TEST_CACHES, CONVERSION_CACHE_TIMEOUT=0)
+def test_memoize_conversion_disabled():
+    convert = MagicMock(return_value="converted")
+    memoize_conversion("asciidoc", "text", convert)
+    memoize_conversion("asciidoc", "text", convert)
+    assert convert.call_count == 2
+
+
+def test_get_release():
+    assert get_release("static_content_boost_1_86_0/libs/any/index.html") == "1_86_0"
+    assert get_release("static_content_1_86_0/libs/any/index.html") == "1_86_0"
+    assert get_release("static_content_/develop/libs/rst.css") == "develop"
+
+
+@override_settings(CACHES=TEST_CACHES)
+def test_flush_static_content():
+    _generations.clear()
+    cache = caches["static_content"]
+    html = {"content": "html", "content_type": "text/html"}
+    keys = [
+        "static_content_1_85_0/index.html",
+        "static_content_1_86_0/index.html",
+        "static_content_1_86_0/doc.adoc",
+    ]
+    set_static_content(keys[0], html)
+    set_static_content(keys[1], html)
+    set_static_content(keys[2], {"content": "adoc", "content_type": "text/asciidoc"})
+
+    def current():
+        return [is_current_generation(key, cache.get(key)) for key in keys]
+
+    assert current() == [True, True, True]
+    flush_static_content(content_type="text/asciidoc")
+    assert current() == [True, True, False]
+    flush_static_content(release="1_86_0")
+    assert current() == [True, False, False]
+    # Cached again after the flush
+    set_static_content(keys[1], html)
+    assert current() == [True, True, False]
+    flush_static_content()
+    assert current() == [False, False, False]
@@ -0,0 +1,79 @@
+from unittest.mock import patch
+
+from django.http import HttpResponse
+from django.test import override_settings
+
+from ..cdn import (
+    FastlyPurgeClient,
+    get_content_type_key,
+    get_path_keys,
+    patch_surrogate_keys,
+    purge_surrogate_keys,
+)
+
+
+def test_get_path_keys():
+    assert get_path_keys("1_86_0/libs/json/doc/html/index.html") == [
+        "path-1_86_0",
+        "path-1_86_0/libs",
+        "path-1_86_0/libs/json",
+        "path-1_86_0/libs/json/doc",
+        "path-1_86_0/libs/json/doc/html/index.html",
+    ]
+    assert get_path_keys("/help/") == ["path-help"]
+    # Keys are separated by spaces in the header
+    assert get_path_keys("develop/my page.html") == [
+        "path-develop",
+        "path-develop/my%20page.html",
+    ]
+
+
+def test_get_content_type_key():
+    assert get_content_type_key("text/html; charset=utf-8") == "type-text/html"
+
+
+def test_patch_surrogate_keys():
+    response = HttpResponse()
+    patch_surrogate_keys(response, [])
+    assert "Surrogate-Key" not in response.headers
+
+    patch_surrogate_keys(response, ["static-content", "path-help"])
+    patch_surrogate_keys(response, ["path-help", "type-text/html", "x" * 2000])
+    assert response.headers["Surrogate-Key"] == (
+        "static-content path-help type-text/html"
+    )
+
+
+def test_purge_surrogate_keys(cdn_purges):
+    purge_surrogate_keys([])
+    purge_surrogate_keys(["version-1_86_0", None, "version-1_86_0", "versions"])
+    assert cdn_purges == [["version-1_86_0", "versions"]]
+
+
+@override_settings(
+    FASTLY_API_TOKEN="token",
+    FASTLY_SERVICE="service1",
+    FASTLY_SERVICE2="empty",
+    CDN_PURGE_CLIENT="core.cdn.FastlyPurgeClient",
+)
+def test_fastly_purge_client():
+    keys = [f"path-{number}" for number in range(300)]
+    with patch("core.cdn.requests.post") as mock_post:
+        purge_surrogate_keys(keys)
+
+    assert mock_post.call_count == 2
+    url = mock_post.call_args_list[0].args[0]
+    assert url == "https://api.fastly.com/service/service1/purge"
+    headers = mock_post.call_args_list[0].kwargs["headers"]
+    assert headers["Fastly-Key"] == "token"
+    assert headers["Fastly-Soft-Purge"] == "1"
+    assert headers["Surrogate-Key"].split() == keys[:256]
+    headers = mock_post.call_args_list[1].kwargs["headers"]
+    assert headers["Surrogate-Key"].split() == keys[256:]
+
+
+@override_settings(FASTLY_API_TOKEN="empty")
+def test_fastly_purge_client_without_token():
+    with patch("core.cdn.requests.post") as mock_post:
+        FastlyPurgeClient().purge(["versions"])
+    mock_post.assert_not_called()
@@ -0,0 +1,69 @@
+import os
+import zlib
+
+import pytest
+
+from ..compression import (
+    StaticContentCompressor,
+    compress_content,
+    decompress_content,
+    get_accepted_encoding,
+    is_compressible,
+)
+
+
+@pytest.mark.parametrize(
+    "accept_encoding, expected",
+    [
+        (None, None),
+        ("", None),
+        ("gzip", "gzip"),
+        ("gzip, deflate, br", "br"),
+        ("br;q=0.5, gzip", "gzip"),
+        ("br;q=0, gzip;q=0", None),
+        ("*", "br"),
+        ("*;q=0.1, br;q=0", "gzip"),
+        ("identity", None),
+    ],
+)
+def test_get_accepted_encoding(accept_encoding, expected):
+    assert get_accepted_encoding(accept_encoding) == expected
+
+
+def test_get_accepted_encoding_available():
+    assert get_accepted_encoding("br, gzip", available={"gzip": b""}) == "gzip"
+    assert get_accepted_encoding("br, gzip", available={}) is None
+
+
+def test_compress_content():
+    content = "<p>Boost</p>\n" * 100
+    variants = compress_content(content)
+    assert set(variants) == {"br", "gzip"}
+    assert decompress_content(variants) == content.encode("utf-8")
+    assert compress_content(content) == variants
+    assert compress_content("short") == {}
+
+
+@pytest.mark.parametrize(
+    "content_type, expected",
+    [
+        ("text/html", True),
+        ("text/css; charset=utf-8", True),
+        ("application/javascript", True),
+        ("image/svg+xml", True),
+        ("image/png", False),
+        ("application/pdf", False),
+        (None, False),
+    ],
+)
+def test_is_compressible(content_type, expected):
+    assert is_compressible(content_type) is expected
+
+
+def test_static_content_compressor():
+    compressor = StaticContentCompressor({})
+    text = b"<p>Boost</p>\n" * 100
+    assert zlib.decompress(compressor.compress(text)) == text
+    # Compressed already, e.g. brotli or PNG data
+    random_bytes = os.urandom(1000)
+    assert compressor.compress(random_bytes) == random_bytes
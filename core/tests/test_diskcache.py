@@ -0,0 +1,151 @@
+import os
+import threading
+import time
+from unittest.mock import Mock, patch
+
+from ..boostrenderer import get_content_from_s3, iter_file_stream
+from ..caching import delete_static_content_cache_keys, flush_static_content
+from ..diskcache import DiskCache, get_disk_cache_metadata
+
+
+def make_disk_cache(tmp_path, max_size=1000, max_entry_size=100, revalidate_after=60):
+    return DiskCache(str(tmp_path), max_size, max_entry_size, revalidate_after)
+
+
+def age(path, seconds):
+    mtime = time.time() - seconds
+    os.utime(path, (mtime, mtime))
+
+
+def test_disk_cache_round_trip(tmp_path):
+    disk_cache = make_disk_cache(tmp_path)
+    assert disk_cache.get("bucket/a") is None
+
+    disk_cache.set("bucket/a", b"content", {"content_type": "text/html"})
+    entry = disk_cache.get("bucket/a")
+    assert entry["content_type"] == "text/html"
+    assert entry["size"] == 7
+    assert disk_cache.is_fresh(entry)
+    assert disk_cache.read(entry) == b"content"
+
+    # Identical content is stored once
+    disk_cache.set("bucket/b", b"content", {})
+    assert disk_cache.get("bucket/b")["path"] == entry["path"]
+
+    disk_cache.delete("bucket/a")
+    assert disk_cache.get("bucket/a") is None
+
+
+def test_disk_cache_skips_large_entries(tmp_path):
+    disk_cache = make_disk_cache(tmp_path, max_entry_size=5)
+    disk_cache.set("bucket/a", b"too large", {})
+    assert disk_cache.get("bucket/a") is None
+    assert disk_cache.writer("bucket/a", {}, size=6) is None
+    assert os.listdir(disk_cache.tmp_dir) == []
+
+
+def test_disk_cache_evicts_least_recently_used(tmp_path):
+    disk_cache = make_disk_cache(tmp_path, max_size=3000, max_entry_size=1000)
+    disk_cache.set("bucket/old", b"o" * 1000, {})
+    disk_cache.set("bucket/used", b"u" * 1000, {})
+    for key in ("bucket/old", "bucket/used"):
+        entry = disk_cache.get(key)
+        age(entry["path"], 3600)
+        age(disk_cache.get_entry_path(key), 3600)
+    # Reading an entry marks it as recently used
+    assert disk_cache.get("bucket/used")
+
+    disk_cache.set("bucket/new", b"n" * 1000, {})
+    disk_cache.evict()
+
+    assert disk_cache.get("bucket/old") is None
+    assert disk_cache.get("bucket/used")
+    assert disk_cache.get("bucket/new")
+
+
+def test_disk_cache_evicts_in_background(tmp_path):
+    disk_cache = make_disk_cache(tmp_path)
+    evicted = threading.Event()
+    threads = []
+
+    def evict():
+        threads.append(threading.current_thread())
+        evicted.set()
+
+    with patch.object(disk_cache, "evict", side_effect=evict):
+        disk_cache.set("bucket/a", b"content", {})
+        assert evicted.wait(5)
+    assert threads[0] is not threading.current_thread()
+
+
+def test_disk_cache_revalidates_after_clear(tmp_path):
+    """Entries have to be revalidated with S3 after static content is flushed or
+    a key is cleared."""
+    disk_cache = make_disk_cache(tmp_path)
+    disk_cache.set("bucket/a", b"content", {})
+    assert disk_cache.is_fresh(disk_cache.get("bucket/a"))
+
+    flush_static_content(release="1_86_0")
+    entry = disk_cache.get("bucket/a")
+    assert not disk_cache.is_fresh(entry)
+    disk_cache.revalidate("bucket/a", entry)
+    assert disk_cache.is_fresh(disk_cache.get("bucket/a"))
+
+    delete_static_content_cache_keys(["static_content_1_86_0/index.html"])
+    assert not disk_cache.is_fresh(disk_cache.get("bucket/a"))
+
+
+def test_disk_cache_writer_commits_when_stream_is_read(tmp_path):
+    disk_cache = make_disk_cache(tmp_path)
+    stream = Mock()
+    stream.read.side_effect = [b"chunk1", b"chunk2", b""]
+    del stream.iter_chunks
+    writer = disk_cache.writer("bucket/a", {})
+
+    assert b"".join(iter_file_stream(stream, disk_cache_writer=writer)) == (
+        b"chunk1chunk2"
+    )
+    assert disk_cache.read(disk_cache.get("bucket/a")) == b"chunk1chunk2"
+
+    # A stream closed before the end isn't stored
+    stream.read.side_effect = [b"chunk1", b"chunk2", b""]
+    chunks = iter_file_stream(stream, disk_cache_writer=disk_cache.writer("b/b", {}))
+    next(chunks)
+    chunks.close()
+    assert disk_cache.get("b/b") is None
+
+
+def test_get_content_from_s3_uses_disk_cache(tmp_path, settings):
+    settings.STATIC_CONTENT_DISK_CACHE_DIR = str(tmp_path)
+    file_data = {
+        "content": b"content",
+        "content_key": "/site/index.html",
+        "content_type": "text/html",
+        "last_modified": None,
+        "etag": '"abc"',
+    }
+    mock_client = Mock()
+
+    with patch("core.boostrenderer.get_s3_client", return_value=mock_client), patch(
+        "core.boostrenderer.get_s3_keys", return_value=["/site/index.html"]
+    ), patch(
+        "core.boostrenderer.get_file_data", return_value=file_data
+    ) as mock_get_file_data:
+        assert get_content_from_s3("index.html", bucket_name="b") == file_data
+        assert get_content_from_s3("index.html", bucket_name="b") == file_data
+        assert mock_get_file_data.call_count == 1
+
+        # A stale entry is revalidated with S3 instead of downloaded again
+        settings.STATIC_CONTENT_DISK_CACHE_REVALIDATE_AFTER = 0
+        mock_get_file_data.return_value = {"not_modified": True}
+        assert get_content_from_s3("index.html", bucket_name="b") == file_data
+        assert mock_get_file_data.call_args.kwargs["if_none_match"] == '"abc"'
+
+
+def test_get_disk_cache_metadata():
+    assert get_disk_cache_metadata({"content_key": "/a", "last_modified": None}) == {
+        "content_key": "/a",
+        "content_type": None,
+        "etag": None,
+        "last_modified": None,
+    }
@@ -6,7 +6,9 @@ from core.htmlhelper import (
     REMOVE_ALL,
     REMOVE_CSS_CLASSES,
     REMOVE_TAGS,
+    apply_legacy_page_rules,
     convert_h1_to_h2,
+    convert_name_to_id,
     get_library_documentation_urls,
     modernize_legacy_page,
     remove_css,
@@ -312,6 +314,34 @@ def test_modernize_legacy_page_remove_only_css_class(tag_name, tag_attrs):
     assertHTMLEqual(result, expected)
 
 
+def test_apply_legacy_page_rules_matches_applying_each_rule_table():
+    """The single pass gives the same result as applying each rule table in turn,
+    including when rule matches are nested in each other."""
+    top = _build_tag("div", {"id": "top"}, inner="<a name='anchor'>link</a>")
+    header_table = _build_tag("table", {"cellpadding": "2", "width": "100%"})
+    original = f"""<!DOCTYPE html>
+    <html>
+    <body>
+      <div class="body-0" name="outer">{top}</div>
+      {_build_tag("header", {"class": "header"}, inner=header_table)}
+      {_build_tag("table", {"cellpadding": "2", "width": "100%"}, inner=top)}
+      {header_table}
+      <img src="boost.png"/>
+      {top}
+    </body>
+    </html>
+    """
+
+    result = apply_legacy_page_rules(BeautifulSoup(original, "html.parser"))
+
+    expected = BeautifulSoup(original, "html.parser")
+    expected = remove_first_tag(expected, REMOVE_TAGS)
+    expected = remove_tags(expected, REMOVE_ALL)
+    expected = remove_css(expected, REMOVE_CSS_CLASSES)
+    expected = convert_name_to_id(expected)
+    assert str(result) == str(expected)
+
+
 def test_get_library_documentation_urls():
     # HTML string for testing
     test_content = """
@@ -0,0 +1,81 @@
+import boto3
+import pytest
+
+from ..boostrenderer import get_content_from_s3, reset_s3_client
+from ..loadtest import (
+    LOADTEST_BUCKET_NAME,
+    URL_MIX,
+    build_url_mix,
+    get_counts_delta,
+    get_urls,
+    seed_bucket,
+    summarize,
+)
+from ..views import DocLibsTemplateView, UserGuideTemplateView
+
+
+def test_build_url_mix():
+    urls = get_urls()
+    mix = build_url_mix(urls, 2000, seed=1)
+    assert mix == build_url_mix(urls, 2000, seed=1)
+    assert mix != build_url_mix(urls, 2000, seed=2)
+
+    docs = [url for url in mix if url in urls["docs"]]
+    missing = [url for url in mix if "/missing_" in url]
+    assert abs(len(docs) / len(mix) - URL_MIX["docs"]) < 0.05
+    assert abs(len(missing) / len(mix) - URL_MIX["missing"]) < 0.05
+    # The most popular pages are requested the most
+    assert docs.count(urls["docs"][0]) > docs.count(urls["docs"][-1])
+
+
+def test_summarize():
+    results = [(f"/{number}", 200, number / 100) for number in range(1, 101)]
+    results[-1] = ("/missing", 404, 1.0)
+    summary = summarize(results, elapsed=2.0)
+    assert summary["throughput"] == 50
+    assert summary["latency_p50"] == 0.51
+    assert summary["latency_p99"] == 1.0
+    assert summary["latency_max"] == 1.0
+    assert summary["statuses"] == {200: 99, 404: 1}
+
+
+def test_get_counts_delta():
+    before = {"redis_commands": None, "s3_requests_found": 3}
+    after = {"redis_commands": None, "s3_requests_found": 5, "s3_requests_error": 1}
+    assert get_counts_delta(before, after) == {
+        "redis_commands": None,
+        "s3_requests_found": 2,
+        "s3_requests_error": 1,
+    }
+
+
+def test_seed_bucket(settings):
+    """The generated URLs are found in the seeded bucket by the views."""
+    # moto is a development requirement, which CI doesn't install
+    moto = pytest.importorskip("moto")
+    settings.STATIC_CONTENT_BUCKET_NAME = LOADTEST_BUCKET_NAME
+    settings.STATIC_CONTENT_AWS_S3_ENDPOINT_URL = None
+    reset_s3_client()
+    try:
+        with moto.mock_aws():
+            client = boto3.client("s3", region_name=settings.STATIC_CONTENT_REGION)
+            assert seed_bucket(client) > 0
+
+            urls = get_urls()
+            for url in urls["docs"][:2]:
+                key = DocLibsTemplateView().get_s3_key(url.removeprefix("/doc/libs/"))
+                assert get_content_from_s3(key)
+            key = UserGuideTemplateView().get_s3_key(
+                urls["user_guide"][0].removeprefix("/doc/")
+            )
+            assert get_content_from_s3(key)
+            # Images are fetched by their key
+            client.head_object(
+                Bucket=LOADTEST_BUCKET_NAME,
+                Key=urls["images"][0].removeprefix("/images/"),
+            )
+            assert not get_content_from_s3(
+                DocLibsTemplateView().get_s3_key("1_86_0/libs/missing_0/index.html")
+            )
+    finally:
+        reset_s3_client()
@@ -0,0 +1,88 @@
+import time
+from unittest.mock import MagicMock, patch
+
+from django.core.cache import caches
+from django.test import override_settings
+
+from ..caching import delete_static_content_cache_keys
+from ..localcache import (
+    INVALIDATION_CHANNEL,
+    LocalCache,
+    get_local_cache,
+    publish_invalidation,
+    reset_local_cache,
+)
+
+TEST_CACHES = {
+    "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"},
+    "static_content": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "localcache-tests",
+    },
+}
+
+
+def test_local_cache_admits_keys_requested_twice():
+    local_cache = LocalCache(max_entries=10, max_size=1000, timeout=60)
+    local_cache.set("a", {"content": "a"})
+    assert local_cache.get("a") is None
+    local_cache.set("a", {"content": "a"})
+    assert local_cache.get("a") == {"content": "a"}
+
+
+def test_local_cache_evicts_least_recently_used():
+    local_cache = LocalCache(max_entries=2, max_size=1000, timeout=60)
+    for key in ("a", "b", "a", "b"):
+        local_cache.set(key, key)
+    local_cache.get("a")
+    local_cache.set("c", "c")
+    local_cache.set("c", "c")
+
+    assert local_cache.get("a") == "a"
+    assert local_cache.get("b") is None
+    assert local_cache.get("c") == "c"
+
+
+def test_local_cache_bounds_size_and_time():
+    local_cache = LocalCache(max_entries=10, max_size=10, timeout=60)
+    for _ in range(2):
+        local_cache.set("big", {"content": b"x" * 11})
+        local_cache.set("expired", "value", timeout=0.01)
+    assert local_cache.get("big") is None
+    time.sleep(0.02)
+    assert local_cache.get("expired") is None
+    assert local_cache.size == 0
+
+
+@override_settings(CACHES=TEST_CACHES, STATIC_CONTENT_LOCAL_CACHE_SIZE=10)
+def test_delete_static_content_cache_keys_invalidates_local_cache():
+    reset_local_cache()
+    try:
+        local_cache = get_local_cache()
+        for key in ("static_content_a", "static_content_b"):
+            local_cache.set(key, "value")
+            local_cache.set(key, "value")
+
+        delete_static_content_cache_keys(["static_content_a"])
+        assert local_cache.get("static_content_a") is None
+        assert local_cache.get("static_content_b") == "value"
+
+        publish_invalidation()
+        assert local_cache.get("static_content_b") is None
+    finally:
+        reset_local_cache()
+
+
+@override_settings(CACHES=TEST_CACHES)
+def test_publish_invalidation_to_redis():
+    redis_client = MagicMock()
+    with patch("core.localcache.get_redis_client", return_value=redis_client):
+        publish_invalidation(["static_content_a"])
+        publish_invalidation()
+
+    assert redis_client.publish.call_args_list[0].args == (
+        INVALIDATION_CHANNEL,
+        '["static_content_a"]',
+    )
+    assert redis_client.publish.call_args_list[1].args == (INVALIDATION_CHANNEL, "*")
+    assert caches["static_content"].get("static_content_a") is None
@@ -6,6 +6,7 @@ from django.core.cache import caches
 from django.test import override_settings
 from django.utils import timezone
 
+from ..caching import is_current_generation, set_static_content
 from ..models import RenderedContent
 
 
@@ -37,16 +38,13 @@ def test_rendered_content_manager_clear_cache_by_content_type():
     baker.make("core.RenderedContent", content_type="clear", cache_key="clear")
 
     cache = caches["static_content"]
-    cache.set("keep", "keep")
-    cache.set("clear", "clear")
-
-    assert cache.get("keep") == "keep"
-    assert cache.get("clear") == "clear"
+    set_static_content("keep", {"content": "keep", "content_type": "keep"})
+    set_static_content("clear", {"content": "clear", "content_type": "clear"})
 
     RenderedContent.objects.clear_cache_by_content_type("clear")
 
-    assert cache.get("keep") == "keep"
-    assert cache.get("clear") is None
+    assert is_current_generation("keep", cache.get("keep"))
+    assert not is_current_generation("clear", cache.get("clear"))
 
 
 def test_delete_by_cache_key():
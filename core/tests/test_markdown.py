@@ -0,0 +1,37 @@
+import os
+from unittest.mock import patch
+
+from django.test import override_settings
+
+from ..markdown import get_markdown_page, process_md, warm_markdown_pages
+
+
+@override_settings(CONVERSION_CACHE_TIMEOUT=0)
+def test_get_markdown_page_until_file_changes(tmp_path):
+    path = tmp_path / "page.md"
+    path.write_text("---\ntitle: Page\n---\nFirst\n")
+
+    with patch("core.markdown.process_md", wraps=process_md) as mock_process:
+        metadata, content = get_markdown_page(str(path))
+        assert metadata == {"title": "Page"}
+        assert "First" in content
+        assert get_markdown_page(str(path)) == (metadata, content)
+        assert mock_process.call_count == 1
+
+        path.write_text("---\ntitle: Page\n---\nSecond version\n")
+        _, content = get_markdown_page(str(path))
+        assert "Second version" in content
+        assert mock_process.call_count == 2
+
+
+@override_settings(CONVERSION_CACHE_TIMEOUT=0)
+def test_warm_markdown_pages(tmp_path):
+    os.makedirs(tmp_path / "nested")
+    (tmp_path / "one.md").write_text("One\n")
+    (tmp_path / "nested" / "two.md").write_text("Two\n")
+    (tmp_path / "page.html").write_text("<p>Not Markdown</p>\n")
+
+    assert warm_markdown_pages([str(tmp_path)]) == 2
+    with patch("core.markdown.process_md") as mock_process:
+        get_markdown_page(str(tmp_path / "nested" / "two.md"))
+    mock_process.assert_not_called()
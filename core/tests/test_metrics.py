@@ -0,0 +1,98 @@
+from unittest.mock import patch
+
+import pytest
+from django.core.cache import caches
+from django.test import RequestFactory, override_settings
+from prometheus_client import REGISTRY
+
+from ..metrics import timed_s3_fetch
+from ..views import StaticContentTemplateView
+
+TEST_CACHES = {
+    "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"},
+    "static_content": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "metrics-tests",
+    },
+}
+
+
+def get_value(name, **labels):
+    return REGISTRY.get_sample_value(name, labels) or 0
+
+
+def test_timed_s3_fetch():
+    def fetch(key):
+        return {"content": b"foo"} if key == "found" else None
+
+    found = get_value("boost_s3_fetch_seconds_count", candidate="0", result="found")
+    missing = get_value("boost_s3_fetch_seconds_count", candidate="1", result="missing")
+
+    assert timed_s3_fetch(fetch, 0, "found") == {"content": b"foo"}
+    assert timed_s3_fetch(fetch, 1, "other") is None
+
+    assert (
+        get_value("boost_s3_fetch_seconds_count", candidate="0", result="found")
+        == found + 1
+    )
+    assert (
+        get_value("boost_s3_fetch_seconds_count", candidate="1", result="missing")
+        == missing + 1
+    )
+
+
+def test_timed_s3_fetch_error():
+    def fetch():
+        raise ValueError
+
+    errors = get_value("boost_s3_fetch_seconds_count", candidate="0", result="error")
+    with pytest.raises(ValueError):
+        timed_s3_fetch(fetch, 0)
+    assert (
+        get_value("boost_s3_fetch_seconds_count", candidate="0", result="error")
+        == errors + 1
+    )
+
+
+@pytest.mark.django_db
+@override_settings(CACHES=TEST_CACHES)
+def test_static_content_sources():
+    caches["static_content"].clear()
+    content_path = "/develop/libs/metrics.css"
+
+    def get_count(source):
+        return get_value(
+            "boost_static_content_requests_total",
+            view="StaticContentTemplateView",
+            source=source,
+        )
+
+    from_s3 = get_count("s3")
+    from_cache = get_count("cache")
+    with patch(
+        "core.views.get_content_from_s3",
+        return_value={"content": b"body {}", "content_type": "text/css"},
+    ):
+        for _ in range(2):
+            request = RequestFactory().get(content_path)
+            StaticContentTemplateView.as_view()(request, content_path=content_path)
+
+    assert get_count("s3") == from_s3 + 1
+    assert get_count("cache") == from_cache + 1
+
+
+@override_settings(METRICS_TOKEN="secret")
+def test_metrics_view(tp):
+    url = tp.reverse("metrics")
+    tp.response_404(tp.get(url))
+    tp.response_404(tp.get(url, extra={"HTTP_AUTHORIZATION": "Bearer wrong"}))
+
+    res = tp.get(url, extra={"HTTP_AUTHORIZATION": "Bearer secret"})
+    tp.response_200(res)
+    assert b"boost_static_content_requests_total" in res.content
+
+
+@override_settings(METRICS_TOKEN="")
+def test_metrics_view_disabled(tp):
+    url = tp.reverse("metrics")
+    tp.response_404(tp.get(url, extra={"HTTP_AUTHORIZATION": "Bearer "}))
@@ -0,0 +1,107 @@
+from unittest.mock import patch
+
+from django.core.cache import caches
+from django.test import override_settings
+
+from ..caching import (
+    _generations,
+    delete_static_content_cache_keys,
+    flush_static_content,
+    get_processed_content_cache_key,
+)
+from ..prerender import (
+    get_batches,
+    get_docs_content_path,
+    get_prerendered,
+    get_release_docs_prefix,
+    mark_prerendered,
+    prerender_doc_page,
+    prerender_release_docs,
+)
+
+TEST_CACHES = {
+    "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"},
+    "static_content": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "prerender-tests",
+    },
+}
+
+
+def test_get_docs_content_path(version):
+    prefix = get_release_docs_prefix(version)
+    assert prefix == "archives/boost_1_79_0/"
+    assert (
+        get_docs_content_path(f"{prefix}libs/json/index.html", version)
+        == "1_79_0/libs/json/index.html"
+    )
+
+
+def test_get_batches():
+    assert get_batches(["a", "b", "c"], 2) == [["a", "b"], ["c"]]
+    assert get_batches([], 2) == []
+
+
+@override_settings(CACHES=TEST_CACHES)
+def test_prerender_doc_page(version, mock_get_file_data, mock_get_leaf_data):
+    mock_get_file_data(mock_get_leaf_data, "boost_1_79_0/libs/algorithm/index.html")
+
+    assert prerender_doc_page("1_79_0/libs/algorithm/index.html")
+
+    cache = caches["static_content"]
+    cache_key = "static_content_1_79_0/libs/algorithm/index.html"
+    assert cache.get(cache_key)["content"] == mock_get_leaf_data
+    assert cache.get(get_processed_content_cache_key(cache_key, "med"))
+
+
+@override_settings(CACHES=TEST_CACHES)
+def test_prerender_doc_page_not_found(version, mock_get_file_data):
+    mock_get_file_data(b"<html></html>", "boost_1_79_0/other.html")
+
+    assert not prerender_doc_page("1_79_0/missing.html")
+
+
+@override_settings(CACHES=TEST_CACHES)
+def test_prerender_release_docs_resumes(
+    version, mock_get_file_data, mock_get_leaf_data
+):
+    mock_get_file_data(mock_get_leaf_data, "boost_1_79_0/index.html")
+    keys = ["archives/boost_1_79_0/index.html", "archives/boost_1_79_0/missing.htm"]
+
+    with patch("core.prerender.list_html_keys", return_value=keys):
+        stats = prerender_release_docs(version, workers=1, batch_size=1)
+        assert stats["total"] == 2
+        assert stats["rendered"] == 1
+        assert stats["missing"] == 1
+        assert get_prerendered(["1_79_0/index.html", "1_79_0/missing.htm"]) == {
+            "1_79_0/index.html"
+        }
+
+        stats = prerender_release_docs(version, workers=1)
+        assert stats["skipped"] == 1
+        assert stats["rendered"] == 0
+
+        stats = prerender_release_docs(version, workers=1, resume=False)
+        assert stats["skipped"] == 0
+        assert stats["rendered"] == 1
+
+
+@override_settings(CACHES=TEST_CACHES)
+def test_prerendered_pages_pending_after_flush():
+    """Pages are pre-rendered again on resume once their content was flushed."""
+    caches["static_content"].clear()
+    _generations.clear()
+    mark_prerendered(["1_79_0/index.html", "1_80_0/index.html"])
+    assert get_prerendered(["1_79_0/index.html", "1_80_0/index.html"]) == {
+        "1_79_0/index.html",
+        "1_80_0/index.html",
+    }
+
+    flush_static_content(release="1_79_0")
+    _generations.clear()
+    assert get_prerendered(["1_79_0/index.html", "1_80_0/index.html"]) == {
+        "1_80_0/index.html"
+    }
+
+    delete_static_content_cache_keys(["static_content_1_80_0/index.html"])
+    assert get_prerendered(["1_79_0/index.html", "1_80_0/index.html"]) == set()
@@ -1,15 +1,32 @@
 from bs4 import BeautifulSoup
 from unittest.mock import Mock, patch
 import datetime
+import json
+import os
+import time
 from io import BytesIO
 import pytest
+from botocore.exceptions import ClientError
+from botocore.response import StreamingBody
+from mistletoe import Document
 
 from ..boostrenderer import (
+    BoostRenderer,
+    StaticContentMapping,
+    create_s3_client,
     extract_file_data,
     get_body_from_html,
+    get_content_from_s3,
     get_content_type,
     get_file_data,
+    get_s3_candidate_keys,
+    get_s3_client,
     get_s3_keys,
+    get_static_content_mapping,
+    iter_file_stream,
+    probe_s3_keys,
+    reset_s3_client,
+    resolve_lexer,
     convert_img_paths,
     get_meta_redirect_from_html,
 )
@@ -25,6 +42,7 @@ def test_extract_file_data():
         "Body": BytesIO(b"file content"),
         "ContentType": "text/plain",
         "LastModified": datetime.datetime(2023, 6, 8, 12, 0, 0),
+        "ETag": '"abc123"',
     }
     s3_key = "example_key.txt"
 
@@ -33,6 +51,7 @@ def test_extract_file_data():
         "content_key": s3_key,
         "content_type": "text/plain",
         "last_modified": datetime.datetime(2023, 6, 8, 12, 0, 0),
+        "etag": '"abc123"',
     }
 
     result = extract_file_data(response, s3_key)
@@ -135,6 +154,24 @@ def test_get_file_data():
         assert not mock_logger.exception.called
 
 
+def test_get_file_data_not_modified():
+    mock_client = Mock()
+    mock_client.get_object.side_effect = ClientError(
+        {
+            "Error": {"Code": "304", "Message": "Not Modified"},
+            "ResponseMetadata": {"HTTPStatusCode": 304},
+        },
+        "GetObject",
+    )
+
+    result = get_file_data(mock_client, "my-bucket", "/file.txt", if_none_match='"a"')
+
+    assert result == {"not_modified": True, "content_key": "/file.txt", "etag": '"a"'}
+    mock_client.get_object.assert_called_once_with(
+        Bucket="my-bucket", Key="file.txt", IfNoneMatch='"a"'
+    )
+
+
 def test_get_s3_keys():
     """
     Test cases for get_s3_keys function.
@@ -157,6 +194,189 @@ def test_get_s3_keys():
     )
 
 
+def test_static_content_mapping_keeps_config_order():
+    mapping = StaticContentMapping(
+        [
+            {"site_path": "/doc/libs/", "s3_path": "/archives/"},
+            {"site_path": "/doc/", "s3_path": "/site-docs/develop/"},
+            {"site_path": "/", "s3_path": "/site/develop/"},
+        ]
+    )
+    assert mapping.get_s3_keys("/doc/libs/1_86_0/index.html") == (
+        "/archives/1_86_0/index.html",
+        "/site-docs/develop/libs/1_86_0/index.html",
+        "/site/develop/doc/libs/1_86_0/index.html",
+    )
+    assert mapping.get_s3_keys("/site/develop/rst.css") == ("/site/develop/rst.css",)
+
+
+def test_get_static_content_mapping_reloads_changed_file(tmp_path, monkeypatch):
+    monkeypatch.setattr("core.boostrenderer.MAPPING_CHECK_INTERVAL", 0)
+    config_file = tmp_path / "static_config.json"
+    config_file.write_text(json.dumps([{"site_path": "/a/", "s3_path": "/one/"}]))
+    assert get_s3_keys("/a/index.html", str(config_file)) == ["/one/index.html"]
+    # Unchanged file: the compiled mapping is reused
+    assert get_static_content_mapping(str(config_file)) is get_static_content_mapping(
+        str(config_file)
+    )
+
+    config_file.write_text(json.dumps([{"site_path": "/a/", "s3_path": "/two/"}]))
+    stat = config_file.stat()
+    os.utime(config_file, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+    assert get_s3_keys("/a/index.html", str(config_file)) == ["/two/index.html"]
+
+
+def test_get_s3_candidate_keys():
+    assert get_s3_candidate_keys(["/a/", "/b/index.html", "/a/"]) == [
+        "/a/",
+        "/a/index.html",
+        "/b/index.html",
+    ]
+
+
+def test_probe_s3_keys_prefers_priority_order():
+    streams = {}
+
+    def get_file_stream(client, bucket_name, s3_key):
+        if s3_key == "/missing":
+            return None
+        if s3_key == "/first":
+            # The preferred key answers last but still wins
+            time.sleep(0.05)
+        streams[s3_key] = Mock()
+        return {"content_key": s3_key, "stream": streams[s3_key]}
+
+    with patch("core.boostrenderer.get_file_stream", side_effect=get_file_stream):
+        result = probe_s3_keys(None, "bucket", ["/missing", "/first", "/second"])
+        assert result["content_key"] == "/first"
+        assert probe_s3_keys(None, "bucket", ["/missing", "/missing"]) is None
+
+    # Only the winner's body is read; the other streams are closed unread
+    assert not streams["/first"].close.called
+    assert streams["/second"].close.called
+    assert not streams["/second"].read.called
+
+
+def test_get_content_from_s3_reads_only_the_winning_candidate():
+    mock_client = Mock()
+    bodies = {}
+
+    def get_object(Bucket, Key):
+        if Key == "site/a/":
+            # The preferred key answers last
+            time.sleep(0.05)
+        bodies[Key] = Mock(**{"read.return_value": Key.encode()})
+        return make_s3_object(b"", Body=bodies[Key], ContentType="text/html")
+
+    mock_client.get_object.side_effect = get_object
+    with patch("core.boostrenderer.get_s3_client", return_value=mock_client), patch(
+        "core.boostrenderer.get_s3_keys", return_value=["/site/a/", "/site/b"]
+    ):
+        result = get_content_from_s3("a/")
+
+    assert result["content"] == b"site/a/"
+    assert set(bodies) == {"site/a/", "site/a/index.html", "site/b"}
+    for key in ("site/a/index.html", "site/b"):
+        assert not bodies[key].read.called
+        assert bodies[key].close.called
+
+
+def test_get_content_from_s3_index_html_fallback(mock_get_file_data):
+    mock_get_file_data(
+        b"<html></html>", "develop/libs/algorithm/index.html", "/site-docs/"
+    )
+    with patch(
+        "core.boostrenderer.get_s3_keys",
+        return_value=[
+            "/site-docs/develop/other/",
+            "/site-docs/develop/libs/algorithm/",
+        ],
+    ):
+        result = get_content_from_s3("doc/algorithm/")
+    assert result["content_key"] == "/site-docs/develop/libs/algorithm/index.html"
+
+
+def make_s3_object(content, **kwargs):
+    return {
+        "Body": StreamingBody(BytesIO(content), len(content)),
+        "ContentType": "application/pdf",
+        "ContentLength": len(content),
+        "LastModified": datetime.datetime(2023, 6, 8, 12, 0, 0),
+        "ETag": '"abc"',
+        **kwargs,
+    }
+
+
+def test_get_content_from_s3_streams_large_objects():
+    mock_client = Mock()
+    with patch("core.boostrenderer.get_s3_client", return_value=mock_client), patch(
+        "core.boostrenderer.get_s3_keys", return_value=["/site/manual.pdf"]
+    ):
+        mock_client.get_object.return_value = make_s3_object(b"small")
+        result = get_content_from_s3("manual.pdf", max_buffered_size=10)
+        assert result["content"] == b"small"
+        assert "stream" not in result
+
+        mock_client.get_object.return_value = make_s3_object(b"not so small")
+        result = get_content_from_s3("manual.pdf", max_buffered_size=10)
+        assert "content" not in result
+        assert result["content_length"] == 12
+        assert b"".join(iter_file_stream(result["stream"], chunk_size=5)) == (
+            b"not so small"
+        )
+
+        mock_client.get_object.return_value = make_s3_object(
+            b"not", ContentRange="bytes 0-2/12"
+        )
+        result = get_content_from_s3("manual.pdf", byte_range="bytes=0-2")
+        assert result["content_range"] == "bytes 0-2/12"
+        assert mock_client.get_object.call_args.kwargs["Range"] == "bytes=0-2"
+
+
+def test_probe_s3_keys_discards_losing_results():
+    discarded = []
+
+    def fetch(client, bucket_name, s3_key):
+        if s3_key == "/a":
+            # The preferred key answers after the other one
+            time.sleep(0.05)
+        return {"content_key": s3_key}
+
+    result = probe_s3_keys(
+        None, "bucket", ["/a", "/b"], fetch=fetch, discard=discarded.append
+    )
+    assert result == {"content_key": "/a"}
+    assert discarded == [{"content_key": "/b"}]
+
+
+def test_get_s3_client_is_shared(settings):
+    settings.STATIC_CONTENT_S3_MAX_POOL_CONNECTIONS = 7
+    settings.STATIC_CONTENT_S3_RETRY_MODE = "adaptive"
+    reset_s3_client()
+    try:
+        client = get_s3_client()
+        assert get_s3_client() is client
+        assert client.meta.config.max_pool_connections == 7
+        assert client.meta.config.retries["mode"] == "adaptive"
+
+        # A forked process gets its own client
+        with patch("core.boostrenderer.os.getpid", return_value=-1):
+            assert get_s3_client() is not client
+    finally:
+        reset_s3_client()
+
+
+def test_create_s3_client_endpoint_url(settings):
+    settings.STATIC_CONTENT_REGION = "us-east-2"
+    settings.STATIC_CONTENT_AWS_S3_ENDPOINT_URL = None
+    assert create_s3_client().meta.endpoint_url == (
+        "https://s3.us-east-2.amazonaws.com"
+    )
+
+    settings.STATIC_CONTENT_AWS_S3_ENDPOINT_URL = "http://localhost:9000"
+    assert create_s3_client().meta.endpoint_url == "http://localhost:9000"
+
+
 def test_convert_img_paths():
     # Test data
     html_content = """
@@ -182,3 +402,55 @@ def test_convert_img_paths():
     expected_soup = BeautifulSoup(expected_html, "html.parser")
     result_soup = BeautifulSoup(result, "html.parser")
     assert result_soup == expected_soup
+
+
+def test_convert_img_paths_only_changes_img_src():
+    html_content = (
+        "<!DOCTYPE html>\n<p class=note alt=' src=a.png'>A&nbsp;note<br>\n"
+        "<IMG\n  alt=\"src=b.png\" SRC='c.png' width=10/>"
+        '<img src=d.png><img src="https://example.com/e.png"><img data-src="f.png">'
+        '<!-- <img src="g.png"> --><script>var s = "<img src=h.png>";</script>'
+    )
+    expected_html = (
+        "<!DOCTYPE html>\n<p class=note alt=' src=a.png'>A&nbsp;note<br>\n"
+        "<IMG\n  alt=\"src=b.png\" SRC='/images/static/c.png' width=10/>"
+        '<img src="/images/static/d.png"><img src="https://example.com/e.png">'
+        '<img data-src="f.png">'
+        '<!-- <img src="g.png"> --><script>var s = "<img src=h.png>";</script>'
+    )
+    assert convert_img_paths(html_content, "/images/static") == expected_html
+
+
+def test_convert_img_paths_without_images():
+    html_content = "<html><body><p>No images<br></p></body></html>"
+    assert convert_img_paths(html_content, "/images/static") is html_content
+
+
+@pytest.mark.parametrize(
+    "language, code, expected",
+    [
+        ("python", "#include <vector>\n", "Python"),
+        (None, "#include <boost/config.hpp>\n", "C++"),
+        ("unknown-language", "std::vector<int> v;\n", "C++"),
+        (None, "template <class T>\nstruct foo;\n", "C++"),
+    ],
+)
+def test_resolve_lexer(language, code, expected):
+    assert resolve_lexer(language, code).name == expected
+
+
+def test_resolve_lexer_guesses_from_start_of_code():
+    code = "x = 1\n" * 10000
+    with patch("core.boostrenderer.guess_lexer") as mock_guess_lexer:
+        resolve_lexer(None, code)
+    assert len(mock_guess_lexer.call_args.args[0]) < len(code)
+
+
+def test_render_code_block_cached():
+    markdown = "```\n#include <boost/any.hpp>\nint x = 1 < 2;\n```\n"
+    with BoostRenderer() as renderer:
+        expected = renderer.render(Document(markdown))
+        with patch("core.boostrenderer.resolve_lexer") as mock_resolve_lexer:
+            assert renderer.render(Document(markdown)) == expected
+    mock_resolve_lexer.assert_not_called()
+    assert "int x = 1 &lt; 2;" in expected
@@ -1,12 +1,25 @@
+import datetime
+from unittest.mock import patch
+
+import pytest
 from model_bakery import baker
 
 from django.core.cache import caches
 from django.test import override_settings
+from django.utils import timezone
 
+from core.caching import (
+    acquire_refresh_lock,
+    is_current_generation,
+    is_stale,
+    set_static_content,
+)
 from core.models import RenderedContent
 from core.tasks import (
     clear_rendered_content_cache_by_cache_key,
     clear_rendered_content_cache_by_content_type,
+    clear_static_content_cache,
+    refresh_content_from_s3,
 )
 
 
@@ -20,24 +33,41 @@ TEST_CACHES = {
 
 
 @override_settings(CACHES=TEST_CACHES)
-def test_clear_rendered_content_by_content_type():
+def test_clear_rendered_content_by_content_type(cdn_purges):
     baker.make("core.RenderedContent", content_type="keep", cache_key="keep")
     baker.make("core.RenderedContent", content_type="clear", cache_key="clear")
 
     cache = caches["static_content"]
-    cache.set("keep", "keep")
-    cache.set("clear", "clear")
+    set_static_content("keep", {"content": "keep", "content_type": "keep"})
+    set_static_content("clear", {"content": "clear", "content_type": "clear"})
 
-    assert cache.get("keep") == "keep"
-    assert cache.get("clear") == "clear"
+    assert is_current_generation("keep", cache.get("keep"))
+    assert is_current_generation("clear", cache.get("clear"))
 
     clear_rendered_content_cache_by_content_type("clear")
 
-    assert cache.get("keep") == "keep"
-    assert cache.get("clear") is None
+    assert is_current_generation("keep", cache.get("keep"))
+    assert not is_current_generation("clear", cache.get("clear"))
 
     assert RenderedContent.objects.filter(content_type="keep").exists()
     assert not RenderedContent.objects.filter(content_type="clear").exists()
+    assert cdn_purges == [["type-clear"]]
+
+
+@override_settings(CACHES=TEST_CACHES)
+def test_clear_static_content_cache(cdn_purges):
+    old = baker.make("core.RenderedContent", cache_key="static_content_old")
+    RenderedContent.objects.filter(pk=old.pk).update(
+        created=timezone.now() - datetime.timedelta(days=30)
+    )
+    new = baker.make("core.RenderedContent", cache_key="static_content_new")
+
+    with patch("core.tasks.warm_static_content.delay"):
+        clear_static_content_cache()
+
+    assert not RenderedContent.objects.filter(pk=old.pk).exists()
+    assert RenderedContent.objects.filter(pk=new.pk).exists()
+    assert cdn_purges == []
 
 
 @override_settings(CACHES=TEST_CACHES)
@@ -51,3 +81,125 @@ def test_clear_rendered_content_by_cache_key():
     clear_rendered_content_cache_by_cache_key(cache_key)
     assert not cache.get(cache_key)
     assert not RenderedContent.objects.filter(cache_key=cache_key).exists()
+
+
+@override_settings(CACHES=TEST_CACHES)
+def test_refresh_content_from_s3_not_modified(cdn_purges):
+    baker.make(
+        "core.RenderedContent",
+        cache_key="static_content_foo.html",
+        content_type="text/html",
+        content_html="stored",
+        etag='"abc"',
+    )
+
+    with patch(
+        "core.tasks.get_content_from_s3",
+        return_value={"not_modified": True, "etag": '"abc"'},
+    ) as mock_get:
+        refresh_content_from_s3("foo.html", "static_content_foo.html")
+
+    mock_get.assert_called_once_with(key="foo.html", if_none_match='"abc"')
+    cached = caches["static_content"].get("static_content_foo.html")
+    assert cached["content"] == "stored"
+    assert cached["etag"] == '"abc"'
+    assert cdn_purges == []
+
+
+@override_settings(CACHES=TEST_CACHES)
+def test_refresh_content_from_s3_keeps_lock_on_failure():
+    """A failing refresh isn't scheduled again until its lock expires."""
+    assert acquire_refresh_lock("static_content_foo.html")
+
+    with patch("core.tasks.get_content_from_s3", side_effect=Exception("S3 error")):
+        with pytest.raises(Exception):
+            refresh_content_from_s3("foo.html", "static_content_foo.html")
+
+    assert not acquire_refresh_lock("static_content_foo.html")
+
+
+@override_settings(CACHES=TEST_CACHES)
+def test_refresh_content_from_s3_releases_lock():
+    assert acquire_refresh_lock("static_content_bar.css")
+    assert not acquire_refresh_lock("static_content_bar.css")
+
+    with patch(
+        "core.tasks.get_content_from_s3",
+        return_value={"content": b"new", "content_type": "text/css", "etag": '"d"'},
+    ):
+        refresh_content_from_s3("bar.css", "static_content_bar.css")
+
+    assert acquire_refresh_lock("static_content_bar.css")
+
+
+@override_settings(CACHES=TEST_CACHES)
+def test_refresh_content_from_s3_modified(cdn_purges):
+    baker.make(
+        "core.RenderedContent",
+        cache_key="static_content_foo.adoc",
+        content_type="text/asciidoc",
+        content_html="stored",
+        etag='"abc"',
+    )
+
+    with patch(
+        "core.tasks.get_content_from_s3",
+        return_value={"content": "new", "content_type": "text/asciidoc", "etag": '"d"'},
+    ), patch("core.tasks.convert_adoc_to_html", return_value="<p>new</p>"):
+        refresh_content_from_s3("foo.adoc", "static_content_foo.adoc")
+
+    obj = RenderedContent.objects.get(cache_key="static_content_foo.adoc")
+    assert obj.content_html == "<p>new</p>"
+    assert obj.etag == '"d"'
+    cached = caches["static_content"].get("static_content_foo.adoc")
+    assert cached["content"] == "<p>new</p>"
+    assert cached["etag"] == '"d"'
+    assert cdn_purges == [["path-foo.adoc"]]
+
+
+@override_settings(CACHES=TEST_CACHES)
+def test_refresh_content_from_s3_html_not_saved():
+    """Only AsciiDoc is saved to the database, as when it is first fetched."""
+    set_static_content(
+        "static_content_foo.html",
+        {"content": b"old", "content_type": "text/html", "etag": '"abc"'},
+        stale=True,
+    )
+
+    with patch(
+        "core.tasks.get_content_from_s3",
+        return_value={
+            "content": "caf\xe9".encode("latin-1"),
+            "content_type": "text/html",
+            "etag": '"d"',
+        },
+    ) as mock_get:
+        refresh_content_from_s3("foo.html", "static_content_foo.html")
+
+    mock_get.assert_called_once_with(key="foo.html", if_none_match='"abc"')
+    assert not RenderedContent.objects.exists()
+    cached = caches["static_content"].get("static_content_foo.html")
+    assert cached["content"] == "caf\xe9".encode("latin-1")
+    assert cached["analysis"]["encoding"] != "utf-8"
+    assert not is_stale(cached)
+
+
+@override_settings(CACHES=TEST_CACHES)
+def test_refresh_content_from_s3_purges_only_changes(cdn_purges):
+    """Content without a RenderedContent row is only purged from the CDN when its
+    cached version changed."""
+    s3_result = {"content": b"body {}", "content_type": "text/css", "etag": '"a"'}
+    set_static_content("static_content_unchanged.css", dict(s3_result), stale=True)
+    with patch("core.tasks.get_content_from_s3", return_value=dict(s3_result)):
+        refresh_content_from_s3("unchanged.css", "static_content_unchanged.css")
+    assert cdn_purges == []
+
+    set_static_content(
+        "static_content_changed.css", {**s3_result, "etag": None}, stale=True
+    )
+    with patch(
+        "core.tasks.get_content_from_s3",
+        return_value={**s3_result, "content": b"p {}", "etag": None},
+    ):
+        refresh_content_from_s3("changed.css", "static_content_changed.css")
+    assert cdn_purges == [["path-changed.css"]]
@@ -1,12 +1,27 @@
-from unittest.mock import patch
+import datetime
+import gzip
+from io import BytesIO
+from unittest.mock import MagicMock, patch
 
 import pytest
+from botocore.exceptions import ClientError
+from botocore.response import StreamingBody
 from django.core.cache import caches
 from django.test import RequestFactory
 from django.test.utils import override_settings
 from django.http import Http404
-
-from core.views import StaticContentTemplateView
+from model_bakery import baker
+
+from core.caching import (
+    _generations,
+    flush_static_content,
+    get_encoded_content_cache_key,
+    is_current_generation,
+    set_static_content,
+)
+from core.models import RenderedContent
+from core.tasks import refresh_content_from_s3, save_rendered_content
+from core.views import DocLibsTemplateView, ImageView, StaticContentTemplateView
 
 TEST_CACHES = {
     "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"},
@@ -49,6 +64,7 @@ def clear_cache():
     """Clears the static content cache before each test case."""
     cache = caches["static_content"]
     cache.clear()
+    _generations.clear()
 
 
 @pytest.mark.django_db
@@ -66,6 +82,34 @@ def test_content_found(request_factory):
     assert response.status_code == 200
     assert response.content == b"fake content"
     assert response["Content-Type"] == "text/plain"
+    assert response["Surrogate-Key"].split() == [
+        "static-content",
+        "path-develop",
+        "path-develop/libs",
+        "path-develop/libs/rst.css",
+        "type-text/plain",
+    ]
+
+
+@pytest.mark.django_db
+@override_settings(
+    CACHES=TEST_CACHES,
+)
+def test_flushed_content_is_fetched_again(request_factory):
+    """Test that content cached before a flush isn't served."""
+    content_path = "/develop/libs/rst.css"
+    with patch(
+        "core.views.get_content_from_s3",
+        return_value={"content": b"old content", "content_type": "text/plain"},
+    ):
+        call_view(request_factory, content_path)
+    flush_static_content(release="develop")
+    with patch(
+        "core.views.get_content_from_s3",
+        return_value={"content": b"new content", "content_type": "text/plain"},
+    ):
+        response = call_view(request_factory, content_path)
+    assert response.content == b"new content"
 
 
 @pytest.mark.django_db
@@ -81,6 +125,229 @@ def test_content_not_found(tp, request_factory):
             call_view(request_factory, content_path)
 
 
+@pytest.mark.django_db
+@override_settings(
+    CACHES=TEST_CACHES,
+)
+def test_missing_content_is_remembered(request_factory):
+    """Test that a path known to be missing 404s without going to S3 again, until
+    content is saved for it."""
+    content_path = "/develop/libs/missing.html"
+
+    with patch("core.views.get_content_from_s3", return_value={}) as mock_get:
+        for _ in range(2):
+            with pytest.raises(Http404):
+                call_view(request_factory, content_path)
+    assert mock_get.call_count == 1
+
+    save_rendered_content(
+        f"static_content_{content_path}", "text/plain", "published content"
+    )
+    response = call_view(request_factory, content_path)
+    assert response.status_code == 200
+    assert response.content == b"published content"
+
+
+@pytest.mark.django_db
+@override_settings(
+    CACHES=TEST_CACHES,
+)
+def test_content_conditional_get(request_factory):
+    """Test that the ETag and Last-Modified of the S3 object are used to answer
+    conditional requests with a 304."""
+    content_path = "/develop/libs/conditional.css"
+    last_modified = datetime.datetime(2024, 1, 2, 3, 4, 5, tzinfo=datetime.timezone.utc)
+    s3_result = {
+        "content": b"fake content",
+        "content_type": "text/css",
+        "etag": '"abc"',
+        "last_modified": last_modified,
+    }
+    with patch("core.views.get_content_from_s3", return_value=s3_result):
+        response = call_view(request_factory, content_path)
+    assert response.status_code == 200
+    assert response["Last-Modified"] == "Tue, 02 Jan 2024 03:04:05 GMT"
+    etag = response["ETag"]
+    assert etag.startswith('W/"')
+
+    view = StaticContentTemplateView.as_view()
+    request = request_factory.get(content_path, HTTP_IF_NONE_MATCH=etag)
+    response = view(request, content_path=content_path)
+    assert response.status_code == 304
+    assert response["ETag"] == etag
+
+    request = request_factory.get(
+        content_path, HTTP_IF_MODIFIED_SINCE="Tue, 02 Jan 2024 03:04:05 GMT"
+    )
+    response = view(request, content_path=content_path)
+    assert response.status_code == 304
+
+    request = request_factory.get(content_path, HTTP_IF_NONE_MATCH='W/"other"')
+    response = view(request, content_path=content_path)
+    assert response.status_code == 200
+    assert response.content == b"fake content"
+
+
+@pytest.mark.django_db
+@override_settings(
+    CACHES=TEST_CACHES,
+)
+def test_content_precompressed(request_factory):
+    """Test that the response is compressed once, and the cached variant matching
+    Accept-Encoding is served afterwards."""
+    content_path = "/develop/libs/compressed.css"
+    content = b"body { color: black; }\n" * 100
+    view = StaticContentTemplateView.as_view()
+    with patch(
+        "core.views.get_content_from_s3",
+        return_value={"content": content, "content_type": "text/css"},
+    ):
+        request = request_factory.get(content_path, HTTP_ACCEPT_ENCODING="gzip")
+        response = view(request, content_path=content_path)
+    assert response["Content-Encoding"] == "gzip"
+    assert response["Vary"] == "Accept-Encoding"
+    assert gzip.decompress(response.content) == content
+
+    with patch("core.views.StaticContentTemplateView.process_content") as mock_process:
+        request = request_factory.get(content_path, HTTP_ACCEPT_ENCODING="gzip, br")
+        response = view(request, content_path=content_path)
+        assert response["Content-Encoding"] == "br"
+
+        request = request_factory.get(content_path)
+        response = view(request, content_path=content_path)
+        assert "Content-Encoding" not in response
+        assert response.content == content
+    mock_process.assert_not_called()
+
+
+@pytest.mark.django_db
+@override_settings(
+    CACHES=TEST_CACHES,
+)
+def test_compressed_content_types_not_precompressed(request_factory):
+    """Test that content compressed already, like images, is served as it is."""
+    content_path = "/develop/libs/logo.png"
+    content = b"\x89PNG" + bytes(range(256)) * 4
+    with patch(
+        "core.views.get_content_from_s3",
+        return_value={"content": content, "content_type": "image/png"},
+    ):
+        request = request_factory.get(content_path, HTTP_ACCEPT_ENCODING="gzip, br")
+        response = StaticContentTemplateView.as_view()(
+            request, content_path=content_path
+        )
+    assert "Content-Encoding" not in response
+    assert response.content == content
+    assert not caches["static_content"].get(
+        get_encoded_content_cache_key(f"static_content_{content_path}")
+    )
+
+
+@pytest.mark.django_db
+@override_settings(
+    CACHES=TEST_CACHES,
+)
+def test_stale_content_refreshed_once(request_factory):
+    """Test that content past its soft timeout is served while a single refresh is
+    scheduled for it."""
+    content_path = "/develop/libs/stale.css"
+    cache_key = f"static_content_{content_path}"
+    set_static_content(
+        cache_key, {"content": b"stale", "content_type": "text/css"}, stale=True
+    )
+
+    with patch("core.views.refresh_content_from_s3.delay") as mock_refresh:
+        for _ in range(3):
+            response = call_view(request_factory, content_path)
+            assert response.content == b"stale"
+    mock_refresh.assert_called_once_with(content_path, cache_key)
+
+
+@pytest.mark.django_db
+@override_settings(
+    CACHES=TEST_CACHES,
+)
+def test_refreshed_content_renders_like_original(request_factory):
+    """Test that content refreshed in the background is served like it was when it
+    was first fetched from S3."""
+    content_path = "/develop/doc/index.html"
+    cache_key = f"static_content_{content_path}"
+    s3_result = {
+        "content": b'<html><head></head><body><img src="logo.png"></body></html>',
+        "content_key": "develop/doc/index.html",
+        "content_type": "text/html",
+        "etag": '"a"',
+    }
+    with patch("core.views.get_content_from_s3", return_value=dict(s3_result)):
+        original = call_view(request_factory, content_path)
+    assert b"/images/develop/doc/logo.png" in original.content
+
+    with patch(
+        "core.tasks.get_content_from_s3", return_value={**s3_result, "etag": '"b"'}
+    ):
+        refresh_content_from_s3(content_path, cache_key)
+
+    with patch("core.views.get_content_from_s3") as mock_get:
+        response = call_view(request_factory, content_path)
+    mock_get.assert_not_called()
+    assert response.content == original.content
+    assert not RenderedContent.objects.exists()
+
+
+@pytest.mark.django_db
+@override_settings(
+    CACHES=TEST_CACHES,
+)
+def test_processed_docs_do_not_leak_between_users(request_factory, user, staff_user):
+    """Test that a cached processed page doesn't carry the user-specific parts of
+    the page of the user it was first rendered for."""
+    user.delete_permanently_at = datetime.datetime(
+        2031, 1, 2, tzinfo=datetime.timezone.utc
+    )
+    user.save()
+    content_path = "1_86_0/libs/any/index.html"
+    s3_result = {
+        "content": b'<html><head></head><body><div class="spirit-nav"></div></body></html>',
+        "content_type": "text/html",
+    }
+    responses = []
+    for request_user in (user, staff_user):
+        request = request_factory.get(f"/doc/libs/{content_path}?modernize=max")
+        request.user = request_user
+        with patch("core.views.get_content_from_s3", return_value=dict(s3_result)):
+            response = DocLibsTemplateView.as_view()(request, content_path=content_path)
+        responses.append(response.content.decode())
+    # The banner of the first user is on their own page only
+    assert "2031" in responses[0]
+    assert "2031" not in responses[1]
+
+
+@pytest.mark.django_db
+@override_settings(
+    CACHES=TEST_CACHES,
+)
+def test_database_content_refreshed_once(request_factory):
+    """Test that content only found in the database is cached and refreshed once."""
+    content_path = "/develop/libs/stored.css"
+    cache_key = f"static_content_{content_path}"
+    baker.make(
+        "core.RenderedContent",
+        cache_key=cache_key,
+        content_type="text/css",
+        content_html="stored",
+    )
+
+    with patch("core.views.refresh_content_from_s3.delay") as mock_refresh, patch(
+        "core.views.BaseStaticContentTemplateView.get_from_database",
+        wraps=StaticContentTemplateView().get_from_database,
+    ) as mock_get_from_database:
+        for _ in range(3):
+            response = call_view(request_factory, content_path)
+            assert response.content == b"stored"
+    mock_refresh.assert_called_once_with(content_path, cache_key)
+    mock_get_from_database.assert_called_once()
+
+
 @pytest.mark.django_db
 @override_settings(
     CACHES=TEST_CACHES,
@@ -129,12 +396,29 @@ def test_clear_cache_missing_params(tp, staff_user):
     tp.response_404(res)
 
 
-def test_clear_cache_by_cache_key(tp, staff_user):
+def test_clear_cache_by_cache_key(tp, staff_user, cdn_purges):
     url = tp.reverse("clear-cache")
-    url = f"{url}?cache_key=foo"
+    url = f"{url}?cache_key=static_content_1_86_0/index.html"
     tp.login(staff_user)
     res = tp.get(url)
     tp.response_200(res)
+    assert cdn_purges == [["path-1_86_0/index.html"]]
+
+
+@override_settings(CACHES=TEST_CACHES)
+def test_clear_cache_by_release(tp, staff_user, cdn_purges):
+    cache = caches["static_content"]
+    set_static_content("static_content_1_86_0/index.html", {"content": "foo"})
+    url = tp.reverse("clear-cache")
+    url = f"{url}?release=boost_1_86_0"
+    tp.login(staff_user)
+    res = tp.get(url)
+    tp.response_200(res)
+    assert not is_current_generation(
+        "static_content_1_86_0/index.html",
+        cache.get("static_content_1_86_0/index.html"),
+    )
+    assert cdn_purges == [["version-1_86_0"]]
 
 
 def test_markdown_view_top_level(tp):
@@ -178,6 +462,14 @@ def test_markdown_view_nested_should_load_an_index(tp):
     tp.response_200(res)
 
 
+def test_markdown_view_remembers_path(tp):
+    tp.get("/markdown/more_content/bar/")
+    with patch("core.views.MarkdownTemplateView.find_path") as mock_find_path:
+        res = tp.get("/markdown/more_content/bar/")
+    tp.response_200(res)
+    mock_find_path.assert_not_called()
+
+
 def test_markdown_view_nested_three_levels(tp):
     res = tp.get("/markdown/more_content/even_more_content/sample")
     tp.response_200(res)
@@ -223,6 +515,7 @@ def test_docs_libs_gateway_200_lib_number_iframe(
     # check that the response contains the expected iframe
     assert b"docsiframe" in response.content
     assert b"spirit-nav" not in response.content
+    assert "version-1_50_0" in response["Surrogate-Key"].split()
 
 
 @pytest.mark.skip(reason="We're testing all docs showing in iframes")
@@ -267,3 +560,111 @@ def test_docs_libs_gateway_200_html_transformed(rf, tp, mock_get_file_data):
 def test_calendar(rf, tp):
     response = tp.get("calendar")
     tp.response_200(response)
+
+
+@pytest.mark.django_db
+@override_settings(CACHES=TEST_CACHES)
+def test_large_asset_is_streamed(request_factory):
+    """Test that assets that aren't processed are streamed when they are large or
+    a range is requested, and are not cached."""
+    content_path = "/develop/libs/manual.pdf"
+    s3_result = {
+        "stream": StreamingBody(BytesIO(b"pdf content"), 11),
+        "content_type": "application/pdf",
+        "content_length": 11,
+        "content_range": None,
+    }
+    with patch(
+        "core.views.get_content_from_s3", return_value=s3_result
+    ) as mock_get_content:
+        response = call_view(request_factory, content_path)
+
+    assert mock_get_content.call_args.kwargs["max_buffered_size"] is not None
+    assert response.status_code == 200
+    assert response.streaming
+    assert response["Content-Length"] == "11"
+    assert response["Accept-Ranges"] == "bytes"
+    assert b"".join(response.streaming_content) == b"pdf content"
+    assert caches["static_content"].get(f"static_content_{content_path}") is None
+
+    s3_result = {
+        "stream": StreamingBody(BytesIO(b"pdf"), 3),
+        "content_type": "application/pdf",
+        "content_length": 3,
+        "content_range": "bytes 0-2/11",
+    }
+    request = request_factory.get(content_path, HTTP_RANGE="bytes=0-2")
+    with patch(
+        "core.views.get_content_from_s3", return_value=s3_result
+    ) as mock_get_content:
+        response = StaticContentTemplateView.as_view()(
+            request, content_path=content_path
+        )
+
+    assert mock_get_content.call_args.kwargs["byte_range"] == "bytes=0-2"
+    assert response.status_code == 206
+    assert response["Content-Range"] == "bytes 0-2/11"
+    assert b"".join(response.streaming_content) == b"pdf"
+
+
+def test_image_view_streams(request_factory):
+    mock_client = MagicMock()
+    mock_client.get_object.return_value = {
+        "Body": StreamingBody(BytesIO(b"image"), 5),
+        "ContentType": "image/png",
+        "ContentLength": 5,
+        "LastModified": datetime.datetime(2024, 1, 2, tzinfo=datetime.timezone.utc),
+        "ETag": '"abc"',
+    }
+    request = request_factory.get("/images/site/logo.png")
+    with patch("core.views.get_s3_client", return_value=mock_client):
+        response = ImageView.as_view()(request, content_path="site/logo.png")
+
+    assert response.status_code == 200
+    assert response["Content-Length"] == "5"
+    assert response["ETag"] == '"abc"'
+    assert b"".join(response.streaming_content) == b"image"
+    assert response["Surrogate-Key"] == "static-content path-site path-site/logo.png"
+
+
+def test_image_view_not_modified(request_factory):
+    """Test that the client's If-None-Match is passed on to S3, and that S3's 304
+    is returned without the image."""
+    mock_client = MagicMock()
+    mock_client.get_object.side_effect = ClientError(
+        {"Error": {"Code": "304"}, "ResponseMetadata": {"HTTPStatusCode": 304}},
+        "GetObject",
+    )
+    request = request_factory.get("/images/site/logo.png", HTTP_IF_NONE_MATCH='"abc"')
+    with patch("core.views.get_s3_client", return_value=mock_client):
+        response = ImageView.as_view()(request, content_path="site/logo.png")
+
+    assert response.status_code == 304
+    assert response["ETag"] == '"abc"'
+    assert mock_client.get_object.call_args.kwargs["IfNoneMatch"] == '"abc"'
+
+
+def test_image_view_disk_cache(request_factory, tmp_path, settings):
+    settings.STATIC_CONTENT_DISK_CACHE_DIR = str(tmp_path)
+    mock_client = MagicMock()
+    mock_client.get_object.return_value = {
+        "Body": StreamingBody(BytesIO(b"image"), 5),
+        "ContentType": "image/png",
+        "ContentLength": 5,
+        "LastModified": datetime.datetime(2024, 1, 2, tzinfo=datetime.timezone.utc),
+        "ETag": '"abc"',
+    }
+    view = ImageView.as_view()
+    with patch("core.views.get_s3_client", return_value=mock_client):
+        response = view(request_factory.get("/images/a.png"), content_path="a.png")
+        assert b"".join(response.streaming_content) == b"image"
+
+        response = view(request_factory.get("/images/a.png"), content_path="a.png")
+        assert b"".join(response.streaming_content) == b"image"
+        assert response["ETag"] == '"abc"'
+
+        request = request_factory.get("/images/a.png", HTTP_IF_NONE_MATCH='"abc"')
+        response = view(request, content_path="a.png")
+        assert response.status_code == 304
+
+    assert mock_client.get_object.call_count == 1
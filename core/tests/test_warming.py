@@ -0,0 +1,91 @@
+import datetime
+from unittest.mock import MagicMock, patch
+
+import pytest
+from django.core.cache import caches
+from django.http import Http404
+from django.test import RequestFactory, override_settings
+
+from ..caching import get_encoded_content_cache_key
+from ..warming import get_hits_key, get_popular_paths, record_hit, warm_path
+
+TEST_CACHES = {
+    "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"},
+    "static_content": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "warming-tests",
+    },
+}
+
+
+@pytest.fixture
+def redis_client():
+    client = MagicMock()
+    with patch("core.warming.get_redis_client", return_value=client):
+        yield client
+
+
+@override_settings(STATIC_CONTENT_HIT_SAMPLE_RATE=1)
+def test_record_hit(redis_client):
+    request = RequestFactory().get("/doc/libs/latest/index.html?modernize=min")
+    record_hit(request)
+
+    pipeline = redis_client.pipeline.return_value
+    pipeline.zincrby.assert_called_once_with(
+        get_hits_key(datetime.date.today()), 1, "/doc/libs/latest/index.html"
+    )
+    pipeline.execute.assert_called_once()
+
+
+@override_settings(STATIC_CONTENT_HIT_SAMPLE_RATE=0)
+def test_record_hit_not_sampled(redis_client):
+    record_hit(RequestFactory().get("/doc/libs/latest/index.html"))
+    redis_client.pipeline.assert_not_called()
+
+
+@override_settings(STATIC_CONTENT_HIT_SAMPLE_RATE=1)
+def test_record_hit_ignores_warming(redis_client):
+    request = RequestFactory().get("/doc/libs/latest/index.html")
+    request.is_cache_warming = True
+    record_hit(request)
+    redis_client.pipeline.assert_not_called()
+
+
+@override_settings(STATIC_CONTENT_HIT_DAYS=3)
+def test_get_popular_paths(redis_client):
+    pipeline = redis_client.pipeline.return_value
+    pipeline.execute.return_value = [2, [b"/help.html", b"/doc/index.html"], 1]
+
+    assert get_popular_paths(2) == ["/help.html", "/doc/index.html"]
+    totals_key, keys = pipeline.zunionstore.call_args.args
+    assert keys[0] == get_hits_key(datetime.date.today())
+    assert len(keys) == 3
+    pipeline.zrevrange.assert_called_once_with(totals_key, 0, 1)
+    pipeline.delete.assert_called_once_with(totals_key)
+
+
+def test_get_popular_paths_without_redis():
+    assert get_popular_paths(10) == []
+
+
+@pytest.mark.django_db
+@override_settings(CACHES=TEST_CACHES)
+def test_warm_path():
+    content = b"body { color: black; }\n" * 20
+    with patch(
+        "core.views.get_content_from_s3",
+        return_value={"content": content, "content_type": "text/css"},
+    ):
+        assert warm_path("/develop/libs/warm.css")
+
+    cache = caches["static_content"]
+    cache_key = "static_content_develop/libs/warm.css"
+    assert cache.get(cache_key)["content"] == content
+    assert cache.get(get_encoded_content_cache_key(cache_key))
+
+
+@pytest.mark.django_db
+@override_settings(CACHES=TEST_CACHES)
+def test_warm_path_not_found():
+    with patch("core.views.get_content_from_s3", side_effect=Http404):
+        assert not warm_path("/develop/libs/missing.css")
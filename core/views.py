@@ -1,21 +1,34 @@
+import datetime
+import functools
+import hashlib
+import hmac
+import mimetypes
 import os
 import re
+import time
 
 import structlog
+from botocore.exceptions import ClientError
 from bs4 import BeautifulSoup
-from dateutil.parser import parse
 from django.conf import settings
 from django.contrib.auth.mixins import UserPassesTestMixin
+from django.contrib.auth.models import AnonymousUser
 from django.core.cache import caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT
 from django.http import (
     Http404,
+    HttpRequest,
     HttpResponse,
     HttpResponseNotFound,
+    HttpResponseNotModified,
     HttpResponseRedirect,
+    StreamingHttpResponse,
 )
 from django.shortcuts import redirect
 from django.template.loader import render_to_string
 from django.urls import reverse
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date, parse_http_date_safe
 from django.views import View
 from django.views.generic import TemplateView
 from requests.compat import chardet
@@ -25,27 +38,87 @@ from libraries.constants import LATEST_RELEASE_URL_PATH_STR
 from libraries.utils import legacy_path_transform
 from versions.models import Version
 
+from .analysis import prepare_content
 from .asciidoc import convert_adoc_to_html
 from .boostrenderer import (
+    close_file_stream,
     convert_img_paths,
-    extract_file_data,
+    extract_file_stream,
     get_content_from_s3,
-    get_meta_redirect_from_html,
     get_s3_client,
+    is_not_modified_error,
+    iter_file_stream,
+    save_to_disk_cache,
+)
+from .caching import (
+    acquire_refresh_lock,
+    delete_missing_content,
+    flush_static_content,
+    get_encoded_content,
+    get_encoded_content_cache_key,
+    get_processed_content,
+    get_processed_content_cache_keys,
+    get_release,
+    get_source_hash,
+    get_static_content,
+    is_current_generation,
+    is_missing_content,
+    is_stale,
+    memoize_conversion,
+    set_encoded_content,
+    set_missing_content,
+    set_processed_content,
+    set_static_content,
+)
+from .cdn import (
+    RELEASE_KEY,
+    STATIC_CONTENT_KEY,
+    SurrogateKeyMixin,
+    get_content_type_key,
+    get_path_key,
+    get_path_keys,
+    get_version_key,
+)
+from .compression import (
+    decompress_content,
+    get_accepted_encoding,
+    is_compressible,
 )
 from .constants import SourceDocType
-from .htmlhelper import modernize_legacy_page, convert_name_to_id
-from .markdown import process_md
+from .diskcache import get_disk_cache, get_file_data_from_disk_cache
+from .htmlhelper import (
+    MODERNIZE_RULES_VERSION,
+    convert_name_to_id,
+    modernize_legacy_page,
+)
+from .localcache import publish_invalidation
+from .markdown import get_markdown_page
+from .metrics import (
+    CONTENT_SOURCES,
+    IMAGE_REQUESTS,
+    MODERNIZE_CPU_SECONDS,
+    REFRESHES,
+    S3_FETCH_SECONDS,
+    generate_metrics,
+)
 from .models import RenderedContent
 from .tasks import (
     clear_rendered_content_cache_by_cache_key,
     clear_rendered_content_cache_by_content_type,
+    purge_cdn_keys,
     refresh_content_from_s3,
     save_rendered_content,
+    warm_static_content,
 )
+from .warming import record_hit
 
 logger = structlog.get_logger()
 
+# Paths of the files found by MarkdownTemplateView.build_path, by the request it
+# resolved, up to MARKDOWN_PATHS_SIZE of them.
+_markdown_paths = {}
+MARKDOWN_PATHS_SIZE = 1000
+
 
 def BSLView(request):
     file_path = os.path.join(settings.BASE_DIR, "static/license.txt")
@@ -80,17 +153,36 @@ class ClearCacheView(UserPassesTestMixin, View):
         Params (must pass one):
             content_type: The content type to clear. Example: "text/asciidoc"
             cache_key: The cache key to clear.
+            release: The release to clear from the redis cache. Example: "1_86_0"
         """
         content_type = self.request.GET.get("content_type")
         cache_key = self.request.GET.get("cache_key")
-        if not content_type and not cache_key:
+        release = self.request.GET.get("release")
+        if not content_type and not cache_key and not release:
             return HttpResponseNotFound()
 
         if content_type:
             clear_rendered_content_cache_by_content_type.delay(content_type)
 
+        if release:
+            # A single increment, so there's no need for a task
+            release = release.removeprefix("boost_")
+            flush_static_content(release=release)
+            purge_cdn_keys.delay([get_version_key(release)])
+            warm_static_content.delay()
+
         if cache_key:
             clear_rendered_content_cache_by_cache_key.delay(cache_key)
+            purge_cdn_keys.delay(
+                [get_path_key(cache_key.removeprefix("static_content_"))]
+            )
+            publish_invalidation(
+                [
+                    cache_key,
+                    *get_processed_content_cache_keys(cache_key),
+                    get_encoded_content_cache_key(cache_key),
+                ]
+            )
 
         return HttpResponse("Cache cleared")
 
@@ -105,6 +197,24 @@ class ClearCacheView(UserPassesTestMixin, View):
         return self.request.user.is_staff
 
 
+class MetricsView(View):
+    http_method_names = ["get"]
+
+    def get(self, request, *args, **kwargs):
+        """Return the metrics of every process of this instance in the Prometheus
+        text format, see `core.metrics`.
+
+        The request must have a `Authorization: Bearer <METRICS_TOKEN>` header.
+        Without a `METRICS_TOKEN`, the endpoint is disabled.
+        """
+        token = settings.METRICS_TOKEN
+        authorization = request.headers.get("Authorization", "")
+        if not token or not hmac.compare_digest(authorization, f"Bearer {token}"):
+            return HttpResponseNotFound()
+        content, content_type = generate_metrics()
+        return HttpResponse(content, content_type=content_type)
+
+
 class MarkdownTemplateView(TemplateView):
     template_name = "markdown_template.html"
     content_dir = settings.BASE_CONTENT
@@ -128,6 +238,18 @@ class MarkdownTemplateView(TemplateView):
                 )
             )
 
+        # Resolving the path takes a few filesystem lookups, so remember it
+        cache_key = (self.content_dir, self.markdown_local, content_path)
+        path = _markdown_paths.get(cache_key)
+        if path is not None and os.path.isfile(path):
+            return path
+        path = self.find_path(content_path)
+        if path and len(_markdown_paths) < MARKDOWN_PATHS_SIZE and os.path.isfile(path):
+            _markdown_paths[cache_key] = path
+        return path
+
+    def find_path(self, content_path):
+        """Return the path of the file to render for `content_path`, or None."""
         print(self.markdown_local)
         if self.markdown_local:
             # Can we find a file with this path?
@@ -194,7 +316,7 @@ class MarkdownTemplateView(TemplateView):
             raise Http404("Post not found")
 
         context = {}
-        context["frontmatter"], context["content"] = process_md(path)
+        context["frontmatter"], context["content"] = get_markdown_page(path)
         logger.info(
             "markdown_template_view_success",
             content_path=kwargs.get("content_path"),
@@ -208,8 +330,72 @@ class ContentNotFoundException(Exception):
     pass
 
 
-class BaseStaticContentTemplateView(TemplateView):
+def is_streamable_path(content_path):
+    """Return True if the content at `content_path` is served as it is in S3, e.g.
+    images, stylesheets and PDFs, as opposed to HTML and AsciiDoc, which are
+    processed before they are served."""
+    content_type, _ = mimetypes.guess_type(content_path)
+    return content_type is not None and content_type not in (
+        "text/html",
+        "text/asciidoc",
+        "text/markdown",
+    )
+
+
+def get_streaming_response(file_data):
+    """Return a response that streams the S3 body of `file_data` (see
+    `core.boostrenderer.get_file_stream`) to the client in chunks, with a 206
+    status if it is a range of the object."""
+    content_range = file_data.get("content_range")
+    response = StreamingHttpResponse(
+        iter_file_stream(
+            file_data["stream"], disk_cache_writer=file_data.get("disk_cache_writer")
+        ),
+        content_type=file_data["content_type"],
+        status=206 if content_range else 200,
+    )
+    response.headers["Accept-Ranges"] = "bytes"
+    if file_data.get("content_length") is not None:
+        response.headers["Content-Length"] = str(file_data["content_length"])
+    if content_range:
+        response.headers["Content-Range"] = content_range
+    return response
+
+
+def get_anonymous_request(request):
+    """Return a request for the same page as `request` without its user, session,
+    messages or cookies, to render templates whose output is shared between users,
+    e.g. cached in the static content cache."""
+    anonymous_request = HttpRequest()
+    anonymous_request.method = "GET"
+    anonymous_request.path = request.path
+    anonymous_request.path_info = request.path_info
+    anonymous_request.META = {
+        key: request.META[key]
+        for key in ("HTTP_HOST", "SERVER_NAME", "SERVER_PORT")
+        if key in request.META
+    }
+    anonymous_request.user = AnonymousUser()
+    return anonymous_request
+
+
+def set_validator_headers(response, etag=None, last_modified=None):
+    """Set the ETag and Last-Modified headers, so clients and the CDN can revalidate
+    the response with a conditional request."""
+    if etag:
+        response.headers["ETag"] = etag
+    if last_modified:
+        response.headers["Last-Modified"] = http_date(last_modified.timestamp())
+
+
+class BaseStaticContentTemplateView(SurrogateKeyMixin, TemplateView):
     template_name = "adoc_content.html"
+    # How long content is kept in the static content cache. Defaults to the cache's
+    # own timeout; pre-rendering uses a longer one.
+    cache_timeout = DEFAULT_TIMEOUT
+    # Whether the rendered page depends on the user, e.g. because it is wrapped in
+    # a template with the site header.
+    varies_on_user = False
 
     def get(self, request, *args, **kwargs):
         """Return static content that originates in S3.
@@ -253,7 +439,70 @@ class BaseStaticContentTemplateView(TemplateView):
                 status_code=404,
             )
             raise Http404("Content not found")
-        return super().get(request, *args, **kwargs)
+
+        # Popular pages are warmed after the cache is flushed
+        record_hit(request)
+
+        etag = self.get_etag()
+        last_modified = self.get_last_modified()
+        response = get_conditional_response(
+            request,
+            etag=etag,
+            last_modified=int(last_modified.timestamp()) if last_modified else None,
+        )
+        if response is None and self.content_dict.get("stream"):
+            response = get_streaming_response(self.content_dict)
+        elif response is None:
+            response = super().get(request, *args, **kwargs)
+        elif self.content_dict.get("stream"):
+            close_file_stream(self.content_dict)
+        set_validator_headers(response, etag, last_modified)
+        return response
+
+    def get_etag(self):
+        """Return the ETag of the response, or None if the content has none.
+
+        The response is derived from the S3 object, so its ETag combines the
+        object's ETag with what else the rendering depends on: the deployed code,
+        the query string and, for pages rendered in the site templates, the user.
+        """
+        source_etag = self.content_dict.get("etag")
+        if not source_etag:
+            return None
+        parts = [
+            source_etag,
+            settings.IMAGE_TAG,
+            str(MODERNIZE_RULES_VERSION),
+            self.request.get_full_path(),
+            self.request.headers.get("Sec-Fetch-Dest", ""),
+        ]
+        if self.varies_on_user or self.get_template_names():
+            user = getattr(self.request, "user", None)
+            parts.append(str(getattr(user, "pk", None)))
+        digest = hashlib.sha1("\n".join(parts).encode("utf-8")).hexdigest()
+        return f'W/"{digest}"'
+
+    def get_last_modified(self):
+        """Return when the content was last modified in S3, or None.
+
+        Not used for pages that depend on the user: a client that only sends
+        If-Modified-Since would keep the page it got before logging in or out.
+        """
+        if self.varies_on_user or self.get_template_names():
+            return None
+        return self.content_dict.get("last_modified")
+
+    def get_surrogate_keys(self):
+        """Return the surrogate keys of the content: those of its path and of its
+        content type."""
+        keys = [STATIC_CONTENT_KEY]
+        cache_key = getattr(self, "cache_key", None)
+        if cache_key:
+            keys.extend(get_path_keys(cache_key.removeprefix("static_content_")))
+        content_type = getattr(self, "content_dict", {}).get("content_type")
+        if content_type:
+            keys.append(get_content_type_key(content_type))
+        return keys
 
     def get_library_content_path(self, content_path):
         # here we handle the translation from "release/..." to /$version_x_y_z/...
@@ -264,24 +513,60 @@ class BaseStaticContentTemplateView(TemplateView):
             )
         return content_path
 
-    def cache_result(self, static_content_cache, cache_key, result):
-        static_content_cache.set(cache_key, result)
+    def cache_result(self, static_content_cache, cache_key, result, stale=False):
+        set_static_content(cache_key, result, timeout=self.cache_timeout, stale=stale)
+        delete_missing_content(cache_key)
+
+    def schedule_refresh(self, content_path, cache_key):
+        """Refresh the content from S3 in the background, unless a refresh of it is
+        already scheduled."""
+        if acquire_refresh_lock(cache_key):
+            refresh_content_from_s3.delay(self.get_s3_key(content_path), cache_key)
+            REFRESHES.labels(result="queued").inc()
+        else:
+            REFRESHES.labels(result="already_queued").inc()
+
+    def get_s3_key(self, content_path):
+        """Return the S3 key of the content at `content_path`."""
+        return content_path
 
     def get_content(self, content_path):
         """Return content from cache, database, or S3."""
         static_content_cache = caches["static_content"]
         cache_key = f"static_content_{content_path}"
+        self.cache_key = cache_key
         result = self.get_from_cache(static_content_cache, cache_key)
+        if result is not None and is_stale(result):
+            # Serve the stale content while it is refreshed
+            self.record_source("stale")
+            self.schedule_refresh(content_path, cache_key)
+        elif result is not None:
+            self.record_source("cache")
+
+        if result is None and is_missing_content(cache_key):
+            logger.info(
+                "get_content_from_s3_view_known_missing",
+                key=content_path,
+                status_code=404,
+            )
+            self.record_source("missing")
+            raise ContentNotFoundException("Content not found")
 
         if result is None:
             result = self.get_from_database(cache_key)
             if result:
-                # When we get a result from the database, we refresh its content
-                refresh_content_from_s3.delay(content_path, cache_key)
+                self.record_source("database")
+                # When we get a result from the database, we refresh its content.
+                # Caching it as stale keeps the next requests off the database
+                # until the refresh is done.
+                self.cache_result(static_content_cache, cache_key, result, stale=True)
+                self.schedule_refresh(content_path, cache_key)
 
         if result is None:
             result = self.get_from_s3(content_path)
             if result:
+                self.record_source("s3")
+            if result and not result.get("stream"):
                 # Save to database
                 self.save_to_database(cache_key, result)
                 # Cache the result
@@ -293,10 +578,16 @@ class BaseStaticContentTemplateView(TemplateView):
                 key=content_path,
                 status_code=404,
             )
+            set_missing_content(cache_key)
+            self.record_source("not_found")
             raise ContentNotFoundException("Content not found")
 
         return result
 
+    def record_source(self, source):
+        """Count where the requested content was found, see `core.metrics`."""
+        CONTENT_SOURCES.labels(view=type(self).__name__, source=source).inc()
+
     def get_context_data(self, **kwargs):
         """Return the content and content type for the template.
 
@@ -319,8 +610,12 @@ class BaseStaticContentTemplateView(TemplateView):
         return context
 
     def get_from_cache(self, static_content_cache, cache_key):
-        cached_result = static_content_cache.get(cache_key)
-        return cached_result if cached_result else None
+        # The most requested content is also kept in process memory
+        result = get_static_content(cache_key)
+        if result is not None and not is_current_generation(cache_key, result):
+            # Flushed since it was cached
+            return None
+        return result
 
     def get_from_database(self, cache_key):
         try:
@@ -328,35 +623,26 @@ class BaseStaticContentTemplateView(TemplateView):
             return {
                 "content": content_obj.content_html,
                 "content_type": content_obj.content_type,
+                "etag": content_obj.etag,
+                "last_modified": content_obj.last_updated_at,
             }
         except RenderedContent.DoesNotExist:
             return None
 
     def get_from_s3(self, content_path):
-        result = get_content_from_s3(key=content_path)
-        if result and result.get("content"):
-            content = result.get("content")
-            content_type = result.get("content_type")
-            result["source_content_type"] = None
-
-            # Check if the content is an asciidoc file. If so, convert it to HTML.
-            # todo: confirm necessary: not clear where this is still needed, as the
-            #  content type for library docs is set to text/html, maybe descriptions and
-            #  release notes
-            if content_type == "text/asciidoc":
-                result["content"] = self.convert_adoc_to_html(content)
-
-            # Check if the content is an HTML file. If so, check for a meta redirect.
-            if content_type.startswith("text/html"):
-                result["redirect"] = get_meta_redirect_from_html(content)
-            if content_type.startswith("text/html") and not result.get("redirect"):
-                # yes, this is a little gross, but it's the best we could think of
-                if "spirit-nav".encode() not in content:
-                    # this is not strictly accurate, this is essentially everything
-                    #  that's not an antoradoc. Perfect is the enemy of good enough.
-                    result["source_content_type"] = SourceDocType.ASCIIDOC
-
+        kwargs = {}
+        if is_streamable_path(content_path):
+            # Large files and range requests are streamed rather than read into
+            # memory and cached.
+            kwargs = {
+                "max_buffered_size": settings.STATIC_CONTENT_MAX_BUFFERED_SIZE,
+                "byte_range": self.request.headers.get("Range"),
+            }
+        result = get_content_from_s3(key=content_path, **kwargs)
+        if result and result.get("stream"):
             return result
+        if result and result.get("content"):
+            return prepare_content(result, self.convert_adoc_to_html)
 
     def get_template_names(self):
         content_type = self.content_dict.get("content_type")
@@ -370,24 +656,65 @@ class BaseStaticContentTemplateView(TemplateView):
             content = self.process_content(context["content"])
             context["content"] = content
             return super().render_to_response(context, **response_kwargs)
+        if (
+            not self.varies_on_user
+            and context["content"]
+            and is_compressible(context["content_type"])
+        ):
+            return self.get_encoded_response(context)
         content = self.process_content(context["content"])
         return HttpResponse(content, content_type=context["content_type"])
 
+    def get_encoded_response(self, context):
+        """Return the response compressed with the best encoding the client
+        accepts.
+
+        The processed content is compressed once and the variants are cached, so
+        neither processing nor compression happens at request time on a hit.
+        """
+        source_hash = get_source_hash(context["content"])
+        variants = get_encoded_content(self.cache_key, source_hash, settings.IMAGE_TAG)
+        content = None
+        if variants is None:
+            content = self.process_content(context["content"])
+            variants = set_encoded_content(
+                self.cache_key,
+                source_hash,
+                settings.IMAGE_TAG,
+                content,
+                timeout=self.cache_timeout,
+            )
+        encoding = get_accepted_encoding(
+            self.request.headers.get("Accept-Encoding"), variants
+        )
+        if encoding:
+            response = HttpResponse(
+                variants[encoding], content_type=context["content_type"]
+            )
+            response.headers["Content-Encoding"] = encoding
+        else:
+            if content is None:
+                content = (
+                    decompress_content(variants)
+                    if variants
+                    else self.process_content(context["content"])
+                )
+            response = HttpResponse(content, content_type=context["content_type"])
+        if variants:
+            patch_vary_headers(response, ["Accept-Encoding"])
+        return response
+
     def save_to_database(self, cache_key, result):
         """Saves the rendered asciidoc content to the database via celery."""
         content_type = result.get("content_type")
-        last_updated_at_raw = result.get("last_updated_at")
 
         if content_type == "text/asciidoc":
-            last_updated_at_raw = result.get("last_updated_at")
-            last_updated_at = (
-                parse(last_updated_at_raw) if last_updated_at_raw else None
-            )
             save_rendered_content.delay(
                 cache_key,
                 content_type,
                 result["content"],
-                last_updated_at=last_updated_at,
+                last_updated_at=result.get("last_modified"),
+                etag=result.get("etag"),
             )
 
     def convert_adoc_to_html(self, content):
@@ -419,17 +746,27 @@ class StaticContentTemplateView(BaseStaticContentTemplateView):
 
             # Generate the replacement path to the image
             s3_path = "/".join(url_parts)
-            # Process the HTML to replace the image paths
-            content = convert_img_paths(str(content_html), s3_path)
+            # Process the HTML to replace the image paths. Pages are rewritten
+            # once per version of their source.
+            content = memoize_conversion(
+                "img_paths",
+                str(content_html),
+                functools.partial(convert_img_paths, s3_path=s3_path),
+                options=(s3_path,),
+            )
         return content
 
 
 class DocLibsTemplateView(BaseStaticContentTemplateView):
     # possible library versions are: boost_1_53_0_beta1, 1_82_0, 1_55_0b1
     boost_lib_path_re = re.compile(r"^(boost_){0,1}([0-9_]*[0-9]+[^/]*)/(.*)")
+    varies_on_user = True
     # is_iframe_view = False
 
     def get_from_s3(self, content_path):
+        return super().get_from_s3(self.get_s3_key(content_path))
+
+    def get_s3_key(self, content_path):
         # perform URL matching/mapping, perhaps extract the version from content_path
         matches = self.boost_lib_path_re.match(content_path)
         if matches:
@@ -437,8 +774,19 @@ class DocLibsTemplateView(BaseStaticContentTemplateView):
             if groups and not groups[0]:
                 content_path = f"boost_{content_path}"
 
-        legacy_url = f"/archives/{content_path}"
-        return super().get_from_s3(legacy_url)
+        return f"/archives/{content_path}"
+
+    def get_surrogate_keys(self):
+        """Add the key of the release the docs belong to, and the key of the latest
+        release's pages when they were requested through its alias."""
+        keys = super().get_surrogate_keys()
+        cache_key = getattr(self, "cache_key", None)
+        if cache_key:
+            keys.append(get_version_key(get_release(cache_key)))
+        content_path = self.kwargs.get("content_path", "")
+        if content_path.startswith(f"{LATEST_RELEASE_URL_PATH_STR}/"):
+            keys.append(RELEASE_KEY)
+        return keys
 
     def process_content(self, content):
         """Replace page header with the local one."""
@@ -469,39 +817,78 @@ class DocLibsTemplateView(BaseStaticContentTemplateView):
 
         context["hide_footer"] = True
         context["skip_use_boostbook_v2"] = "/antora/" in self.kwargs.get("content_path")
-        if source_content_type == SourceDocType.ASCIIDOC:
-            extracted_content = content.decode(chardet.detect(content)["encoding"])
+
+        # The processed page only depends on the source content, the modernize
+        # variant and the rules, so reuse it across requests when possible.
+        source_hash = get_source_hash(content)
+        processed_content = get_processed_content(
+            self.cache_key, modernize, source_hash, MODERNIZE_RULES_VERSION
+        )
+        if processed_content is None:
+            # CPU time of this thread, which other requests don't add to as the
+            # modernization doesn't yield to them
+            start = time.thread_time()
+            processed_content = self.modernize_content(
+                content, source_content_type, context, insert_body, head_selector
+            )
+            MODERNIZE_CPU_SECONDS.labels(variant=modernize).observe(
+                time.thread_time() - start
+            )
+            set_processed_content(
+                self.cache_key,
+                modernize,
+                source_hash,
+                MODERNIZE_RULES_VERSION,
+                processed_content,
+                timeout=self.cache_timeout,
+            )
+        context["content"] = processed_content
+        return render_to_string("docsiframe.html", context, request=self.request)
+
+    def modernize_content(
+        self, content, source_content_type, context, insert_body, head_selector
+    ):
+        """Return the modernized HTML for the legacy page in `content`."""
+        if source_content_type in (SourceDocType.ASCIIDOC, SourceDocType.ANTORA):
+            analysis = self.content_dict.get("analysis") or {}
+            encoding = analysis.get("encoding") or chardet.detect(content)["encoding"]
+            extracted_content = content.decode(encoding)
             soup = BeautifulSoup(extracted_content, "html.parser")
             soup = convert_name_to_id(soup)
             soup.find("head").append(
                 soup.new_tag("script", src=f"{STATIC_URL}js/theme_handling.js")
             )
-            context["content"] = soup.prettify()
-        else:
-            # Potentially pass version if needed for HTML modification.
-            # We disable plausible to prevent redundant 'about:srcdoc' tracking,
-            # tracking is covered by docsiframe.html
-            base_html = render_to_string(
-                "docs_libs_placeholder.html",
-                {**context, **{"disable_plausible": True}},
-                request=self.request,
-            )
-            context["content"] = modernize_legacy_page(
-                content,
-                base_html,
-                insert_body=insert_body,
-                head_selector=head_selector,
-                original_docs_type=SourceDocType.ANTORA,
-                show_footer=False,
-                show_navbar=False,
-            )
-        return render_to_string("docsiframe.html", context, request=self.request)
+            return soup.prettify()
+
+        # Potentially pass version if needed for HTML modification.
+        # We disable plausible to prevent redundant 'about:srcdoc' tracking,
+        # tracking is covered by docsiframe.html
+        # The result is cached for every user, so it is rendered without the
+        # user's messages and account banners.
+        base_html = render_to_string(
+            "docs_libs_placeholder.html",
+            {**context, **{"disable_plausible": True}},
+            request=get_anonymous_request(self.request),
+        )
+        return modernize_legacy_page(
+            content,
+            base_html,
+            insert_body=insert_body,
+            head_selector=head_selector,
+            original_docs_type=SourceDocType.ANTORA,
+            show_footer=False,
+            show_navbar=False,
+        )
 
 
 class UserGuideTemplateView(BaseStaticContentTemplateView):
+    varies_on_user = True
+
     def get_from_s3(self, content_path):
-        legacy_url = f"/doc/{content_path}"
-        return super().get_from_s3(legacy_url)
+        return super().get_from_s3(self.get_s3_key(content_path))
+
+    def get_s3_key(self, content_path):
+        return f"/doc/{content_path}"
 
     def process_content(self, content):
         """Replace page header with the local one."""
@@ -543,9 +930,11 @@ class UserGuideTemplateView(BaseStaticContentTemplateView):
         return render_to_string("docsiframe.html", context, request=self.request)
 
 
-class ImageView(View):
+class ImageView(SurrogateKeyMixin, View):
+    def get_surrogate_keys(self):
+        return [STATIC_CONTENT_KEY, *get_path_keys(self.kwargs.get("content_path"))]
+
     def get(self, request, *args, **kwargs):
-        # TODO: Add caching logic
         content_path = self.kwargs.get("content_path")
         updated_legacy_path = legacy_path_transform(content_path)
         if updated_legacy_path != content_path:
@@ -556,18 +945,117 @@ class ImageView(View):
                 )
             )
 
+        # Range requests skip the local disk cache
+        disk_cache = None if request.headers.get("Range") else get_disk_cache()
+        disk_cache_key = f"{settings.STATIC_CONTENT_BUCKET_NAME}/{content_path}"
+        entry = disk_cache.get(disk_cache_key) if disk_cache else None
+        if entry and disk_cache.is_fresh(entry):
+            response = self.get_disk_cache_response(request, disk_cache, entry)
+            if response:
+                IMAGE_REQUESTS.labels(source="disk_cache").inc()
+                return response
+
         client = get_s3_client()
+        if entry and entry.get("etag"):
+            # Revalidate our copy; the client's conditional headers are then
+            # checked against it.
+            params = {"IfNoneMatch": entry["etag"]}
+        else:
+            params = self.get_conditional_params(request)
+        if request.headers.get("Range"):
+            params["Range"] = request.headers["Range"]
+        start = time.perf_counter()
         try:
             response = client.get_object(
-                Bucket=settings.STATIC_CONTENT_BUCKET_NAME, Key=content_path
+                Bucket=settings.STATIC_CONTENT_BUCKET_NAME, Key=content_path, **params
+            )
+        except ClientError as e:
+            error_code = e.response.get("Error", {}).get("Code")
+            if error_code in ("NoSuchKey", "404"):
+                result = "missing"
+            elif is_not_modified_error(e):
+                result = "not_modified"
+            else:
+                result = "error"
+            S3_FETCH_SECONDS.labels(candidate="0", result=result).observe(
+                time.perf_counter() - start
             )
-            file_data = extract_file_data(response, content_path)
-            content = file_data["content"]
-            content_type = file_data["content_type"]
+            if error_code == "InvalidRange":
+                return HttpResponse(status=416)
+            if error_code in ("NoSuchKey", "404"):
+                IMAGE_REQUESTS.labels(source="not_found").inc()
+                raise Http404("Content not found")
+            if not is_not_modified_error(e):
+                raise
+            if entry:
+                disk_cache.revalidate(disk_cache_key, entry)
+                response = self.get_disk_cache_response(request, disk_cache, entry)
+                # Retry without the disk cache if the entry was just evicted
+                if response:
+                    IMAGE_REQUESTS.labels(source="disk_cache").inc()
+                return response or self.get(request, *args, **kwargs)
+            IMAGE_REQUESTS.labels(source="not_modified").inc()
+            response = HttpResponseNotModified()
+            etag = params.get("IfNoneMatch")
+            if etag and "," not in etag:
+                # The client sent a single ETag, so that is the one that matched
+                set_validator_headers(response, etag)
+            return response
+
+        S3_FETCH_SECONDS.labels(candidate="0", result="found").observe(
+            time.perf_counter() - start
+        )
+        IMAGE_REQUESTS.labels(source="s3").inc()
+        # Images are streamed rather than read into memory first
+        file_data = extract_file_stream(response, content_path)
+        if disk_cache:
+            save_to_disk_cache(disk_cache, disk_cache_key, file_data)
+        response = get_streaming_response(file_data)
+        set_validator_headers(response, file_data["etag"], file_data["last_modified"])
+        return response
+
+    def get_disk_cache_response(self, request, disk_cache, entry):
+        """Return the response for an image in the disk cache, or None if it was
+        evicted meanwhile."""
+        # Always streamed from the file
+        file_data = get_file_data_from_disk_cache(
+            disk_cache, entry, max_buffered_size=-1
+        )
+        if file_data is None:
+            return None
+        last_modified = file_data["last_modified"]
+        response = get_conditional_response(
+            request,
+            etag=file_data["etag"],
+            last_modified=int(last_modified.timestamp()) if last_modified else None,
+        )
+        if response is None:
+            response = get_streaming_response(file_data)
+        else:
+            close_file_stream(file_data)
+        set_validator_headers(response, file_data["etag"], last_modified)
+        return response
 
-            return HttpResponse(content, content_type=content_type)
-        except ContentNotFoundException:
-            raise Http404("Content not found")
+    def get_conditional_params(self, request):
+        """Return the get_object parameters that pass the request's conditional
+        headers on to S3, so unchanged images are answered with a 304 without
+        downloading them.
+
+        As in RFC 9110, If-Modified-Since is ignored when If-None-Match is sent.
+        """
+        if_none_match = request.headers.get("If-None-Match")
+        if if_none_match:
+            return {"IfNoneMatch": if_none_match}
+        if_modified_since = parse_http_date_safe(
+            request.headers.get("If-Modified-Since")
+        )
+        if if_modified_since is not None:
+            return {
+                "IfModifiedSince": datetime.datetime.fromtimestamp(
+                    if_modified_since, tz=datetime.timezone.utc
+                )
+            }
+        return {}
 
 
 class BaseRedirectView(View):
@@ -0,0 +1,100 @@
+import datetime
+import random
+import uuid
+
+import structlog
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.http import Http404
+from django.test import RequestFactory
+from django.urls import Resolver404, resolve
+
+from .localcache import get_redis_client
+
+logger = structlog.get_logger()
+
+# Redis sorted sets of the sampled request counts of static content, by URL path,
+# one per day (e.g. `static_content_hits_20250115`).
+HITS_KEY = "static_content_hits_{}"
+
+
+def get_hits_key(day):
+    return HITS_KEY.format(day.strftime("%Y%m%d"))
+
+
+def record_hit(request):
+    """Count a request for static content, for a sample of the requests
+    (`STATIC_CONTENT_HIT_SAMPLE_RATE`), so the most requested pages can be warmed
+    after the cache is flushed.
+
+    Does nothing without Redis (e.g. in tests) or for the warming requests
+    themselves.
+    """
+    if getattr(request, "is_cache_warming", False):
+        return
+    if random.random() >= settings.STATIC_CONTENT_HIT_SAMPLE_RATE:
+        return
+    redis_client = get_redis_client()
+    if redis_client is None:
+        return
+    key = get_hits_key(datetime.date.today())
+    try:
+        pipeline = redis_client.pipeline(transaction=False)
+        pipeline.zincrby(key, 1, request.path)
+        pipeline.expire(key, (settings.STATIC_CONTENT_HIT_DAYS + 1) * 24 * 60 * 60)
+        pipeline.execute()
+    except Exception as e:
+        # Losing a sample is harmless, failing the request isn't
+        logger.exception("record_static_content_hit_error", error=str(e))
+
+
+def get_popular_paths(limit, days=None):
+    """Return the URL paths of the `limit` most requested static content pages over
+    the last `days` days (`STATIC_CONTENT_HIT_DAYS` by default), most requested
+    first."""
+    redis_client = get_redis_client()
+    if redis_client is None or limit <= 0:
+        return []
+    days = days or settings.STATIC_CONTENT_HIT_DAYS
+    today = datetime.date.today()
+    keys = [get_hits_key(today - datetime.timedelta(days=n)) for n in range(days)]
+    # A key of our own, so concurrent calls don't read each other's totals
+    totals_key = f"static_content_hits_totals_{uuid.uuid4().hex}"
+    pipeline = redis_client.pipeline(transaction=False)
+    pipeline.zunionstore(totals_key, keys)
+    pipeline.zrevrange(totals_key, 0, limit - 1)
+    pipeline.delete(totals_key)
+    paths = pipeline.execute()[1]
+    return [path.decode("utf-8") if isinstance(path, bytes) else path for path in paths]
+
+
+def warm_path(path):
+    """Request the static content page at `path` the way a visitor would, so its
+    content, and the processed and compressed variants of it, are cached.
+
+    Returns True if the page was found.
+    """
+    request = RequestFactory().get(path, HTTP_ACCEPT_ENCODING="br, gzip")
+    request.user = AnonymousUser()
+    request.is_cache_warming = True
+    try:
+        request.resolver_match = resolve(path)
+        response = request.resolver_match.func(
+            request, *request.resolver_match.args, **request.resolver_match.kwargs
+        )
+        if hasattr(response, "render"):
+            response.render()
+        response.close()
+    except (Http404, Resolver404):
+        logger.info("warm_static_content_not_found", path=path)
+        return False
+    except Exception as e:
+        # A page that can't be rendered out of a request shouldn't stop the others
+        logger.exception("warm_static_content_error", path=path, error=str(e))
+        return False
+    return response.status_code == 200
+
+
+def warm_paths(paths):
+    """Warm a batch of pages. Returns the paths that were found."""
+    return [path for path in paths if warm_path(path)]
@@ -18,6 +18,19 @@ worker_connections = 10000
 pythonpath = BASE_DIR
 chdir = BASE_DIR
 
+# The workers write their metrics to files in this directory, which the metrics
+# endpoint adds up (see core.metrics). It is emptied when gunicorn starts.
+PROMETHEUS_MULTIPROC_DIR = os.environ.setdefault(
+    "PROMETHEUS_MULTIPROC_DIR", "/tmp/prometheus"
+)
+
+
+def on_starting(server):
+    os.makedirs(PROMETHEUS_MULTIPROC_DIR, exist_ok=True)
+    for name in os.listdir(PROMETHEUS_MULTIPROC_DIR):
+        if name.endswith(".db"):
+            os.remove(os.path.join(PROMETHEUS_MULTIPROC_DIR, name))
+
 
 def post_fork(server, worker):
     from gevent import monkey
@@ -25,3 +38,19 @@ def post_fork(server, worker):
     patch_psycopg()
     worker.log.info("Made Psycopg2 Green")
     monkey.patch_all()
+
+
+def post_worker_init(worker):
+    from django.conf import settings
+
+    if settings.MARKDOWN_WARM_UP:
+        from core.markdown import warm_markdown_pages
+
+        count = warm_markdown_pages()
+        worker.log.info(f"Rendered {count} Markdown pages")
+
+
+def child_exit(server, worker):
+    from prometheus_client import multiprocess
+
+    multiprocess.mark_process_dead(worker.pid)
@@ -28,6 +28,7 @@ from .models import (
     LibraryVersion,
     PullRequest,
 )
+from core.cdn import LIBRARIES_KEY, get_library_key, purge_surrogate_keys
 from core.githubhelper import GithubAPIClient, GithubDataParser
 
 from .utils import generate_fake_email, parse_boostdep_artifact, parse_date
@@ -248,13 +249,35 @@ class LibraryUpdater:
             "update_all_libraries_metadata", library_count=len(library_data)
         )
 
+        keys = []
         for lib in library_data:
+            previous = self.get_library_state(lib["key"])
             obj = self.update_library(lib)
             if not obj:
                 continue
 
             self.update_categories(obj, categories=lib["category"])
             # self.update_authors(obj, authors=lib["authors"])
+            if self.get_library_state(lib["key"]) != previous:
+                keys.append(get_library_key(obj.slug))
+
+        # Purge the pages of the libraries that changed, and the lists of libraries
+        if keys:
+            purge_surrogate_keys([LIBRARIES_KEY, *keys])
+
+    def get_library_state(self, key):
+        """Return the data of a library that update_libraries updates, to tell
+        whether it changed, or None if there is no such library."""
+        library = Library.objects.filter(key=key).first()
+        if library is None:
+            return None
+        return (
+            library.name,
+            library.github_url,
+            library.description,
+            library.data,
+            sorted(library.categories.values_list("name", flat=True)),
+        )
 
     def update_library(self, library_data: dict) -> Library:
         """Update an individual library"""
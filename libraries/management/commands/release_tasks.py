@@ -8,8 +8,10 @@ from django.core.management import call_command
 from django.contrib.auth import get_user_model
 from django.conf import settings
 
+from core.tasks import prerender_release_docs, warm_static_content
 from libraries.tasks import update_commits
 from slack.management.commands.fetch_slack_activity import locked
+from versions.models import Version
 
 
 User = get_user_model()
@@ -77,6 +79,14 @@ def run_commands(progress: list[str]):
     call_command("fetch_slack_activity")
     progress.append(progress_message("Finished updating slack activity buckets..."))
 
+    progress.append(progress_message("Queueing documentation pre-rendering..."))
+    prerender_release_docs.delay(Version.objects.most_recent().pk)
+    progress.append(progress_message("Queued documentation pre-rendering."))
+
+    progress.append(progress_message("Queueing static content warming..."))
+    warm_static_content.delay()
+    progress.append(progress_message("Queued static content warming."))
+
     return handled_commits
 
 
@@ -2,6 +2,12 @@ import structlog
 from django.shortcuts import get_object_or_404
 from django.urls import reverse
 
+from core.cdn import (
+    RELEASE_KEY,
+    VERSIONS_KEY,
+    SurrogateKeyMixin,
+    get_version_key,
+)
 from libraries.constants import (
     LATEST_RELEASE_URL_PATH_STR,
     MASTER_RELEASE_URL_PATH_STR,
@@ -30,7 +36,7 @@ class VersionAlertMixin:
         return context
 
 
-class BoostVersionMixin:
+class BoostVersionMixin(SurrogateKeyMixin):
     def dispatch(self, request, *args, **kwargs):
         if not self.extra_context:
             self.extra_context = {}
@@ -72,3 +78,15 @@ class BoostVersionMixin:
         # here we hack extra_context into the request so we can access for cookie checks
         request.extra_context = self.extra_context
         return super().dispatch(request, *args, **kwargs)
+
+    def get_surrogate_keys(self):
+        """Return the surrogate keys of the versions the page shows: the selected
+        one, and the latest one when no version or `latest` was requested, as well
+        as that of the version dropdown."""
+        keys = [*super().get_surrogate_keys(), VERSIONS_KEY]
+        selected_version = self.extra_context.get("selected_version")
+        if selected_version:
+            keys.append(get_version_key(selected_version.stripped_boost_url_slug))
+        if self.extra_context.get("version_str") in (None, LATEST_RELEASE_URL_PATH_STR):
+            keys.append(RELEASE_KEY)
+        return keys
@@ -5,6 +5,7 @@ from config.celery import app
 from django.conf import settings
 from django.db.models import Q
 from core.boostrenderer import get_content_from_s3
+from core.cdn import get_version_key, purge_surrogate_keys
 from core.htmlhelper import get_library_documentation_urls
 from libraries.forms import CreateReportForm, CreateReportFullForm
 from libraries.github import LibraryUpdater
@@ -42,17 +43,22 @@ def get_and_store_library_version_documentation_urls_for_version(version_pk):
     library are generated, so the easiest thing to do is to access the list of libraries
     for a particular release, scrape the url paths to their docs, and save those to the
     database.
+
+    If any url path changed, the pages of the version are purged from the CDN.
     """
     try:
         version = Version.objects.get(pk=version_pk)
     except Version.DoesNotExist:
         raise
 
+    version_key = get_version_key(version.stripped_boost_url_slug)
     if version_missing_docs(version):
         # If we know the docs for this version are missing, update related records
-        LibraryVersion.objects.filter(version=version, missing_docs=False).update(
-            missing_docs=True
-        )
+        updated = LibraryVersion.objects.filter(
+            version=version, missing_docs=False
+        ).update(missing_docs=True)
+        if updated:
+            purge_surrogate_keys([version_key])
         return
 
     base_path = f"doc/libs/{version.boost_url_slug}/libs/"
@@ -65,12 +71,15 @@ def get_and_store_library_version_documentation_urls_for_version(version_pk):
     content = result["content"]
     library_tags = get_library_documentation_urls(content)
     library_versions = LibraryVersion.objects.filter(version=version)
+    changed = False
 
     for library_name, url_path in library_tags:
         try:
             # In most cases, the name matches close enough to get the correct object
             library_version = library_versions.get(library__name__iexact=library_name)
-            library_version.documentation_url = f"/{base_path}{url_path}"
+            documentation_url = f"/{base_path}{url_path}"
+            changed = changed or library_version.documentation_url != documentation_url
+            library_version.documentation_url = documentation_url
             library_version.save()
         except LibraryVersion.DoesNotExist:
             logger.info(
@@ -98,6 +107,7 @@ def get_and_store_library_version_documentation_urls_for_version(version_pk):
             # Record that the docs are missing, since we know they are
             library_version.missing_docs = True
             library_version.save()
+            changed = True
             continue
 
         # Check whether this library-version stores its docs in another location
@@ -129,9 +139,13 @@ def get_and_store_library_version_documentation_urls_for_version(version_pk):
             if content:
                 library_version.documentation_url = documentation_url
                 library_version.save()
+                changed = True
             else:
                 logger.info(f"No valid docs in S3 for key {documentation_url}")
 
+    if changed:
+        purge_surrogate_keys([version_key])
+
 
 def version_missing_docs(version):
     """Returns True if we know the docs for this release are missing
@@ -148,6 +148,30 @@ def test_update_libraries(library_updater, version):
     assert Library.objects.filter(key="test").exists()
 
 
+def test_update_libraries_purges_changed(library_updater, cdn_purges):
+    """Only the libraries that changed are purged from the CDN."""
+    library_updater.client.get_gitmodules = MagicMock(return_value=b"")
+    library_updater.parser.parse_gitmodules = MagicMock(return_value=[])
+    library_data = {
+        "key": "test",
+        "name": "Test Library",
+        "github_url": "https://github.com/test/test",
+        "description": "Test description",
+        "category": ["Test"],
+    }
+    library_updater.get_library_list = MagicMock(return_value=[library_data])
+    library_updater.update_libraries()
+    slug = Library.objects.get(key="test").slug
+    assert cdn_purges == [["libraries", f"library-{slug}"]]
+
+    library_updater.update_libraries()
+    assert len(cdn_purges) == 1
+
+    library_data["description"] = "New description"
+    library_updater.update_libraries()
+    assert cdn_purges[1] == ["libraries", f"library-{slug}"]
+
+
 def test_update_library(library_updater, version):
     """Test the update_library method of LibraryUpdater."""
     assert Library.objects.filter(key="test").exists() is False
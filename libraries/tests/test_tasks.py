@@ -1,6 +1,7 @@
 import pytest
 from unittest.mock import MagicMock, patch
 
+from core.boostrenderer import get_s3_keys
 from libraries.tasks import (
     get_and_store_library_version_documentation_urls_for_version,
     library_version_missing_docs,
@@ -33,11 +34,19 @@ def test_get_and_store_library_version_documentation_urls_for_version(
     # Mock the get_content_from_s3 function to return the mock S3 response
     mock_s3_client.get_object.return_value = mock_s3_response
 
+    def get_file_stream(client, bucket_name, s3_key):
+        content = mock_s3_response["content"]
+        stream = MagicMock(**{"read.return_value": content})
+        return {"stream": stream, "content_length": len(content), "content_range": None}
+
     with patch(
-        "core.boostrenderer.get_file_data", return_value=mock_s3_response
-    ) as mock_get_file_data:
+        "core.boostrenderer.get_file_stream", side_effect=get_file_stream
+    ) as mock_get_file_stream:
         get_and_store_library_version_documentation_urls_for_version(version.pk)
-        mock_get_file_data.assert_called_once()
+        # Candidate keys are requested concurrently and the first one is used
+        key = f"doc/libs/{version.boost_url_slug}/libs/libraries.htm"
+        called_keys = [call.args[2] for call in mock_get_file_stream.call_args_list]
+        assert get_s3_keys(key)[0] in called_keys
 
     # Refresh the library_version object from the database
     library_version.refresh_from_db()
@@ -63,7 +72,7 @@ def test_get_and_store_library_version_documentation_urls_for_version_no_content
     mock_s3_client.get_object.return_value = mock_s3_response
 
     with patch(
-        "core.boostrenderer.get_file_data", return_value=mock_s3_response
+        "core.boostrenderer.get_file_stream", return_value=mock_s3_response
     ), pytest.raises(ValueError):
         get_and_store_library_version_documentation_urls_for_version(version.pk)
 
@@ -70,6 +70,26 @@ def test_library_list_list_no_data(tp):
     tp.response_200(res)
 
 
+def test_library_list_surrogate_keys(library_version, tp):
+    """The list is purged from the CDN with its version and the list of versions"""
+    version = library_version.version
+    url = tp.reverse(
+        "libraries-list", version_slug=version.slug, library_view_str="list"
+    )
+    res = tp.get(url)
+    tp.response_200(res)
+    assert res["Surrogate-Key"].split() == [
+        "versions",
+        f"version-{version.stripped_boost_url_slug}",
+        "libraries",
+    ]
+
+    url = tp.reverse("libraries-list", version_slug="latest", library_view_str="list")
+    res = tp.get(url)
+    tp.response_200(res)
+    assert "release" in res["Surrogate-Key"].split()
+
+
 def test_library_list_no_pagination(library_version, tp):
     """Library list is not paginated."""
     lib_versions = [
@@ -11,6 +11,7 @@ from django.views import View
 from django.views.decorators.csrf import csrf_exempt
 from django.views.generic import DetailView, ListView
 
+from core.cdn import LIBRARIES_KEY, get_library_key
 from core.githubhelper import GithubAPIClient
 from versions.models import Version
 
@@ -95,6 +96,9 @@ class LibraryListBase(BoostVersionMixin, VersionAlertMixin, ListView):
 
         return queryset.filter(**version_filter_args)
 
+    def get_surrogate_keys(self):
+        return [*super().get_surrogate_keys(), LIBRARIES_KEY]
+
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**self.kwargs)
         context["categories"] = self.get_categories(context["selected_version"])
@@ -216,6 +220,12 @@ class LibraryDetail(VersionAlertMixin, BoostVersionMixin, DetailView):
     redirect_to_docs = False
     slug_url_kwarg = "library_slug"
 
+    def get_surrogate_keys(self):
+        return [
+            *super().get_surrogate_keys(),
+            get_library_key(self.kwargs.get("library_slug")),
+        ]
+
     def get_context_data(self, **kwargs):
         """Set the form action to the main libraries page"""
         context = super().get_context_data(**kwargs)
@@ -8,7 +8,15 @@ from config.celery import app
 from django.conf import settings
 from django.core.management import call_command
 from fastcore.xtras import obj2dict
+from core.cdn import (
+    RELEASE_KEY,
+    VERSIONS_KEY,
+    get_version_key,
+    purge_surrogate_keys,
+)
 from core.githubhelper import GithubAPIClient, GithubDataParser
+from core.models import RenderedContent
+from core.tasks import purge_cdn_keys
 from libraries.constants import SKIP_LIBRARY_VERSIONS
 from libraries.github import LibraryUpdater
 from libraries.models import Library, LibraryVersion
@@ -42,8 +50,8 @@ def import_versions(
             exist in the database.
         token (str): Github API token, if you need to use something other than the
             setting.
-        purge_after (bool): If True, call purge_fastly_release_cache after the version
-            imports are finished.
+        purge_after (bool): If True, purge the CDN keys of the versions that changed
+            after each version import is finished.
     """
     if delete_versions:
         Version.objects.all().delete()
@@ -61,13 +69,14 @@ def import_versions(
             continue
 
         logger.info("import_versions_importing_version", version_name=name)
-        import_version_task_group.append(import_version.s(name, tag=tag, token=token))
+        signature = import_version.s(name, tag=tag, token=token)
+        if purge_after:
+            # Called with the keys returned by import_version
+            signature.link(purge_cdn_keys.s())
+        import_version_task_group.append(signature)
 
     if import_version_task_group:
-        task_group = group(*import_version_task_group)
-        if purge_after:
-            task_group.link(purge_fastly_release_cache.s())
-        task_group()
+        group(*import_version_task_group)()
     import_release_notes.delay()
 
 
@@ -82,15 +91,23 @@ def import_release_notes():
 
 @app.task
 def store_release_notes_task(version_pk):
-    """Stores the release notes for a single version."""
+    """Stores the release notes for a single version, and purges the version's
+    pages from the CDN if they changed."""
     try:
-        Version.objects.get(pk=version_pk)
+        version = Version.objects.get(pk=version_pk)
     except Version.DoesNotExist:
         logger.error(
             "store_release_notes_task_version_does_not_exist", version_pk=version_pk
         )
         return
-    store_release_notes_for_version(version_pk)
+    previous = (
+        RenderedContent.objects.filter(cache_key=version.release_notes_cache_key)
+        .values_list("content_html", flat=True)
+        .first()
+    )
+    rendered_content = store_release_notes_for_version(version_pk)
+    if rendered_content.content_html != previous:
+        purge_surrogate_keys([get_version_key(version.stripped_boost_url_slug)])
 
 
 @app.task
@@ -115,6 +132,10 @@ def import_version(
 
     base_url: Most base_url values will be for tags, but we do save some
     Version objects that are branches and not tags (mainly master and develop).
+
+    Returns the CDN surrogate keys of the pages that changed: those of the version
+    if it is new or its data changed, and those of the pages that list versions
+    and of the latest release if it is a new release.
     """
     # Save the response we got from Github, if present
     if tag:
@@ -122,15 +143,14 @@ def import_version(
     else:
         data = {}
 
-    version, created = Version.objects.update_or_create(
-        name=name,
-        defaults={
-            "github_url": f"{base_url}{name}",
-            "beta": beta,
-            "full_release": full_release,
-            "data": data,
-        },
-    )
+    defaults = {
+        "github_url": f"{base_url}{name}",
+        "beta": beta,
+        "full_release": full_release,
+        "data": data,
+    }
+    previous = Version.objects.filter(name=name).values(*defaults).first()
+    version, created = Version.objects.update_or_create(name=name, defaults=defaults)
 
     if created:
         logger.info(
@@ -156,6 +176,15 @@ def import_version(
     # Load library-versions
     import_library_versions(version.name, token=token)
 
+    keys = []
+    if created or previous != defaults:
+        keys.append(get_version_key(version.stripped_boost_url_slug))
+    if created:
+        keys.append(VERSIONS_KEY)
+        if full_release and not beta:
+            keys.append(RELEASE_KEY)
+    return keys
+
 
 @app.task
 def import_development_versions():
@@ -164,13 +193,15 @@ def import_development_versions():
     base_url = "https://github.com/boostorg/boost/tree/"
 
     for branch in branches:
-        import_version.delay(
-            branch,
-            branch,
-            beta=False,
-            full_release=False,
-            get_release_date=False,
-            base_url=base_url,
+        import_version.apply_async(
+            args=(branch, branch),
+            kwargs={
+                "beta": False,
+                "full_release": False,
+                "get_release_date": False,
+                "base_url": base_url,
+            },
+            link=purge_cdn_keys.s(),
         )
 
         import_library_versions.delay(branch, version_type="branch")
@@ -203,7 +234,10 @@ def import_most_recent_beta_release(token=None, delete_old=False):
             # the most recent stable version
             if "beta" in name and name >= most_recent_version.name:
                 logger.info("import_most_recent_beta_release", version_name=name)
-                import_version(name, tag, token=token, beta=True, full_release=False)
+                keys = import_version(
+                    name, tag, token=token, beta=True, full_release=False
+                )
+                transaction.on_commit(lambda: purge_cdn_keys.delay(keys))
                 return
 
 
@@ -438,22 +472,8 @@ def get_release_date_for_version(version_pk, commit_sha, token=None):
 
 @app.task
 def purge_fastly_release_cache():
-    if not settings.FASTLY_API_TOKEN or settings.FASTLY_API_TOKEN == "empty":
-        logger.warning("FASTLY_API_TOKEN not found. Not purging cache.")
-        return
-
-    headers = {
-        "Fastly-Key": settings.FASTLY_API_TOKEN,
-        "Fastly-Soft-Purge": "1",
-        "Accept": "application/json",
-    }
-
-    for service in [settings.FASTLY_SERVICE, settings.FASTLY_SERVICE2]:
-        if not service or service == "empty":
-            continue
-        url = f"https://api.fastly.com/service/{service}/purge/release"
-        requests.post(url, headers=headers)
-        logger.info(f"Sent fastly purge request for {service=}.")
+    """Purges the pages of the latest release from the CDN."""
+    purge_surrogate_keys([RELEASE_KEY])
 
 
 # Helper functions
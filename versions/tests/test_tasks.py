@@ -1,6 +1,11 @@
 from datetime import datetime
 from unittest.mock import MagicMock, patch
-from versions.tasks import get_release_date_for_version, skip_tag
+from versions.tasks import (
+    get_release_date_for_version,
+    import_version,
+    purge_fastly_release_cache,
+    skip_tag,
+)
 
 import pytest
 
@@ -49,3 +54,26 @@ def test_skip_tag(version):
 
     # Assert a random tag name is not skipped
     assert skip_tag("sample") is False
+
+
+@patch("versions.tasks.import_library_versions")
+@patch("versions.tasks.import_release_downloads")
+def test_import_version_surrogate_keys(
+    mock_import_release_downloads, mock_import_library_versions, db
+):
+    """A new release changes its pages, the list of versions and the latest
+    release; importing it again without changes changes nothing."""
+    assert import_version("boost-1.90.0", get_release_date=False) == [
+        "version-1_90_0",
+        "versions",
+        "release",
+    ]
+    assert import_version("boost-1.90.0", get_release_date=False) == []
+    assert import_version(
+        "boost-1.90.0", get_release_date=False, full_release=False
+    ) == ["version-1_90_0"]
+
+
+def test_purge_fastly_release_cache(cdn_purges):
+    purge_fastly_release_cache()
+    assert cdn_purges == [["release"]]